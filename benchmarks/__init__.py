@@ -0,0 +1,3 @@
+"""
+Бенчмарки WBTC Whale Monitor (запуск: python -m benchmarks.<модуль>).
+"""
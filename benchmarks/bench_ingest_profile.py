@@ -0,0 +1,132 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from benchmarks.synthetic import make_raw_transfers
+from src.blockchain.normalize import INGEST_PROFILE_FULL, INGEST_PROFILE_LEAN, batch_to_records, normalize_wbtc_batch
+from src.db.connection import get_pg_connection
+from src.db.save_transfers import COLUMNS, records_to_csv
+
+BENCH_TABLE = "raw.bench_ingest_profile"
+
+# отдельная таблица с колонками raw.wbtc_transfers (без id — не тратим sequence)
+CREATE_SQL = f"""
+DROP TABLE IF EXISTS {BENCH_TABLE};
+CREATE TABLE {BENCH_TABLE} AS SELECT {", ".join(COLUMNS)} FROM raw.wbtc_transfers WITH NO DATA;
+CREATE UNIQUE INDEX ON {BENCH_TABLE} (tx_hash);
+"""
+
+COPY_SQL = f"COPY {BENCH_TABLE} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N');"
+
+# форма дневного агрегата (те же колонки читает Dask-путь)
+SCAN_SQL = f"""
+SELECT date(time_stamp), COUNT(*), SUM(value_wbtc), SUM(tx_fee_usd), COUNT(*) FILTER (WHERE is_whale)
+FROM {BENCH_TABLE}
+GROUP BY 1;
+"""
+
+
+def with_calldata(txs: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Etherscan tokentx отдаёт в input "deprecated"; для замера подставляем
+    настоящий calldata transfer(address,uint256) — 4 + 32 + 32 байта в hex.
+    """
+    for tx in txs:
+        tx["input"] = tx["methodId"] + tx["to"][2:].rjust(64, "0") + f"{int(tx['value']):064x}"
+    return txs
+
+
+def bench(profile: str, txs: List[Dict[str, str]], scans: int) -> Dict:
+    os.environ["WBTC_INGEST_PROFILE"] = profile
+    records = batch_to_records(normalize_wbtc_batch(txs))
+
+    conn = get_pg_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(CREATE_SQL)
+
+        started = time.perf_counter()
+        with conn, conn.cursor() as cur:
+            cur.copy_expert(COPY_SQL, records_to_csv(records))
+        insert_sec = time.perf_counter() - started
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"VACUUM ANALYZE {BENCH_TABLE};")
+            cur.execute(
+                f"SELECT pg_table_size('{BENCH_TABLE}'), pg_total_relation_size('{BENCH_TABLE}'), "
+                f"COALESCE(SUM(pg_column_size(input)), 0) FROM {BENCH_TABLE};"
+            )
+            table_bytes, total_bytes, input_bytes = cur.fetchone()
+
+            # лучший из нескольких прогонов: кэш страниц прогрет одинаково для обоих профилей
+            scan_sec = float("inf")
+            for _ in range(scans):
+                started = time.perf_counter()
+                cur.execute(SCAN_SQL)
+                cur.fetchall()
+                scan_sec = min(scan_sec, time.perf_counter() - started)
+    finally:
+        conn.close()
+
+    return {
+        "profile": profile,
+        "rows": len(records),
+        "table_mib": table_bytes / 2 ** 20,
+        "total_mib": total_bytes / 2 ** 20,
+        "input_mib": int(input_bytes) / 2 ** 20,
+        "insert_sec": insert_sec,
+        "scan_sec": scan_sec,
+    }
+
+
+def cleanup() -> None:
+    conn = get_pg_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE};")
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="WBTC_INGEST_PROFILE lean vs full: размер таблицы, запись, скан (нужен локальный Postgres)")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--scans", type=int, default=5, help="Прогонов агрегата, берётся лучший")
+    args = parser.parse_args()
+
+    txs = with_calldata(make_raw_transfers(args.rows))
+    previous = os.environ.get("WBTC_INGEST_PROFILE")
+    results = {}
+    try:
+        for profile in (INGEST_PROFILE_FULL, INGEST_PROFILE_LEAN):
+            r = results[profile] = bench(profile, txs, args.scans)
+            print(
+                f"{profile:>5} {r['rows']:>8} строк: таблица {r['table_mib']:>7.1f} MiB "
+                f"(с индексом {r['total_mib']:>7.1f}, input {r['input_mib']:>6.1f}), "
+                f"COPY {r['insert_sec']:>6.2f}s, скан {r['scan_sec'] * 1000:>7.1f}ms"
+            )
+    finally:
+        cleanup()
+        if previous is None:
+            os.environ.pop("WBTC_INGEST_PROFILE", None)
+        else:
+            os.environ["WBTC_INGEST_PROFILE"] = previous
+
+    full, lean = results[INGEST_PROFILE_FULL], results[INGEST_PROFILE_LEAN]
+    print(
+        f"lean против full: таблица {lean['table_mib'] / full['table_mib'] - 1:+.0%}, "
+        f"COPY {lean['insert_sec'] / full['insert_sec'] - 1:+.0%}, "
+        f"скан {lean['scan_sec'] / full['scan_sec'] - 1:+.0%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
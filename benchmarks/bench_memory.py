@@ -0,0 +1,81 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from benchmarks.synthetic import make_raw_transfers
+from src.blockchain.normalize import BATCH_COLUMNS, normalize_to_records, normalize_wbtc_batch
+from src.blockchain.records import RawTransfer
+
+MODES = ("dict", "compact")
+PAGE_SIZE = 5000
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss в Linux — КиБ
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(mode: str, rows: int) -> None:
+    """
+    Один прогон в отдельном процессе (пик RSS не сбрасывается): страницы
+    проходят через json.loads, как ответ Etherscan, весь результат держится
+    в памяти, как в не-потоковом flow (extract → transform → load).
+    compact — путь flow: RawTransfer + normalize_to_records.
+    """
+    baseline = _peak_rss_mib()
+
+    raw_txs = []
+    for page_no, start in enumerate(range(0, rows, PAGE_SIZE)):
+        page = make_raw_transfers(min(PAGE_SIZE, rows - start), start_block=10_000_000 + start // 3, seed=page_no)
+        for tx in json.loads(json.dumps(page)):
+            raw_txs.append(tx if mode == "dict" else RawTransfer.from_json(tx))
+        del page
+
+    if mode == "dict":
+        # прежнее представление: dict на запись, колонки всей выгрузки разом
+        columns = normalize_wbtc_batch(raw_txs)
+        records = [dict(zip(BATCH_COLUMNS, row)) for row in zip(*(columns[name] for name in BATCH_COLUMNS))]
+        del columns
+    else:
+        # как transform не-потокового flow: кусками, сырые отпускаются по ходу
+        records = normalize_to_records(raw_txs)
+    del raw_txs
+
+    print(json.dumps({"mode": mode, "rows": len(records), "peak_mib": round(_peak_rss_mib() - baseline, 1)}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пиковый RSS: dict-записи против компактных (__slots__ + интернирование)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.rows)
+        return
+
+    results = {}
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_memory", "--rows", str(args.rows), "--child", mode],
+            cwd=PROJECT_ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results[mode] = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:>8}: {results[mode]['peak_mib']:>8.1f} MiB пик RSS на {results[mode]['rows']} переводов")
+
+    ratio = results["dict"]["peak_mib"] / max(results["compact"]["peak_mib"], 1e-9)
+    print(f"уменьшение пика: x{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    main()
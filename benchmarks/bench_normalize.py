@@ -0,0 +1,43 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from benchmarks.synthetic import make_raw_transfers
+from src.blockchain.normalize import BATCH_COLUMNS, ingest_profile, normalize_wbtc_batch, normalize_wbtc_tx
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="normalize_wbtc_tx vs normalize_wbtc_batch")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw_txs = make_raw_transfers(args.rows)
+    profile = ingest_profile()
+
+    scalar_best = batch_best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        records = [normalize_wbtc_tx(tx, profile=profile) for tx in raw_txs]
+        scalar_best = min(scalar_best, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        columns = normalize_wbtc_batch(raw_txs)
+        batch_best = min(batch_best, time.perf_counter() - started)
+
+    for name in BATCH_COLUMNS:
+        column = columns[name]
+        assert all(repr(column[i]) == repr(rec[name]) for i, rec in enumerate(records)), name
+
+    print(f"scalar: {args.rows / scalar_best:>10.0f} rows/s ({scalar_best:.3f}s)")
+    print(f"batch:  {args.rows / batch_best:>10.0f} rows/s ({batch_best:.3f}s)")
+    print(f"ускорение: x{scalar_best / batch_best:.2f}, результаты идентичны")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from benchmarks.synthetic import BENCH_HASH_PREFIX, make_raw_transfers
+from src.blockchain.normalize import ingest_profile, normalize_wbtc_tx
+from src.db.connection import get_pg_connection
+from src.db.save_transfers import LOAD_METHOD_COPY, LOAD_METHOD_VALUES, delete_transfers, save_transfers_batch
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def cleanup() -> None:
+    conn = get_pg_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            delete_transfers(cur, "tx_hash LIKE %s", (BENCH_HASH_PREFIX + "%",))
+    finally:
+        conn.close()
+
+
+def bench(method: str, records: List[Dict]) -> Dict:
+    cleanup()
+    started = time.perf_counter()
+    inserted = save_transfers_batch(records, method=method)
+    elapsed = time.perf_counter() - started
+
+    # повторная вставка тех же строк: всё уходит в ON CONFLICT
+    started = time.perf_counter()
+    duplicates = save_transfers_batch(records, method=method)
+    conflict_elapsed = time.perf_counter() - started
+
+    return {
+        "method": method,
+        "rows": len(records),
+        "inserted": inserted,
+        "rows_per_sec": len(records) / elapsed,
+        "conflict_rows_per_sec": len(records) / conflict_elapsed,
+        "reinserted": duplicates,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="COPY vs execute_values для raw.wbtc_transfers (нужен локальный Postgres)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    args = parser.parse_args()
+
+    profile = ingest_profile()
+    try:
+        for size in args.sizes:
+            records = [normalize_wbtc_tx(tx, profile=profile) for tx in make_raw_transfers(size)]
+            for method in (LOAD_METHOD_VALUES, LOAD_METHOD_COPY):
+                r = bench(method, records)
+                assert r["inserted"] == size and r["reinserted"] == 0, r
+                print(
+                    f"{method:>6} {size:>7} строк: {r['rows_per_sec']:>10.0f} rows/s "
+                    f"(повтор/конфликты: {r['conflict_rows_per_sec']:>10.0f} rows/s)"
+                )
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from benchmarks.fake_etherscan import FakeEtherscanConfig, FakeEtherscanProcess
+from benchmarks.synthetic import BENCH_HASH_PREFIX
+
+DEFAULT_RESULTS = PROJECT_ROOT / "data" / "bench" / "results.jsonl"
+DEFAULT_KEYS = 3
+LOAD_BATCH = 5000
+STAGES = ("fetch", "fetch_concurrent", "normalize", "save", "save_conflicts", "daily_stats_sql", "daily_stats_dask")
+
+
+def _git(*args: str) -> str:
+    return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def _git_commit() -> Optional[str]:
+    # незакоммиченные правки помечаются, чтобы не сравнивать прогоны по чужому коммиту
+    try:
+        commit = _git("rev-parse", "--short", "HEAD")
+        return commit + ("-dirty" if _git("status", "--porcelain", "--untracked-files=no") else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def config_id(config: Dict[str, Any]) -> str:
+    # прогоны сравнимы, только если совпадают цепь, поведение API и набор стадий
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _stage(rows: int, seconds: float, **extra: Any) -> Dict[str, Any]:
+    return {"rows": rows, "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None, **extra}
+
+
+def _timed(fn: Callable[[], Any]):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def _server_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+
+def run_fetch_stages(server: FakeEtherscanProcess, keys: List[str], concurrent: bool) -> Dict[str, Any]:
+    from src.blockchain import fetch_wbtc_bulk
+    from src.blockchain.key_pool import KeyPool
+
+    cfg = server.config
+    stages: Dict[str, Any] = {}
+
+    before = server.stats()
+    raw, seconds = _timed(lambda: list(fetch_wbtc_bulk.fetch_wbtc_all(
+        start_block=cfg.start_block,
+        end_block=cfg.head_block,
+        key_pool=KeyPool(keys),
+        use_cache=False,
+    )))
+    stages["fetch"] = _stage(len(raw), seconds, server=_server_delta(before, server.stats()))
+
+    if concurrent:
+        before = server.stats()
+        rows, seconds = _timed(lambda: sum(1 for _ in fetch_wbtc_bulk.fetch_wbtc_concurrent(
+            start_block=cfg.start_block,
+            end_block=cfg.head_block,
+        )))
+        stages["fetch_concurrent"] = _stage(rows, seconds, server=_server_delta(before, server.stats()))
+    return {"stages": stages, "raw": raw}
+
+
+def run_normalize_stage(raw: List[Any]) -> Dict[str, Any]:
+    from src.blockchain.normalize import batch_to_records, normalize_wbtc_batch
+
+    def normalize() -> List[Any]:
+        records: List[Any] = []
+        for start in range(0, len(raw), LOAD_BATCH):
+            records.extend(batch_to_records(normalize_wbtc_batch(raw[start:start + LOAD_BATCH])))
+        return records
+
+    records, seconds = _timed(normalize)
+    return {"stage": _stage(len(records), seconds), "records": records}
+
+
+def _non_bench_rows() -> int:
+    from src.db.connection import pooled_connection
+
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM raw.wbtc_transfers WHERE tx_hash NOT LIKE %s;", (BENCH_HASH_PREFIX + "%",))
+            return int(cur.fetchone()[0])
+
+
+def _cleanup_db() -> None:
+    from src.db.connection import pooled_connection
+    from src.db.save_transfers import delete_transfers
+
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            delete_transfers(cur, "tx_hash LIKE %s", (BENCH_HASH_PREFIX + "%",))
+
+
+def run_db_stages(records: List[Any]) -> Dict[str, Any]:
+    from src.analytics.dask_daily_stats import rebuild_daily_stats_with_dask
+    from src.analytics.rebuild_daily_stats import rebuild_daily_stats
+    from src.db.save_transfers import save_transfers_batch
+
+    def save() -> int:
+        return sum(save_transfers_batch(records[i:i + LOAD_BATCH]) for i in range(0, len(records), LOAD_BATCH))
+
+    stages: Dict[str, Any] = {}
+    _cleanup_db()
+    try:
+        inserted, seconds = _timed(save)
+        stages["save"] = _stage(len(records), seconds, inserted=inserted)
+        # повтор тех же строк — весь поток уходит в ON CONFLICT
+        reinserted, seconds = _timed(save)
+        stages["save_conflicts"] = _stage(len(records), seconds, inserted=reinserted)
+
+        _, seconds = _timed(rebuild_daily_stats)
+        stages["daily_stats_sql"] = _stage(len(records), seconds)
+        days, seconds = _timed(lambda: rebuild_daily_stats_with_dask(incremental=False, source="db"))
+        stages["daily_stats_dask"] = _stage(len(records), seconds, days=days)
+    finally:
+        _cleanup_db()
+        # витрина без строк бенчмарка
+        rebuild_daily_stats()
+    return stages
+
+
+def load_results(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_result(path: Path, result: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False, sort_keys=True) + "\n")
+
+
+def compare(current: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Строки сравнения rows/s по стадиям с прошлым прогоном той же конфигурации.
+    """
+    lines = []
+    for name in STAGES:
+        stage = current["stages"].get(name)
+        if stage is None:
+            continue
+        line = f"{name:>17}: {stage['rows']:>9} строк за {stage['seconds']:>8.2f}s = {stage['rows_per_sec'] or 0:>10.1f} rows/s"
+        prev = (previous or {}).get("stages", {}).get(name)
+        if prev and prev.get("rows_per_sec") and stage.get("rows_per_sec"):
+            change = stage["rows_per_sec"] / prev["rows_per_sec"] - 1
+            line += f"  ({change:+.1%} к {previous['git_commit'] or '?'} от {previous['run_at'][:19]})"
+        lines.append(line)
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Сквозной бенчмарк на фейковом Etherscan: fetch → normalize → save → daily_stats (SQL и Dask)"
+    )
+    parser.add_argument("--transfers", type=int, default=100_000, help="Переводов в синтетической цепи")
+    parser.add_argument("--txs-per-block", type=int, default=3)
+    parser.add_argument("--keys", type=int, default=DEFAULT_KEYS, help="Число API-ключей (полос)")
+    parser.add_argument("--rate-limit", type=float, default=5.0, help="Запросов/с на ключ у фейкового API (0 — без лимита)")
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Доля ответов HTTP 502")
+    parser.add_argument("--window-limit", type=int, default=10_000, help="Предел page * offset (Result window is too large)")
+    parser.add_argument("--concurrent", action="store_true", help="Ещё и параллельная выгрузка (fetch_wbtc_concurrent)")
+    parser.add_argument("--db", action="store_true", help="Стадии с Postgres: save и оба пути daily_stats (нужна отдельная БД)")
+    parser.add_argument("--allow-shared-db", action="store_true", help="Разрешить --db, если в raw.wbtc_transfers есть не только строки бенчмарка")
+    parser.add_argument("--results", type=Path, default=DEFAULT_RESULTS, help="JSONL с результатами прогонов")
+    parser.add_argument("--label", default="", help="Метка прогона (например, имя ветки)")
+    args = parser.parse_args()
+
+    fake = FakeEtherscanConfig(
+        transfers=args.transfers,
+        txs_per_block=args.txs_per_block,
+        rate_limit=args.rate_limit,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        window_limit=args.window_limit,
+    )
+    keys = [f"BENCHKEY{i:04d}" for i in range(args.keys)]
+    config = {"fake": asdict(fake), "keys": args.keys, "concurrent": args.concurrent, "db": args.db}
+
+    # клиент идёт в фейковый сервер с тем же темпом на ключ, что и лимит API
+    os.environ["ETHERSCAN_KEYS"] = ",".join(keys)
+    if args.rate_limit > 0:
+        os.environ["ETHERSCAN_CALLS_PER_SEC"] = str(args.rate_limit)
+    os.environ["ETHERSCAN_CACHE"] = "off"
+
+    if args.db and not args.allow_shared_db and _non_bench_rows():
+        raise SystemExit("raw.wbtc_transfers содержит реальные строки: запускай --db на отдельной БД (PGDATABASE) или с --allow-shared-db")
+
+    with FakeEtherscanProcess(fake) as server:
+        from src.blockchain import fetch_wbtc_bulk
+
+        fetch_wbtc_bulk.ETHERSCAN_URL = server.url
+        print(f"Фейковый Etherscan: {server.url}, блоки {fake.start_block}..{fake.head_block}")
+        fetched = run_fetch_stages(server, keys, args.concurrent)
+
+    stages = fetched["stages"]
+    normalized = run_normalize_stage(fetched.pop("raw"))
+    stages["normalize"] = normalized["stage"]
+    if args.db:
+        stages.update(run_db_stages(normalized["records"]))
+
+    result = {
+        "run_at": datetime.now(timezone.utc).isoformat(),
+        "label": args.label,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "config_id": config_id(config),
+        "config": config,
+        "stages": stages,
+    }
+    previous = next((r for r in reversed(load_results(args.results)) if r.get("config_id") == result["config_id"]), None)
+    append_result(args.results, result)
+
+    print(f"\nКонфигурация {result['config_id']} ({args.transfers} переводов, ключей {args.keys}):")
+    for line in compare(result, previous):
+        print(line)
+    print(f"Результат дописан в {args.results}")
+
+
+if __name__ == "__main__":
+    main()
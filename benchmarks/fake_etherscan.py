@@ -0,0 +1,315 @@
+import argparse
+import gzip
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from benchmarks.synthetic import make_address_pool, transfer_at
+
+API_PATH = "/v2/api"
+STATS_PATH = "/__stats"
+
+RATE_LIMIT_RESULT = "Max calls per sec rate limit reached ({rate}/sec)"
+WINDOW_RESULT = "Result window is too large, PageNo x Offset size must be less than or equal to {limit}"
+INVALID_KEY_RESULT = "Invalid API Key (#err2)|"
+
+
+@dataclass
+class FakeEtherscanConfig:
+    """
+    Синтетическая цепь и поведение API:
+    transfers переводов по txs_per_block в блоке начиная со start_block,
+    голова — head_margin блоков после последнего перевода;
+    rate_limit — запросов/с на ключ (0 — без лимита, как у Etherscan: превышение
+    отдаёт status=0 "Max calls per sec rate limit reached");
+    window_limit — page * offset больше него даёт "Result window is too large";
+    latency_ms ± jitter_ms — задержка ответа; error_rate — доля ответов HTTP 502;
+    invalid_keys — ключи, на которые API отвечает "Invalid API Key".
+    """
+    transfers: int = 100_000
+    start_block: int = 10_000_000
+    txs_per_block: int = 3
+    head_margin: int = 100
+    seed: int = 42
+    rate_limit: float = 5.0
+    window_limit: int = 10_000
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    invalid_keys: List[str] = field(default_factory=list)
+
+    @property
+    def last_block(self) -> int:
+        return self.start_block + max(0, self.transfers - 1) // max(1, self.txs_per_block)
+
+    @property
+    def head_block(self) -> int:
+        return self.last_block + self.head_margin
+
+
+class FakeChain:
+    """
+    Переводы синтетической цепи по номеру (transfer_at), без хранения в памяти:
+    диапазон блоков → диапазон номеров, страница — срез номеров.
+    """
+
+    def __init__(self, config: FakeEtherscanConfig) -> None:
+        self.config = config
+        self._addresses = make_address_pool(seed=config.seed)
+
+    def index_range(self, start_block: int, end_block: int) -> Tuple[int, int]:
+        cfg = self.config
+        per_block = max(1, cfg.txs_per_block)
+        lo = max(0, (start_block - cfg.start_block) * per_block)
+        hi = min(cfg.transfers, (end_block - cfg.start_block + 1) * per_block)
+        return lo, max(lo, hi)
+
+    def page(self, start_block: int, end_block: int, page: int, offset: int, sort: str) -> List[Dict[str, str]]:
+        lo, hi = self.index_range(start_block, end_block)
+        skip = (page - 1) * offset
+        if sort == "desc":
+            indices = range(hi - 1 - skip, max(lo, hi - skip - offset) - 1, -1)
+        else:
+            indices = range(lo + skip, min(hi, lo + skip + offset))
+        cfg = self.config
+        return [
+            transfer_at(i, self._addresses, cfg.start_block, cfg.txs_per_block, cfg.seed, cfg.head_block)
+            for i in indices
+        ]
+
+
+class _KeyLimiter:
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._last: Dict[str, float] = {}
+
+    def allow(self, key: str) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            # допуск 5% на дрожание таймеров клиента
+            if last is not None and now - last < 0.95 / self.rate:
+                return False
+            self._last[key] = now
+            return True
+
+
+class FakeEtherscanServer(ThreadingHTTPServer):
+    """
+    Локальный HTTP-сервер, отвечающий как Etherscan v2 на tokentx и
+    proxy/eth_blockNumber. Счётчики ответов — GET /__stats.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: FakeEtherscanConfig, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _Handler)
+        self.config = config
+        self.chain = FakeChain(config)
+        self.limiter = _KeyLimiter(config.rate_limit)
+        self.rng = random.Random(config.seed)
+        self.stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def bump(self, name: str) -> None:
+        with self.stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def start(self) -> "FakeEtherscanServer":
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.1}, name="fake-etherscan", daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeEtherscanServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send(self, status: int, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        gzipped = "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _notok(self, result: str) -> None:
+        self._send(200, {"status": "0", "message": "NOTOK", "result": result})
+
+    def do_GET(self) -> None:  # noqa: N802
+        server = self.server
+        cfg = server.config
+        url = urlparse(self.path)
+        if url.path == STATS_PATH:
+            with server.stats_lock:
+                self._send(200, dict(server.stats))
+            return
+        if url.path != API_PATH:
+            self._send(404, {"error": "not found"})
+            return
+
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        server.bump("requests")
+
+        # лимит считается по моменту прихода запроса, задержка — время обработки
+        key = params.get("apikey", "")
+        allowed = key not in cfg.invalid_keys and server.limiter.allow(key)
+        if cfg.latency_ms or cfg.jitter_ms:
+            time.sleep(max(0.0, cfg.latency_ms + server.rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)) / 1000)
+
+        if key in cfg.invalid_keys:
+            server.bump("invalid_key")
+            self._notok(INVALID_KEY_RESULT)
+            return
+        if not allowed:
+            server.bump("rate_limited")
+            self._notok(RATE_LIMIT_RESULT.format(rate=int(cfg.rate_limit)))
+            return
+        if cfg.error_rate and server.rng.random() < cfg.error_rate:
+            server.bump("http_502")
+            self._send(502, {"error": "bad gateway"})
+            return
+
+        action = params.get("action")
+        if action == "eth_blockNumber":
+            server.bump("block_number")
+            self._send(200, {"jsonrpc": "2.0", "id": 83, "result": hex(cfg.head_block)})
+            return
+        if action != "tokentx":
+            self._notok(f"Unsupported action {action}")
+            return
+
+        page = int(params.get("page", 1))
+        offset = int(params.get("offset", 10_000))
+        if page * offset > cfg.window_limit:
+            server.bump("window_errors")
+            self._notok(WINDOW_RESULT.format(limit=cfg.window_limit))
+            return
+
+        txs = server.chain.page(
+            int(params.get("startblock", 0)),
+            int(params.get("endblock", cfg.head_block)),
+            page,
+            offset,
+            params.get("sort", "asc"),
+        )
+        if not txs:
+            server.bump("empty_pages")
+            self._send(200, {"status": "0", "message": "No transactions found", "result": []})
+            return
+        server.bump("pages")
+        with server.stats_lock:
+            server.stats["transfers"] = server.stats.get("transfers", 0) + len(txs)
+        self._send(200, {"status": "1", "message": "OK", "result": txs})
+
+
+def fetch_stats(url: str) -> Dict[str, int]:
+    base = url[: -len(API_PATH)] if url.endswith(API_PATH) else url
+    with urlopen(base + STATS_PATH, timeout=10) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+class FakeEtherscanProcess:
+    """
+    Сервер в отдельном процессе: для замеров клиента, чтобы генерация и
+    gzip ответов не делили GIL с измеряемым кодом.
+    """
+
+    def __init__(self, config: FakeEtherscanConfig) -> None:
+        self.config = config
+        self.url = ""
+        self._proc: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "FakeEtherscanProcess":
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_etherscan", "--config-json", json.dumps(asdict(self.config))],
+            cwd=PROJECT_ROOT,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        # первая строка вывода — адрес API
+        self.url = self._proc.stdout.readline().strip()
+        if not self.url.startswith("http"):
+            self.__exit__()
+            raise RuntimeError("Фейковый Etherscan не запустился")
+        return self
+
+    def stats(self) -> Dict[str, int]:
+        return fetch_stats(self.url)
+
+    def __exit__(self, *exc) -> None:
+        if self._proc is not None:
+            self._proc.terminate()
+            self._proc.wait(timeout=10)
+            self._proc = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальный фейковый Etherscan v2 (tokentx, eth_blockNumber) на синтетической цепи")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 — свободный порт")
+    parser.add_argument("--transfers", type=int, default=FakeEtherscanConfig.transfers)
+    parser.add_argument("--txs-per-block", type=int, default=FakeEtherscanConfig.txs_per_block)
+    parser.add_argument("--rate-limit", type=float, default=FakeEtherscanConfig.rate_limit, help="Запросов/с на ключ (0 — без лимита)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов HTTP 502")
+    parser.add_argument("--config-json", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config_json:
+        config = FakeEtherscanConfig(**json.loads(args.config_json))
+    else:
+        config = FakeEtherscanConfig(
+            transfers=args.transfers,
+            txs_per_block=args.txs_per_block,
+            rate_limit=args.rate_limit,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+        )
+
+    server = FakeEtherscanServer(config, args.host, args.port)
+    print(server.url, flush=True)
+    if not args.config_json:
+        print(
+            f"Блоки {config.start_block}..{config.last_block} (голова {config.head_block}), переводов {config.transfers}. "
+            f"ETHERSCAN_API_URL={server.url}",
+            flush=True,
+        )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import random
+from typing import Dict, List, Optional
+
+WBTC_CONTRACT = "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599"
+BENCH_HASH_PREFIX = "0xbe0c"
+GENESIS_TS = 1_543_000_000  # ~ запуск WBTC
+
+
+def _hex(rng: random.Random, nbytes: int) -> str:
+    return "0x" + "".join(f"{rng.getrandbits(8):02x}" for _ in range(nbytes))
+
+
+def make_raw_transfers(
+    count: int,
+    start_block: int = 10_000_000,
+    txs_per_block: int = 3,
+    seed: int = 42,
+    address_pool: int = 5_000,
+    hash_prefix: str = BENCH_HASH_PREFIX,
+    head_block: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Синтетические транзакции в формате Etherscan tokentx (все поля — строки),
+    по возрастанию блоков. Хэши начинаются с hash_prefix, чтобы их можно было
+    вычистить из БД после бенчмарка. Суммы — лог-нормальные, с редкими китами.
+    """
+    rng = random.Random(seed)
+    addresses = [_hex(rng, 20) for _ in range(address_pool)]
+    head = head_block if head_block is not None else start_block + count // max(1, txs_per_block) + 100
+
+    txs: List[Dict[str, str]] = []
+    for i in range(count):
+        block = start_block + i // max(1, txs_per_block)
+        value_btc = min(5_000.0, rng.lognormvariate(-1.0, 2.0))
+        gas_used = rng.randint(40_000, 120_000)
+        txs.append({
+            "blockNumber": str(block),
+            "timeStamp": str(GENESIS_TS + (block - start_block) * 12),
+            "hash": f"{hash_prefix}{i:060x}"[:66],
+            "nonce": str(rng.randint(0, 10_000)),
+            "blockHash": f"0x{block:064x}",
+            "from": rng.choice(addresses),
+            "contractAddress": WBTC_CONTRACT,
+            "to": rng.choice(addresses),
+            "value": str(max(1_000_000, int(value_btc * 10 ** 8))),
+            "tokenName": "Wrapped BTC",
+            "tokenSymbol": "WBTC",
+            "tokenDecimal": "8",
+            "transactionIndex": str(i % 200),
+            "gas": str(gas_used + 20_000),
+            "gasPrice": str(rng.randint(5, 150) * 10 ** 9),
+            "gasUsed": str(gas_used),
+            "cumulativeGasUsed": str(gas_used * rng.randint(1, 200)),
+            "input": "deprecated",
+            "methodId": "0xa9059cbb",
+            "functionName": "transfer(address _to, uint256 _value)",
+            "confirmations": str(max(1, head - block + 1)),
+        })
+    return txs
+
+
+def make_address_pool(size: int = 5_000, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    return [_hex(rng, 20) for _ in range(size)]
+
+
+def transfer_at(
+    index: int,
+    addresses: List[str],
+    start_block: int = 10_000_000,
+    txs_per_block: int = 3,
+    seed: int = 42,
+    head_block: Optional[int] = None,
+    hash_prefix: str = BENCH_HASH_PREFIX,
+) -> Dict[str, str]:
+    """
+    index-й перевод синтетической цепи в формате tokentx. В отличие от
+    make_raw_transfers не требует генерировать всё заранее: любой перевод
+    воспроизводится по номеру (для фейкового Etherscan с миллионами строк).
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    block = start_block + index // max(1, txs_per_block)
+    head = head_block if head_block is not None else block + 100
+    value_btc = min(5_000.0, rng.lognormvariate(-1.0, 2.0))
+    gas_used = rng.randint(40_000, 120_000)
+    return {
+        "blockNumber": str(block),
+        "timeStamp": str(GENESIS_TS + (block - start_block) * 12),
+        "hash": f"{hash_prefix}{index:060x}"[:66],
+        "nonce": str(rng.randint(0, 10_000)),
+        "blockHash": f"0x{block:064x}",
+        "from": rng.choice(addresses),
+        "contractAddress": WBTC_CONTRACT,
+        "to": rng.choice(addresses),
+        "value": str(max(1_000_000, int(value_btc * 10 ** 8))),
+        "tokenName": "Wrapped BTC",
+        "tokenSymbol": "WBTC",
+        "tokenDecimal": "8",
+        "transactionIndex": str(index % max(1, txs_per_block)),
+        "gas": str(gas_used + 20_000),
+        "gasPrice": str(rng.randint(5, 150) * 10 ** 9),
+        "gasUsed": str(gas_used),
+        "cumulativeGasUsed": str(gas_used * rng.randint(1, 200)),
+        "input": "deprecated",
+        "methodId": "0xa9059cbb",
+        "functionName": "transfer(address _to, uint256 _value)",
+        "confirmations": str(max(1, head - block + 1)),
+    }
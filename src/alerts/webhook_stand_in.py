@@ -0,0 +1,50 @@
+import json
+import sys
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.alerts.whale_alerts import DEFAULT_WEBHOOK_URL
+
+
+class AlertHandler(BaseHTTPRequestHandler):
+    """
+    Локальная заглушка webhook: принимает POST с массивом алертов и печатает
+    их с задержкой «время блока → получение».
+    """
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        alerts = json.loads(self.rfile.read(length) or b"[]")
+        received = datetime.now(timezone.utc)
+        for alert in alerts:
+            block_time = datetime.fromisoformat(alert["time_stamp"])
+            lag = (received - block_time).total_seconds()
+            print(
+                f"🐋 {alert['value_wbtc']} WBTC {alert['from_address']} → {alert['to_address']} "
+                f"(блок {alert['block_number']}, {lag:.1f}s после блока)"
+            )
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args) -> None:
+        # стандартный access-лог не нужен
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+    from urllib.parse import urlparse
+
+    default_port = urlparse(DEFAULT_WEBHOOK_URL).port
+    parser = argparse.ArgumentParser(description="Локальная заглушка webhook для алертов по китам")
+    parser.add_argument("--port", type=int, default=default_port)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), AlertHandler)
+    print(f"Слушаю алерты на http://127.0.0.1:{args.port}/")
+    server.serve_forever()
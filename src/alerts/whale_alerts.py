@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.config import load_project_dotenv
+
+load_project_dotenv()
+
+SINK_NOTIFY = "notify"
+SINK_WEBHOOK = "webhook"
+SINK_JSONL = "jsonl"
+
+NOTIFY_CHANNEL = "wbtc_whale_alerts"
+DEFAULT_WEBHOOK_URL = "http://127.0.0.1:8765/alerts"
+DEFAULT_JSONL_PATH = PROJECT_ROOT / "data" / "whale_alerts.jsonl"
+WEBHOOK_TIMEOUT_SEC = 5
+
+
+@dataclass
+class WhaleAlert:
+    tx_hash: str
+    block_number: int
+    time_stamp: str
+    from_address: str
+    to_address: str
+    value_wbtc: str
+    alerted_at: str
+    # от времени блока до отправки алерта
+    latency_sec: float
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+
+def make_alert(whale: Dict[str, Any], now: Optional[datetime] = None) -> WhaleAlert:
+    """
+    Алерт из вставленной строки-кита (формат on_whales у save_transfers_batch).
+    """
+    now = now or datetime.now(timezone.utc)
+    block_time = datetime.fromisoformat(whale["time_stamp"])
+    return WhaleAlert(
+        tx_hash=whale["tx_hash"],
+        block_number=int(whale["block_number"]),
+        time_stamp=block_time.isoformat(),
+        from_address=whale["from_address"],
+        to_address=whale["to_address"],
+        value_wbtc=str(whale["value_wbtc"]),
+        alerted_at=now.isoformat(),
+        latency_sec=round((now - block_time).total_seconds(), 3),
+    )
+
+
+class NotifySink:
+    """
+    Postgres LISTEN/NOTIFY: каждый алерт — pg_notify(channel, json).
+    Слушать: LISTEN wbtc_whale_alerts;
+    """
+
+    def __init__(self, channel: str = NOTIFY_CHANNEL):
+        self.channel = channel
+
+    def send(self, alerts: List[WhaleAlert]) -> None:
+        from src.db.connection import pooled_connection
+
+        with pooled_connection() as conn:
+            with conn, conn.cursor() as cur:
+                # уведомления уходят слушателям при коммите
+                for alert in alerts:
+                    cur.execute("SELECT pg_notify(%s, %s);", (self.channel, alert.to_json()))
+
+
+class WebhookSink:
+    """
+    POST пачки алертов JSON-массивом (локальная заглушка: python -m src.alerts.webhook_stand_in).
+    """
+
+    def __init__(self, url: str = DEFAULT_WEBHOOK_URL, timeout: float = WEBHOOK_TIMEOUT_SEC):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts: List[WhaleAlert]) -> None:
+        import requests
+
+        body = "[" + ",".join(alert.to_json() for alert in alerts) + "]"
+        resp = requests.post(
+            self.url,
+            data=body.encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+
+
+class JsonlSink:
+    """
+    Дописывает алерты в JSONL-файл, по строке на алерт.
+    """
+
+    def __init__(self, path: Path = DEFAULT_JSONL_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def send(self, alerts: List[WhaleAlert]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lines = "".join(alert.to_json() + "\n" for alert in alerts)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+
+
+class AlertStats:
+    """
+    Число алертов и задержка «время блока → алерт» (p50/p95/max).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.failed = 0
+
+    def add(self, alerts: List[WhaleAlert]) -> None:
+        with self._lock:
+            self.latencies.extend(alert.latency_sec for alert in alerts)
+
+    def add_failure(self, count: int) -> None:
+        with self._lock:
+            self.failed += count
+
+    def summary(self) -> str:
+        with self._lock:
+            values = sorted(self.latencies)
+            failed = self.failed
+        if not values:
+            return f"Алерты по китам: 0 (ошибок отправки {failed})"
+
+        def pct(p: float) -> float:
+            return values[min(len(values) - 1, int(p * len(values)))]
+
+        return (
+            f"Алерты по китам: {len(values)} (ошибок отправки {failed}), задержка блок→алерт: "
+            f"p50 {pct(0.5):.1f}s, p95 {pct(0.95):.1f}s, max {values[-1]:.1f}s"
+        )
+
+
+class WhaleAlerter:
+    """
+    Callback для save_transfers_batch(on_whales=...): превращает вставленных
+    китов в алерты и рассылает во все sinks. Ошибка sink'а не роняет загрузку —
+    она логируется и считается в stats.
+    """
+
+    def __init__(self, sinks: List[Any]):
+        self.sinks = sinks
+        self.stats = AlertStats()
+
+    def __call__(self, whales: List[Dict[str, Any]]) -> None:
+        alerts = [make_alert(whale) for whale in whales]
+        for sink in self.sinks:
+            try:
+                sink.send(alerts)
+            except Exception as e:
+                self.stats.add_failure(len(alerts))
+                print(f"⚠️  {type(sink).__name__}: не удалось отправить {len(alerts)} алертов: {e}")
+        self.stats.add(alerts)
+
+
+def skip_realerts(
+    on_whales: Callable[[List[Dict[str, Any]]], None],
+    already_alerted: Set[str],
+) -> Callable[[List[Dict[str, Any]]], None]:
+    """
+    Обёртка on_whales для поллера: already_alerted — tx_hash китов, удалённых
+    реоргом (алерт по ним уже уходил). Их повторная вставка алерт не шлёт,
+    хэш при этом убирается из множества (оно общее с поллером и не растёт).
+    """
+
+    def wrapped(whales: List[Dict[str, Any]]) -> None:
+        fresh = [whale for whale in whales if whale["tx_hash"] not in already_alerted]
+        already_alerted.difference_update(whale["tx_hash"] for whale in whales)
+        if fresh:
+            on_whales(fresh)
+
+    return wrapped
+
+
+def build_sinks(spec: str) -> List[Any]:
+    """
+    Sinks по списку через запятую: notify, webhook, jsonl.
+    Адрес webhook — WHALE_ALERT_WEBHOOK_URL, файл — WHALE_ALERT_JSONL_PATH.
+    """
+    sinks: List[Any] = []
+    for name in (part.strip().lower() for part in spec.split(",")):
+        if name == SINK_NOTIFY:
+            sinks.append(NotifySink())
+        elif name == SINK_WEBHOOK:
+            sinks.append(WebhookSink(os.getenv("WHALE_ALERT_WEBHOOK_URL", DEFAULT_WEBHOOK_URL)))
+        elif name == SINK_JSONL:
+            sinks.append(JsonlSink(Path(os.getenv("WHALE_ALERT_JSONL_PATH", str(DEFAULT_JSONL_PATH)))))
+        elif name:
+            raise ValueError(f"Неизвестный sink алертов: {name}")
+    return sinks
+
+
+_alerter_lock = threading.Lock()
+_alerter: Optional[WhaleAlerter] = None
+_alerter_spec: Optional[str] = None
+
+
+def get_whale_alerter() -> Optional[WhaleAlerter]:
+    """
+    Общий на процесс WhaleAlerter по ENV WHALE_ALERT_SINKS (например, "notify,jsonl").
+    None — алерты выключены (по умолчанию).
+    """
+    global _alerter, _alerter_spec
+    spec = os.getenv("WHALE_ALERT_SINKS", "").strip()
+    if not spec:
+        return None
+    with _alerter_lock:
+        if _alerter is None or _alerter_spec != spec:
+            _alerter = WhaleAlerter(build_sinks(spec))
+            _alerter_spec = spec
+    return _alerter
@@ -0,0 +1,122 @@
+import sys
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+# водяной знак витрины daily_stats: все строки raw с id <= last_id уже учтены
+DAILY_STATS_WATERMARK = "daily_stats"
+
+DAILY_STATS_COLUMNS = [
+    "date",
+    "tx_count",
+    "total_volume_wbtc",
+    "whale_tx_count",
+    "max_tx_volume",
+    "top_sender",
+    "total_fee_usd",
+]
+
+UPSERT_DAILY_STATS_SQL = f"""
+INSERT INTO analytics.daily_stats ({", ".join(DAILY_STATS_COLUMNS)})
+VALUES %s
+ON CONFLICT (date) DO UPDATE
+SET {", ".join(f"{col} = EXCLUDED.{col}" for col in DAILY_STATS_COLUMNS[1:])};
+"""
+
+
+def get_watermark(cur, name: str, for_update: bool = False) -> int:
+    """
+    Текущий водяной знак (последний учтённый id raw.wbtc_transfers), 0 если его ещё нет.
+    for_update=True блокирует строку до конца транзакции, чтобы два инкрементальных
+    пересчёта не шли одновременно.
+    """
+    cur.execute(
+        "INSERT INTO analytics.watermarks (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;",
+        (name,),
+    )
+    lock = " FOR UPDATE" if for_update else ""
+    cur.execute(f"SELECT last_id FROM analytics.watermarks WHERE name = %s{lock};", (name,))
+    return int(cur.fetchone()[0])
+
+
+def set_watermark(cur, name: str, last_id: int) -> None:
+    cur.execute(
+        """
+        UPDATE analytics.watermarks
+        SET last_id = %s, updated_at = now()
+        WHERE name = %s;
+        """,
+        (last_id, name),
+    )
+
+
+def touched_dates(cur, after_id: int) -> Tuple[List[date], int]:
+    """
+    Дни (UTC), в которые попали строки raw с id > after_id, и максимальный id среди них.
+    Идёт по первичному ключу, поэтому стоимость зависит от объёма новых данных.
+    """
+    cur.execute(
+        """
+        SELECT date(time_stamp), MAX(id)
+        FROM raw.wbtc_transfers
+        WHERE id > %s
+        GROUP BY 1
+        ORDER BY 1;
+        """,
+        (after_id,),
+    )
+    rows = cur.fetchall()
+    max_id = max((int(row[1]) for row in rows), default=after_id)
+    return [row[0] for row in rows], max_id
+
+
+def upsert_daily_stats(cur, rows: Sequence[Sequence[Any]], dates: Sequence[date] = ()) -> int:
+    """
+    Upsert строк витрины (порядок колонок — DAILY_STATS_COLUMNS) по первичному ключу date.
+    Дни из dates, для которых строк не пришло (все переводы дня удалены), убираются.
+    Возвращает число записанных строк.
+    """
+    if rows:
+        execute_values(cur, UPSERT_DAILY_STATS_SQL, rows)
+
+    present = {row[0] for row in rows}
+    stale = [d for d in dates if d not in present]
+    if stale:
+        cur.execute("DELETE FROM analytics.daily_stats WHERE date = ANY(%s);", (stale,))
+    return len(rows)
+
+
+def fetch_top_senders(cur, dates: Sequence[date], limit: int = 1) -> Dict[date, List[Tuple[str, Any]]]:
+    """
+    Топ-limit отправителей по объёму за каждый из dates из analytics.daily_sender_volume:
+    {date: [(from_address, volume), ...]} по убыванию объёма.
+    """
+    if not dates:
+        return {}
+    cur.execute(
+        """
+        SELECT date, from_address, volume
+        FROM (
+            SELECT
+                date,
+                from_address,
+                volume,
+                ROW_NUMBER() OVER (PARTITION BY date ORDER BY volume DESC, from_address) AS rn
+            FROM analytics.daily_sender_volume
+            WHERE date = ANY(%s) AND volume > 0
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY date, rn;
+        """,
+        (list(dates), limit),
+    )
+    top: Dict[date, List[Tuple[str, Any]]] = {}
+    for day, address, volume in cur.fetchall():
+        top.setdefault(day, []).append((address, volume))
+    return top
@@ -1,106 +1,322 @@
 import os
 import sys
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 from pathlib import Path
+from typing import List, Optional
 
 import dask.dataframe as dd
-from sqlalchemy import create_engine
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 from src.utils.config import load_project_dotenv
+from src.db.connection import make_pg_url, pooled_connection
+from src.analytics.daily_stats_store import (
+    DAILY_STATS_COLUMNS,
+    DAILY_STATS_WATERMARK,
+    fetch_top_senders,
+    get_watermark,
+    set_watermark,
+    touched_dates,
+    upsert_daily_stats,
+)
+from src.analytics.rebuild_daily_stats import rebuild_daily_sender_volume
+from src.db.rollups import rebuild_rollups
+from src.analytics.parquet_lake import load_manifest, read_lake, sync_lake
+from src.utils.profiling import profile_artifact_path, profile_stage
 
 load_project_dotenv()
 
+SOURCE_DB = "db"
+SOURCE_LAKE = "lake"
 
-def make_pg_url() -> str:
-    host = os.getenv("PGHOST", "localhost")
-    port = os.getenv("PGPORT", "5432")
-    db   = os.getenv("PGDATABASE", "tobd")
-    user = os.getenv("PGUSER", "postgres")
-    pwd  = os.getenv("PGPASSWORD", "postgres")
+# колонки, которые нужны дневным метрикам (input и прочие тяжёлые поля не читаем)
+STATS_COLUMNS = ["time_stamp", "tx_hash", "value_wbtc", "is_whale", "tx_fee_usd"]
+# целевой размер партиции Dask при чтении из Postgres
+PARTITION_ROWS = 250_000
 
-    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
 
+def analytics_source() -> str:
+    """
+    Откуда Dask читает переводы: "db" (raw.wbtc_transfers) или "lake"
+    (Parquet-копия, см. parquet_lake). ENV WBTC_ANALYTICS_SOURCE, по умолчанию db.
+    """
+    source = os.getenv("WBTC_ANALYTICS_SOURCE", SOURCE_DB).strip().lower()
+    return source if source in (SOURCE_DB, SOURCE_LAKE) else SOURCE_DB
 
-def rebuild_daily_stats_with_dask() -> int:
+
+def _dask_client():
     """
-    Читаем сырые транзакции WBTC из raw.wbtc_transfers с помощью Dask,
-    считаем дневные метрики для мониторинга китов и пишем в analytics.daily_stats.
-    Возвращает количество строк, записанных в analytics.daily_stats.
+    Клиент dask.distributed, если задан DASK_SCHEDULER_ADDRESS (например,
+    tcp://127.0.0.1:8786 локального кластера), иначе None — локальный планировщик.
     """
+    address = os.getenv("DASK_SCHEDULER_ADDRESS", "").strip()
+    if not address:
+        return None
+    from dask.distributed import Client
+
+    return Client(address)
 
-    pg_url = make_pg_url()
-    engine = create_engine(pg_url)
 
-    table_name = "wbtc_transfers"
+def _worker_threads(client) -> int:
+    if client is not None:
+        return max(1, sum(client.nthreads().values()))
+    return os.cpu_count() or 1
+
+
+def day_divisions(first_day: date, last_day: date, npartitions: int) -> List[datetime]:
+    """
+    Границы партиций Dask по полуночам UTC: все строки одного дня попадают
+    в одну партицию, поэтому дневные агрегаты считаются внутри партиций без shuffle.
+    read_sql_table включает последнюю границу (time_stamp <= upper), поэтому она —
+    последняя микросекунда last_day, а не полночь следующего дня: иначе строки
+    ровно в 00:00:00 дня после диапазона дали бы неполный агрегат этого дня.
+    """
+    days = (last_day - first_day).days + 1
+    step = -(-days // max(1, min(npartitions, days)))
+    bounds = [
+        datetime.combine(first_day + timedelta(days=offset), datetime.min.time(), tzinfo=timezone.utc)
+        for offset in range(0, days, step)
+    ]
+    bounds.append(datetime.combine(last_day, datetime.max.time(), tzinfo=timezone.utc))
+    return bounds
+
+
+def _plan_partitions(lo: Optional[date], hi: Optional[date], workers: int):
+    """
+    Диапазон дней и число партиций: ~PARTITION_ROWS строк на партицию,
+    но не меньше двух партиций на поток воркеров.
+    """
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            if lo is None:
+                # оценка по статистике планировщика вместо COUNT(*) по всей таблице
+                cur.execute(
+                    """
+                    SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)
+                    FROM pg_class c
+                    WHERE c.oid = 'raw.wbtc_transfers'::regclass
+                       OR c.oid IN (SELECT inhrelid FROM pg_inherits
+                                    WHERE inhparent = 'raw.wbtc_transfers'::regclass);
+                    """
+                )
+                rows = int(cur.fetchone()[0])
+                cur.execute("SELECT MIN(time_stamp), MAX(time_stamp) FROM raw.wbtc_transfers;")
+                min_ts, max_ts = cur.fetchone()
+                if min_ts is None:
+                    return None
+                first_day, last_day = min_ts.astimezone(timezone.utc).date(), max_ts.astimezone(timezone.utc).date()
+            else:
+                cur.execute(
+                    "SELECT COUNT(*) FROM raw.wbtc_transfers WHERE time_stamp >= %s AND time_stamp < %s;",
+                    (lo, hi),
+                )
+                rows = int(cur.fetchone()[0])
+                first_day, last_day = lo, hi - timedelta(days=1)
+
+    npartitions = max(2 * workers, -(-rows // PARTITION_ROWS))
+    return first_day, last_day, npartitions
+
+
+def _read_transfers(pg_url: str, workers: int, lo: Optional[date] = None, hi: Optional[date] = None):
+    """
+    raw.wbtc_transfers целиком или только дни [lo, hi): только STATS_COLUMNS,
+    индекс — time_stamp с границами партиций по суткам (day_divisions).
+    None, если читать нечего.
+    """
+    plan = _plan_partitions(lo, hi, workers)
+    if plan is None:
+        return None
+    first_day, last_day, npartitions = plan
 
     ddf = dd.read_sql_table(
-        table_name=table_name,
+        table_name="wbtc_transfers",
         con=pg_url,
-        index_col="id",
         schema="raw",
-        npartitions=8,  # можно подобрать под свою машину
+        index_col="time_stamp",
+        columns=[col for col in STATS_COLUMNS if col != "time_stamp"],
+        divisions=day_divisions(first_day, last_day, npartitions),
     )
+    return ddf.reset_index()
 
-    # отбрасываем пустые и дефектные записи
-    ddf = ddf[ddf["value_wbtc"] > 0]
 
-    # приводим time_stamp к дате
-    ddf["date"] = ddf["time_stamp"].dt.date
+_PARTIALS_META = {
+    "date": "object",
+    "tx_count": "int64",
+    "total_volume_wbtc": "object",
+    "whale_tx_count": "int64",
+    "max_tx_volume": "object",
+    "total_fee_usd": "object",
+}
 
-    daily = ddf.groupby("date").agg(
+
+def _daily_partials(pdf):
+    """
+    Дневные агрегаты одной партиции (pandas). Все метрики сливаемые
+    (count/sum/max), поэтому день, попавший в несколько партиций (файлы lake
+    от разных выгрузок), просто досворачивается после compute.
+    """
+    # отбрасываем пустые и дефектные записи
+    pdf = pdf[pdf["value_wbtc"] > 0]
+
+    # приводим time_stamp к дате в UTC, как date(time_stamp) в SQL-пути
+    day = pdf["time_stamp"].dt.tz_convert("UTC").dt.date
+    # комиссии — Decimal или None (нет газовых полей); None не складывается
+    fee = pdf["tx_fee_usd"].fillna(Decimal(0))
+    daily = pdf.assign(date=day, tx_fee_usd=fee).groupby("date").agg(
         tx_count=("tx_hash", "count"),
         total_volume_wbtc=("value_wbtc", "sum"),
         whale_tx_count=("is_whale", "sum"),
         max_tx_volume=("value_wbtc", "max"),
+        total_fee_usd=("tx_fee_usd", "sum"),
     )
+    return daily.reset_index().astype({"tx_count": "int64", "whale_tx_count": "int64"})
 
-    sender_volume = (
-        ddf[["date", "from_address", "value_wbtc"]]
-        .groupby(["date", "from_address"])
-        .agg(total_from_value=("value_wbtc", "sum"))
-    )
 
-    # Dask → pandas
-    daily_pd = daily.compute().reset_index()
-    sender_pd = sender_volume.compute().reset_index()
+def _aggregate_daily(ddf):
+    """
+    Дневные метрики (pandas) из Dask DataFrame переводов: агрегаты внутри
+    партиций + свёртка маленькой таблицы по дням. top_sender не считается
+    здесь: он читается из analytics.daily_sender_volume, которую ведёт загрузка.
+    """
+    with profile_stage("analytics.compute"):
+        partials = ddf.map_partitions(_daily_partials, meta=_PARTIALS_META).compute()
 
-    # топ-10 отправителей на день
-    top_senders = (
-        sender_pd.sort_values(["date", "total_from_value"], ascending=[True, False])
-        .groupby("date")
-        .head(10)
+    daily_pd = (
+        partials.groupby("date")
+        .agg(
+            tx_count=("tx_count", "sum"),
+            total_volume_wbtc=("total_volume_wbtc", "sum"),
+            whale_tx_count=("whale_tx_count", "sum"),
+            max_tx_volume=("max_tx_volume", "max"),
+            total_fee_usd=("total_fee_usd", "sum"),
+        )
+        .reset_index()
     )
-    top_sender = (
-        top_senders.groupby("date")
-        .first()
-        .reset_index()[["date", "from_address"]]
-        .rename(columns={"from_address": "top_sender"})
-    )
-
-    daily_pd = daily_pd.merge(top_sender, on="date", how="left")
     daily_pd["tx_count"] = daily_pd["tx_count"].astype(int)
     daily_pd["whale_tx_count"] = daily_pd["whale_tx_count"].astype(int)
 
     # на всякий случай сортируем
-    daily_pd = daily_pd.sort_values("date")
-
-    # пишем в Postgres
-    # if_exists="replace": полностью пересобираем витрину
-    daily_pd.to_sql(
-        name="daily_stats",
-        con=engine,
-        schema="analytics",
-        if_exists="replace",
-        index=False,
-    )
+    return daily_pd.sort_values("date")
+
+
+def _py_value(value):
+    # numpy-скаляры → python, NaN → NULL, чтобы psycopg2 их адаптировал
+    if value != value:
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _frame_rows(daily_pd):
+    return [tuple(_py_value(v) for v in row) for row in daily_pd.itertuples(index=False, name=None)]
+
+
+def rebuild_daily_stats_with_dask(incremental: bool = False, source: Optional[str] = None) -> int:
+    """
+    Читаем сырые транзакции WBTC из raw.wbtc_transfers с помощью Dask,
+    считаем дневные метрики для мониторинга китов и upsert'им в analytics.daily_stats
+    (ON CONFLICT (date) DO UPDATE — таблица и её первичный ключ сохраняются).
+    Полная пересборка заново собирает и analytics.daily_sender_volume (источник
+    top_sender), и внутридневные корзины.
+    С incremental=True читаются только дни, в которые попали строки с id больше
+    водяного знака (см. refresh_daily_stats_incremental).
+    Расчёт идёт без блокировки водяного знака; если за это время его сдвинул
+    другой пересчёт, результат не пишется (возвращается 0).
+    source="lake" — сначала дописываем новые строки в Parquet-копию, затем читаем
+    из неё только нужные колонки и дни, не нагружая Postgres (по умолчанию analytics_source()).
+    Возвращает количество строк, записанных в analytics.daily_stats.
+    """
+    source = source or analytics_source()
+    if source == SOURCE_LAKE:
+        sync_lake()
+
+    # Dask-задачи получают URL и открывают соединения сами
+    pg_url = make_pg_url()
+
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            # долгий расчёт идёт без блокировки: перед записью сверяем с этим значением
+            started_watermark = get_watermark(cur, DAILY_STATS_WATERMARK)
+            if incremental:
+                dates, max_id = touched_dates(cur, started_watermark)
+            else:
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM raw.wbtc_transfers;")
+                dates, max_id = [], int(cur.fetchone()[0])
+
+    lo = hi = None
+    if incremental:
+        if not dates:
+            print("Новых строк для analytics.daily_stats нет")
+            return 0
+        # дни между затронутыми тоже пересчитываются — значения просто совпадут
+        lo, hi = dates[0], dates[-1] + timedelta(days=1)
+
+    client = _dask_client()
+    try:
+        if source == SOURCE_LAKE:
+            # водяной знак — то, что реально есть в копии
+            max_id = min(max_id, load_manifest()["last_id"])
+            ddf = read_lake(STATS_COLUMNS, lo=lo, hi=hi)
+        else:
+            ddf = _read_transfers(pg_url, _worker_threads(client), lo=lo, hi=hi)
 
-    rows_written = len(daily_pd)
+        if ddf is None:
+            print("Нет переводов для пересчёта")
+            return 0
+        # задачи идут на воркерах: их профиль снимает сам dask.distributed
+        report = profile_artifact_path("dask-performance.html") if client is not None else None
+        if report is not None:
+            from dask.distributed import performance_report
+
+            with performance_report(filename=str(report)):
+                daily_pd = _aggregate_daily(ddf)
+        else:
+            daily_pd = _aggregate_daily(ddf)
+    finally:
+        if client is not None:
+            client.close()
+
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            watermark = get_watermark(cur, DAILY_STATS_WATERMARK, for_update=True)
+            if watermark != started_watermark:
+                # пока считал Dask, витрину обновил другой пересчёт (например, поллер):
+                # его дни свежее наших, а водяной знак нельзя откатывать назад
+                print(
+                    f"Водяной знак {DAILY_STATS_WATERMARK} сдвинулся ({started_watermark} → {watermark}) "
+                    "во время расчёта: запись пропущена, повторите пересчёт"
+                )
+                return 0
+            if not incremental:
+                # top_sender читается из daily_sender_volume: полная пересборка
+                # сначала пересобирает и её (иначе история без бэкфилла даёт NULL),
+                # а заодно внутридневные корзины — как rebuild_daily_stats
+                cur.execute("SET LOCAL statement_timeout = 0;")
+                rebuild_daily_sender_volume(cur)
+                rebuild_rollups(cur)
+            top = fetch_top_senders(cur, list(daily_pd["date"]))
+            daily_pd["top_sender"] = [top[d][0][0] if d in top else None for d in daily_pd["date"]]
+            rows = _frame_rows(daily_pd[DAILY_STATS_COLUMNS])
+
+            if not incremental:
+                # полная пересборка: дни, которых больше нет в raw, удаляем
+                cur.execute("DELETE FROM analytics.daily_stats WHERE date <> ALL(%s);", ([row[0] for row in rows],))
+            upsert_daily_stats(cur, rows, dates)
+            set_watermark(cur, DAILY_STATS_WATERMARK, max_id)
+
+    rows_written = len(rows)
     print(f"Записано строк в analytics.daily_stats: {rows_written}")
     return rows_written
 
 
 if __name__ == "__main__":
-    rebuild_daily_stats_with_dask()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересчёт analytics.daily_stats через Dask")
+    parser.add_argument("--incremental", action="store_true", help="Пересчитать только дни с новыми строками")
+    parser.add_argument("--source", choices=[SOURCE_DB, SOURCE_LAKE], default=None, help="Источник: Postgres или Parquet-копия")
+    args = parser.parse_args()
+
+    rebuild_daily_stats_with_dask(incremental=args.incremental, source=args.source)
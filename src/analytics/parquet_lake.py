@@ -0,0 +1,304 @@
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.config import load_project_dotenv
+from src.db.connection import pooled_connection
+from src.db.save_transfers import COLUMNS
+
+load_project_dotenv()
+
+DEFAULT_LAKE_DIR = PROJECT_ROOT / "data" / "lake" / "wbtc_transfers"
+MANIFEST_NAME = "_manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_EXPORT_CHUNK_ROWS = 200_000
+
+# input (calldata) — самая тяжёлая колонка, аналитике не нужна
+LAKE_COLUMNS = ["id", *[col for col in COLUMNS if col != "input"]]
+
+# NUMERIC(78, 0) не влезает в decimal128 — храним строкой
+_TEXT_NUMERIC = {"value_raw", "gas_price_wei", "cumulative_gas_used"}
+
+_SELECT_LIST = ", ".join(f"{col}::text AS {col}" if col in _TEXT_NUMERIC else col for col in LAKE_COLUMNS)
+
+Manifest = Dict[str, Any]
+
+
+def lake_dir() -> Path:
+    """
+    Каталог Parquet-копии raw.wbtc_transfers. ENV WBTC_LAKE_DIR (по умолчанию data/lake/wbtc_transfers).
+    """
+    raw = os.getenv("WBTC_LAKE_DIR", "").strip()
+    return Path(raw) if raw else DEFAULT_LAKE_DIR
+
+
+def _lake_schema():
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(),
+        "block_number": pa.int64(),
+        "time_stamp": pa.timestamp("us", tz="UTC"),
+        "nonce": pa.int64(),
+        "transaction_index": pa.int32(),
+        "token_decimal": pa.int32(),
+        "value_wbtc": pa.decimal128(38, 8),
+        "is_whale": pa.bool_(),
+        "gas_limit": pa.int64(),
+        "gas_used": pa.int64(),
+        "tx_fee_eth": pa.decimal128(38, 18),
+        "tx_fee_usd": pa.decimal128(38, 2),
+        "confirmations": pa.int64(),
+    }
+    return pa.schema([(col, types.get(col, pa.string())) for col in LAKE_COLUMNS])
+
+
+def empty_manifest() -> Manifest:
+    return {"version": MANIFEST_VERSION, "last_id": 0, "max_block": None, "parts": []}
+
+
+def load_manifest(root: Optional[Path] = None) -> Manifest:
+    path = (root or lake_dir()) / MANIFEST_NAME
+    if not path.exists():
+        return empty_manifest()
+    return json.loads(path.read_text())
+
+
+def save_manifest(manifest: Manifest, root: Optional[Path] = None) -> None:
+    """
+    Манифест пишется последним и атомарно (tmp + rename): файл, которого в нём нет,
+    для читателей не существует.
+    """
+    root = root or lake_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, root / MANIFEST_NAME)
+
+
+def part_path(day: date, id_lo: int, id_hi: int) -> str:
+    # hive-раскладка date=YYYY-MM-DD; имя детерминировано диапазоном id,
+    # поэтому повтор прерванной выгрузки перезаписывает тот же файл
+    return f"date={day.isoformat()}/part-{id_lo:012d}-{id_hi:012d}.parquet"
+
+
+def select_parts(
+    manifest: Manifest,
+    lo: Optional[date] = None,
+    hi: Optional[date] = None,
+) -> List[str]:
+    """
+    Файлы манифеста с датой в [lo, hi) — отсечение партиций до чтения данных.
+    """
+    files = []
+    for part in manifest["parts"]:
+        day = part["date"]
+        if lo is not None and day < lo.isoformat():
+            continue
+        if hi is not None and day >= hi.isoformat():
+            continue
+        files.append(part["file"])
+    return sorted(files)
+
+
+def parts_overlapping_blocks(manifest: Manifest, block_lo: int, block_hi: int) -> List[Dict[str, Any]]:
+    return [
+        part
+        for part in manifest["parts"]
+        if part["blocks"][0] <= block_hi and part["blocks"][1] >= block_lo
+    ]
+
+
+def _remove_orphans(root: Path, manifest: Manifest) -> None:
+    # файлы от прерванной выгрузки, не попавшие в манифест
+    known = {part["file"] for part in manifest["parts"]}
+    for path in root.glob("date=*/*.parquet"):
+        if path.relative_to(root).as_posix() not in known:
+            path.unlink()
+
+
+def _write_parts(root: Path, rows: Sequence[Tuple]) -> List[Dict[str, Any]]:
+    """
+    Раскладывает строки (порядок LAKE_COLUMNS) по дням и пишет по файлу на день.
+    Внутри файла строки отсортированы по time_stamp, статистика row group'ов
+    (min/max) позволяет Dask/pyarrow пропускать их по фильтрам.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _lake_schema()
+    ts_idx = LAKE_COLUMNS.index("time_stamp")
+    id_idx = LAKE_COLUMNS.index("id")
+    block_idx = LAKE_COLUMNS.index("block_number")
+
+    by_day: Dict[date, List[Tuple]] = defaultdict(list)
+    for row in rows:
+        by_day[row[ts_idx].date()].append(row)
+
+    parts = []
+    for day, day_rows in sorted(by_day.items()):
+        day_rows.sort(key=lambda r: (r[ts_idx], r[id_idx]))
+        ids = [r[id_idx] for r in day_rows]
+        blocks = [r[block_idx] for r in day_rows]
+        rel = part_path(day, min(ids), max(ids))
+
+        table = pa.table(
+            {col: [r[i] for r in day_rows] for i, col in enumerate(LAKE_COLUMNS)},
+            schema=schema,
+        )
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, path, compression="zstd", write_statistics=True)
+
+        parts.append({
+            "file": rel,
+            "date": day.isoformat(),
+            "blocks": [min(blocks), max(blocks)],
+            "ids": [min(ids), max(ids)],
+            "rows": len(day_rows),
+        })
+    return parts
+
+
+def sync_lake(chunk_rows: int = DEFAULT_EXPORT_CHUNK_ROWS, root: Optional[Path] = None) -> int:
+    """
+    Дописывает в Parquet-копию строки raw.wbtc_transfers, появившиеся после прошлой
+    выгрузки (id > manifest.last_id; выборка идёт по первичному ключу). Каждая
+    пачка — новые файлы + атомарное обновление манифеста, так что прерванную
+    выгрузку можно просто перезапустить. Каждый файл помечен диапазоном блоков
+    (см. invalidate_block_range). Возвращает число выгруженных строк.
+    """
+    root = root or lake_dir()
+    manifest = load_manifest(root)
+    root.mkdir(parents=True, exist_ok=True)
+    _remove_orphans(root, manifest)
+
+    exported = 0
+    while True:
+        with pooled_connection() as conn:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT {_SELECT_LIST}
+                    FROM raw.wbtc_transfers
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s;
+                    """,
+                    (manifest["last_id"], chunk_rows),
+                )
+                rows = cur.fetchall()
+        if not rows:
+            break
+
+        parts = _write_parts(root, rows)
+        manifest["parts"].extend(parts)
+        manifest["last_id"] = max(part["ids"][1] for part in parts)
+        top_block = max(part["blocks"][1] for part in parts)
+        manifest["max_block"] = max(manifest["max_block"] or 0, top_block)
+        save_manifest(manifest, root)
+
+        exported += len(rows)
+        print(f"  • lake: выгружено {exported} строк (id ≤ {manifest['last_id']})")
+
+    return exported
+
+
+def invalidate_block_range(block_lo: int, block_hi: int, root: Optional[Path] = None) -> int:
+    """
+    Перевыгружает файлы, пересекающиеся с блоками [block_lo, block_hi], из текущего
+    состояния raw (например, после удаления строк при реорге). Строки берутся по
+    (диапазон id, день) исходного файла. Возвращает число перевыгруженных строк.
+    """
+    root = root or lake_dir()
+    manifest = load_manifest(root)
+    stale = parts_overlapping_blocks(manifest, block_lo, block_hi)
+    if not stale:
+        return 0
+
+    fresh: List[Dict[str, Any]] = []
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            for part in stale:
+                day = date.fromisoformat(part["date"])
+                cur.execute(
+                    f"""
+                    SELECT {_SELECT_LIST}
+                    FROM raw.wbtc_transfers
+                    WHERE id BETWEEN %s AND %s
+                      AND time_stamp >= %s AND time_stamp < %s::date + 1;
+                    """,
+                    (part["ids"][0], part["ids"][1], day, day),
+                )
+                fresh.extend(_write_parts(root, cur.fetchall()))
+
+    stale_files = {part["file"] for part in stale}
+    fresh_files = {part["file"] for part in fresh}
+    manifest["parts"] = [p for p in manifest["parts"] if p["file"] not in stale_files] + fresh
+    save_manifest(manifest, root)
+    for rel in stale_files - fresh_files:
+        (root / rel).unlink(missing_ok=True)
+
+    return sum(part["rows"] for part in fresh)
+
+
+def read_lake(
+    columns: Sequence[str],
+    lo: Optional[date] = None,
+    hi: Optional[date] = None,
+    root: Optional[Path] = None,
+):
+    """
+    Dask DataFrame из Parquet-копии: только нужные колонки (projection pushdown),
+    только файлы дней [lo, hi) по манифесту (partition pruning) плюс фильтр
+    по time_stamp для row group'ов. None, если подходящих файлов нет.
+    """
+    import dask.dataframe as dd
+    import pandas as pd
+
+    root = root or lake_dir()
+    files = select_parts(load_manifest(root), lo, hi)
+    if not files:
+        return None
+
+    filters = None
+    if lo is not None and hi is not None:
+        filters = [
+            ("time_stamp", ">=", pd.Timestamp(lo, tz="UTC")),
+            ("time_stamp", "<", pd.Timestamp(hi, tz="UTC")),
+        ]
+    return dd.read_parquet(
+        [str(root / rel) for rel in files],
+        columns=list(columns),
+        filters=filters,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Выгрузка raw.wbtc_transfers в Parquet-копию для аналитики")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_EXPORT_CHUNK_ROWS)
+    parser.add_argument(
+        "--invalidate-blocks",
+        type=int,
+        nargs=2,
+        metavar=("LO", "HI"),
+        help="Перевыгрузить файлы, пересекающиеся с диапазоном блоков",
+    )
+    args = parser.parse_args()
+
+    if args.invalidate_blocks:
+        rows = invalidate_block_range(*args.invalidate_blocks)
+        print(f"lake: перевыгружено {rows} строк")
+    else:
+        rows = sync_lake(chunk_rows=args.chunk_rows)
+        print(f"lake: выгружено {rows} новых строк в {lake_dir()}")
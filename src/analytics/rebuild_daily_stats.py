@@ -1,76 +1,176 @@
 import sys
+from datetime import date, timedelta
 from pathlib import Path
+from typing import List
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 from src.utils.config import load_project_dotenv
-from src.db.connection import get_pg_connection
+from src.db.connection import pooled_connection
+from src.db.rollups import rebuild_rollups
+from src.analytics.daily_stats_store import (
+    DAILY_STATS_COLUMNS,
+    DAILY_STATS_WATERMARK,
+    get_watermark,
+    set_watermark,
+    touched_dates,
+    upsert_daily_stats,
+)
 
 load_project_dotenv()
 
+# {date_filter} — пусто для полной пересборки или ограничение по дням для инкрементальной
+DAILY_STATS_SELECT_SQL = """
+WITH base AS (
+    SELECT time_stamp, from_address, value_wbtc, is_whale, tx_fee_usd
+    FROM raw.wbtc_transfers
+    WHERE value_wbtc > 0{date_filter}
+),
+daily AS (
+    SELECT
+        date(time_stamp) AS date,
+        COUNT(*) AS tx_count,
+        SUM(value_wbtc) AS total_volume_wbtc,
+        SUM(CASE WHEN is_whale THEN 1 ELSE 0 END) AS whale_tx_count,
+        MAX(value_wbtc) AS max_tx_volume,
+        SUM(tx_fee_usd) AS total_fee_usd
+    FROM base
+    GROUP BY 1
+),
+-- top_sender — из частичных агрегатов, которые ведёт загрузка
+top_sender AS (
+    SELECT DISTINCT ON (v.date) v.date, v.from_address
+    FROM analytics.daily_sender_volume v
+    JOIN daily d ON d.date = v.date
+    WHERE v.volume > 0
+    ORDER BY v.date, v.volume DESC, v.from_address
+)
+SELECT
+    d.date,
+    d.tx_count,
+    d.total_volume_wbtc,
+    d.whale_tx_count,
+    d.max_tx_volume,
+    ts.from_address AS top_sender,
+    d.total_fee_usd
+FROM daily d
+LEFT JOIN top_sender ts ON d.date = ts.date
+ORDER BY d.date
+"""
+
+REBUILD_SENDER_VOLUME_SQL = """
+TRUNCATE analytics.daily_sender_volume;
+
+INSERT INTO analytics.daily_sender_volume (date, from_address, volume, tx_count)
+SELECT date(time_stamp), from_address, SUM(value_wbtc), COUNT(*)
+FROM raw.wbtc_transfers
+WHERE value_wbtc > 0
+GROUP BY 1, 2;
+"""
+
+# диапазон по time_stamp отсекает лишние партиции/страницы индекса, ANY — дни между ними
+TOUCHED_DATES_FILTER = """
+      AND time_stamp >= %(lo)s AND time_stamp < %(hi)s
+      AND date(time_stamp) = ANY(%(dates)s)"""
+
+
+def rebuild_daily_sender_volume(cur) -> None:
+    """
+    Пересобирает analytics.daily_sender_volume из raw.wbtc_transfers (бэкфилл
+    после обновления схемы; дальше таблицу ведёт загрузка). В транзакции вызывающего кода.
+    """
+    cur.execute(REBUILD_SENDER_VOLUME_SQL)
+
+
+def backfill_aggregates() -> None:
+    """
+    Пересобирает частичные агрегаты, которые ведёт загрузка (analytics.daily_sender_volume
+    и внутридневные корзины ROLLUPS), отдельной транзакцией пулового соединения (UTC, без statement_timeout): для
+    init_db и миграций, которые работают через собственное соединение.
+    """
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute("SET LOCAL statement_timeout = 0;")
+            rebuild_daily_sender_volume(cur)
+            rebuild_rollups(cur)
+
 
 def rebuild_daily_stats():
     """
-    Перестраивает таблицу analytics.daily_stats целиком
-    из raw.wbtc_transfers.
+    Перестраивает таблицы analytics.daily_sender_volume, внутридневные корзины
+    и analytics.daily_stats целиком из raw.wbtc_transfers и сдвигает водяной
+    знак на последний id.
     """
-    sql = """
+    sql = f"""
     TRUNCATE analytics.daily_stats;
 
-    INSERT INTO analytics.daily_stats (
-        date,
-        tx_count,
-        total_volume_wbtc,
-        whale_tx_count,
-        max_tx_volume,
-        top_sender
-    )
-    WITH base AS (
-        SELECT *
-        FROM raw.wbtc_transfers
-        WHERE value_wbtc > 0
-    ),
-    daily AS (
-        SELECT
-            date(time_stamp) AS date,
-            COUNT(*) AS tx_count,
-            SUM(value_wbtc) AS total_volume_wbtc,
-            SUM(CASE WHEN is_whale THEN 1 ELSE 0 END) AS whale_tx_count,
-            MAX(value_wbtc) AS max_tx_volume
-        FROM base
-        GROUP BY 1
-    ),
-    sender_rank AS (
-        SELECT
-            date(time_stamp) AS date,
-            from_address,
-            SUM(value_wbtc) AS sender_volume,
-            ROW_NUMBER() OVER (PARTITION BY date(time_stamp) ORDER BY SUM(value_wbtc) DESC) AS rn
-        FROM base
-        GROUP BY 1, from_address
-    )
-    SELECT
-        d.date,
-        d.tx_count,
-        d.total_volume_wbtc,
-        d.whale_tx_count,
-        d.max_tx_volume,
-        sr.from_address AS top_sender
-    FROM daily d
-    LEFT JOIN sender_rank sr ON d.date = sr.date AND sr.rn = 1
-    ORDER BY d.date;
+    INSERT INTO analytics.daily_stats ({", ".join(DAILY_STATS_COLUMNS)})
+    {DAILY_STATS_SELECT_SQL.format(date_filter="")};
     """
 
-    conn = get_pg_connection()
-    try:
+    with pooled_connection() as conn:
         with conn, conn.cursor() as cur:
+            get_watermark(cur, DAILY_STATS_WATERMARK, for_update=True)
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM raw.wbtc_transfers;")
+            max_id = int(cur.fetchone()[0])
+            # полная пересборка может идти дольше PG_STATEMENT_TIMEOUT_MS
+            cur.execute("SET LOCAL statement_timeout = 0;")
+            rebuild_daily_sender_volume(cur)
+            rebuild_rollups(cur)
             cur.execute(sql)
-    finally:
-        conn.close()
+            set_watermark(cur, DAILY_STATS_WATERMARK, max_id)
+
+
+def refresh_daily_stats_for_dates(cur, dates: List[date]) -> None:
+    """
+    Пересчитывает и upsert'ит строки analytics.daily_stats за dates из raw
+    (дни, где строк не осталось, удаляются). В транзакции вызывающего кода.
+    """
+    if not dates:
+        return
+    dates = sorted(set(dates))
+    cur.execute(
+        DAILY_STATS_SELECT_SQL.format(date_filter=TOUCHED_DATES_FILTER),
+        {"lo": dates[0], "hi": dates[-1] + timedelta(days=1), "dates": dates},
+    )
+    upsert_daily_stats(cur, cur.fetchall(), dates)
+
+
+def refresh_daily_stats_incremental() -> int:
+    """
+    Инкрементально обновляет analytics.daily_stats: пересчитывает только дни,
+    в которые попали строки с id больше водяного знака, и upsert'ит их
+    (ON CONFLICT (date) DO UPDATE). Стоимость зависит от объёма новых данных,
+    а не от всей истории. Возвращает число пересчитанных дней.
+
+    Водяной знак по id корректен, пока загрузка и пересчёт идут последовательно
+    (как в wbtc_whale_etl_flow): строка из ещё не закоммиченной параллельной
+    вставки с меньшим id будет пропущена до следующей полной пересборки.
+    """
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            last_id = get_watermark(cur, DAILY_STATS_WATERMARK, for_update=True)
+            dates, max_id = touched_dates(cur, last_id)
+            if not dates:
+                return 0
+
+            refresh_daily_stats_for_dates(cur, dates)
+            set_watermark(cur, DAILY_STATS_WATERMARK, max_id)
+            return len(dates)
 
 
 if __name__ == "__main__":
-    rebuild_daily_stats()
-    print("daily_stats пересчитана")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересчёт analytics.daily_stats в SQL")
+    parser.add_argument("--incremental", action="store_true", help="Пересчитать только дни с новыми строками")
+    args = parser.parse_args()
+
+    if args.incremental:
+        days = refresh_daily_stats_incremental()
+        print(f"daily_stats: пересчитано дней {days}")
+    else:
+        rebuild_daily_stats()
+        print("daily_stats пересчитана")
@@ -0,0 +1,55 @@
+import csv
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Union
+
+PRICE_CSV_COLUMNS = ("price_usd", "price", "close")
+
+
+class EthUsdPrices:
+    """
+    Дневные цены ETH/USD в памяти для нормализации: price_on(day) — поиск
+    в словаре по дате, без обращений к БД на строку. День без цены берёт
+    ближайшую предыдущую известную (результат запоминается), дни раньше
+    первой цены — fallback (GAS_ETH_TO_USD).
+    """
+
+    def __init__(self, prices: Dict[date, Decimal], fallback: Decimal):
+        self._prices = dict(prices)
+        self._days = sorted(self._prices)
+        self.fallback = fallback
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def price_on(self, day: date) -> Decimal:
+        price = self._prices.get(day)
+        if price is None:
+            i = bisect_right(self._days, day)
+            price = self._prices[self._days[i - 1]] if i else self.fallback
+            self._prices[day] = price
+        return price
+
+
+def read_price_csv(path: Union[str, Path]) -> Dict[date, Decimal]:
+    """
+    Читает CSV с колонками date (YYYY-MM-DD, время после даты игнорируется)
+    и price_usd / price / close. Возвращает {date: price}.
+    """
+    prices: Dict[date, Decimal] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        price_field = next((fields[c] for c in PRICE_CSV_COLUMNS if c in fields), None)
+        if "date" not in fields or price_field is None:
+            raise ValueError(f"В {path} нужны колонки date и одна из {', '.join(PRICE_CSV_COLUMNS)}")
+
+        for line, row in enumerate(reader, start=2):
+            try:
+                day = date.fromisoformat(row[fields["date"]].strip()[:10])
+                prices[day] = Decimal(row[price_field].strip())
+            except (ValueError, InvalidOperation) as e:
+                raise ValueError(f"{path}:{line}: не удалось разобрать строку {row}: {e}")
+    return prices
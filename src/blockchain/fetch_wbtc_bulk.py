@@ -1,30 +1,59 @@
 import os
+import queue
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Dict, Generator, Optional, Tuple
 
-import requests
-
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 from src.utils.config import load_project_dotenv
+from src.blockchain.key_pool import KeyPool, NoKeysAvailable, classify_error
+from src.blockchain.http_client import LATENCY, get_session, timed_get
+from src.blockchain.normalize import dropped_raw_fields
+from src.blockchain.records import RawTransfer
+from src.blockchain.response_cache import get_response_cache
+from src.utils.metrics import API_REQUESTS, CACHE_PAGES, PAGE_SECONDS, ROWS, key_label, observe_queue
+from src.utils.profiling import PROFILE_MODES, profile_stage, profiled_run
 
 load_project_dotenv()
 
 BATCH_SIZE = 5000
 
 WBTC_CONTRACT = "0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599"
-ETHERSCAN_URL = "https://api.etherscan.io/v2/api"
+# ETHERSCAN_API_URL — другой адрес v2 API (например, фейковый сервер benchmarks/fake_etherscan.py)
+ETHERSCAN_URL = os.getenv("ETHERSCAN_API_URL", "https://api.etherscan.io/v2/api")
 CHAIN_ID = 1
 PAGE_SIZE = 5000
 END_BLOCK = 9_999_999_999
 SORT_ORDER = "desc"
-REQUEST_DELAY_SEC = 0.5
+MAX_REQUEST_ATTEMPTS = 10
 MAX_RESULTS_PER_WINDOW = 10_000
 TOKEN_DECIMALS = 8
+DEFAULT_REORG_SAFETY_BLOCKS = 12
+SHARDS_PER_KEY = 4
+# шаг выровненных сегментов desc-выгрузки с кэшем (как CHECKPOINT_SPAN_BLOCKS)
+CACHE_SEGMENT_BLOCKS = 100_000
+CONCURRENT_QUEUE_SIZE = 10 * PAGE_SIZE
+
+
+@dataclass
+class FetchProgress:
+    """
+    Прогресс fetch_wbtc_all по диапазону (для чекпоинтов):
+    completed — диапазон пройден до конца;
+    lowest_block — (sort="desc") блок последней отданной страницы: все блоки
+      выше него уже отданы потребителю;
+    requests — сколько запросов (страниц) сделано.
+    """
+    completed: bool = False
+    lowest_block: Optional[int] = None
+    requests: int = 0
 
 
 def load_api_keys() -> List[str]:
@@ -51,12 +80,25 @@ def dust_threshold_raw() -> int:
     return int(btc_threshold * (10 ** TOKEN_DECIMALS))
 
 
+def reorg_safety_blocks() -> int:
+    """
+    Сколько последних блоков перечитывать в инкрементальном режиме на случай реорга.
+    ENV REORG_SAFETY_BLOCKS=12 по умолчанию.
+    """
+    raw = os.getenv("REORG_SAFETY_BLOCKS", str(DEFAULT_REORG_SAFETY_BLOCKS))
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return DEFAULT_REORG_SAFETY_BLOCKS
+
+
 def make_request(
     api_key: str,
     page: int,
     start_block: int,
     end_block: int,
     offset: int = PAGE_SIZE,
+    sort: str = SORT_ORDER,
 ) -> Tuple[Optional[List[Dict]], bool, str]:
     """
     Делает запрос к v2 API.
@@ -76,29 +118,35 @@ def make_request(
         "contractaddress": WBTC_CONTRACT,
         "page": page,
         "offset": offset,
-        "sort": SORT_ORDER,
+        "sort": sort,
         "startblock": start_block,
         "endblock": end_block,
     }
 
     try:
-        resp = requests.get(ETHERSCAN_URL, params=params, timeout=20)
-        if resp.status_code >= 500:
-            # не тратим ключ на 5xx
-            print(f"[{api_key}] Ошибка HTTP {resp.status_code}, повтор позже")
-            return None, False, f"HTTP_{resp.status_code}"
+        with profile_stage("fetch.request"):
+            resp, _ = timed_get(get_session(), ETHERSCAN_URL, params=params, timeout=20)
+            if resp.status_code >= 500 or resp.status_code == 429:
+                # не тратим ключ на 5xx: запрос повторится после паузы
+                print(f"[{api_key}] Ошибка HTTP {resp.status_code}, повтор позже")
+                return None, False, f"HTTP_{resp.status_code}"
 
-        data = resp.json()
+            data = resp.json()
 
+        result = data.get("result")
         message = str(data.get("message") or "")
+        # текст ошибки Etherscan обычно лежит в result ("Max rate limit reached" и т.п.)
+        if isinstance(result, str) and result and result not in message:
+            message = f"{message}: {result}" if message else result
         window_too_large = "Result window is too large" in message
 
         # API Etherscan v2 при лимитах возвращает status != "1"
         if data.get("status") != "1":
+            if "No transactions found" in message:
+                return [], False, message
             print(f"[{api_key}] Ошибка Etherscan: {message}")
             return None, window_too_large, message
 
-        result = data.get("result")
         if not isinstance(result, list):
             return None, window_too_large, message
 
@@ -109,6 +157,92 @@ def make_request(
         return None, False, str(e)
 
 
+def fetch_latest_block(api_key: str) -> int:
+    """
+    Возвращает номер последнего блока сети (eth_blockNumber через proxy-модуль v2 API).
+    """
+    params = {
+        "apikey": api_key,
+        "chainid": CHAIN_ID,
+        "module": "proxy",
+        "action": "eth_blockNumber",
+    }
+    resp, _ = timed_get(get_session(), ETHERSCAN_URL, params=params, timeout=20)
+    data = resp.json()
+    result = data.get("result")
+    try:
+        return int(str(result), 16)
+    except (TypeError, ValueError):
+        raise RuntimeError(f"Не удалось получить номер последнего блока: {data}")
+
+
+def cache_request(page: int, start_block: int, end_block: int, offset: int, sort: str) -> Dict:
+    """
+    Параметры tokentx, определяющие содержимое страницы, — ключ кэша ответов.
+    """
+    return {
+        "chainid": CHAIN_ID,
+        "contractaddress": WBTC_CONTRACT.lower(),
+        "startblock": start_block,
+        "endblock": end_block,
+        "page": page,
+        "offset": offset,
+        "sort": sort,
+    }
+
+
+def split_block_range(start_block: int, end_block: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Делит [start_block, end_block] на непересекающиеся диапазоны примерно одинаковой длины.
+    Диапазоны возвращаются от новых блоков к старым (как SORT_ORDER="desc").
+    """
+    if end_block < start_block:
+        return []
+
+    total = end_block - start_block + 1
+    shards = max(1, min(shards, total))
+    step, rest = divmod(total, shards)
+
+    ranges: List[Tuple[int, int]] = []
+    lo = start_block
+    for i in range(shards):
+        hi = lo + step - 1 + (1 if i < rest else 0)
+        ranges.append((lo, hi))
+        lo = hi + 1
+
+    ranges.reverse()
+    return ranges
+
+
+def cache_segments(
+    start_block: int, end_block: int, top_block: int, span: int = CACHE_SEGMENT_BLOCKS
+) -> List[Tuple[int, int]]:
+    """
+    Делит [start_block, end_block] на сегменты по границам, кратным span,
+    от новых блоков к старым. Верхний сегмент — от границы под top_block до
+    end_block, остальные — [k * span, (k + 1) * span - 1] (обрезанные по start_block),
+    поэтому их запросы (и ключи кэша) не зависят от положения головы.
+    """
+    if end_block < start_block:
+        return []
+
+    segments: List[Tuple[int, int]] = []
+    hi = end_block
+    lo = max(start_block, (min(top_block, end_block) // span) * span)
+    while True:
+        segments.append((lo, hi))
+        if lo <= start_block:
+            break
+        hi = lo - 1
+        lo = max(start_block, lo - span)
+    return segments
+
+
+def _tx_key(tx: Dict) -> Tuple:
+    # тот же ключ, что и уникальный индекс raw.wbtc_transfers (tx_hash, contract_address)
+    return tx.get("hash"), tx.get("contractAddress")
+
+
 def _is_not_dust(tx: Dict) -> bool:
     """
     Фильтр против "пыли": value меньше 0.01 BTC не интересен для мониторинга китов.
@@ -127,75 +261,235 @@ def fetch_wbtc_all(
     max_empty_pages: int = 5,
     max_pages: Optional[int] = None,
     start_block: int = 0,
-) -> Generator[Dict, None, None]:
+    end_block: int = END_BLOCK,
+    key_pool: Optional[KeyPool] = None,
+    preferred_key: Optional[str] = None,
+    progress: Optional[FetchProgress] = None,
+    sort: str = SORT_ORDER,
+    use_cache: bool = True,
+) -> Generator[RawTransfer, None, None]:
     """
     Тянет максимум транзакций, учитывая ограничение окна Etherscan (10k результатов).
-    - Переключается между API-ключами при rate-limit ошибках.
-    - Идёт постранично, при достижении лимита окна сдвигает endblock до последнего
-      загруженного блока и начинает новую "окно" с page=1.
+    - Ключи берутся из KeyPool (по умолчанию — из ETHERSCAN_KEYS): темп задаёт
+      token bucket каждого ключа, при rate-limit ключ остывает и возвращается,
+      неудавшийся запрос (5xx, сеть, лимит) повторяется тем же окном/страницей.
+    - preferred_key — ключ, который берётся первым, если он готов.
+    - Идёт постранично, при достижении лимита окна сдвигает endblock (sort="desc")
+      или startblock (sort="asc") к последнему загруженному блоку и начинает
+      новое "окно" с page=1.
     - При max_pages ограничивает количество запросов (страниц), вне зависимости
       от перезапуска окна.
+    - progress (если передан) обновляется по ходу: по нему вызывающий код
+      понимает, дошла ли выгрузка до start_block, и ставит чекпоинт.
+    - С ETHERSCAN_CACHE=on готовые (глубоко под головой) страницы берутся из
+      локального кэша, с ETHERSCAN_CACHE=replay — все страницы только из кэша,
+      без ключей и сети (use_cache=False — мимо кэша, например для поллера головы).
+    - С кэшем sort="desc" идёт по сегментам, выровненным на CACHE_SEGMENT_BLOCKS
+      (cache_segments): окна, сдвигаемые от растущей головы, давали бы новые
+      ключи при каждом запуске, а у сегментов ниже головы границы одни и те же.
+    - Поля, которые не сохраняет профиль WBTC_INGEST_PROFILE (lean — input),
+      отбрасываются сразу (кэш хранит ответ целиком).
     """
 
-    api_keys = load_api_keys()
-    key_index = 0
+    progress = progress if progress is not None else FetchProgress()
+    cache = get_response_cache() if use_cache else None
+    if cache is None or sort == "asc":
+        # asc идёт от фиксированного start_block — ключи и так стабильны
+        yield from _fetch_range(
+            offset, max_empty_pages, max_pages, start_block, end_block,
+            key_pool, preferred_key, progress, sort, use_cache,
+        )
+        return
+
+    pool = key_pool or (None if cache.replay else KeyPool(load_api_keys()))
+    top = _segment_top(cache, pool, preferred_key, end_block)
+    if top is None:
+        yield from _fetch_range(
+            offset, max_empty_pages, max_pages, start_block, end_block,
+            pool, preferred_key, progress, sort, use_cache,
+        )
+        return
+
+    for lo, hi in cache_segments(start_block, end_block, top, CACHE_SEGMENT_BLOCKS):
+        requests_before = progress.requests
+        pages_left = None if max_pages is None else max_pages - requests_before
+        if pages_left is not None and pages_left <= 0:
+            print(f"⛔ Достигнут лимит страниц ({max_pages}). Останавливаюсь.")
+            return
+
+        part = FetchProgress()
+        for tx in _fetch_range(
+            offset, max_empty_pages, pages_left, lo, hi, pool, preferred_key, part, sort, use_cache,
+            head=None if top == end_block else top,
+        ):
+            progress.requests = requests_before + part.requests
+            if part.lowest_block is not None:
+                progress.lowest_block = part.lowest_block
+            yield tx
+
+        progress.requests = requests_before + part.requests
+        if not part.completed:
+            if part.lowest_block is not None:
+                progress.lowest_block = part.lowest_block
+            return
+        # сегмент пройден целиком: всё от lo и выше уже отдано
+        progress.lowest_block = lo
+    progress.completed = True
+
+
+def _segment_top(cache, pool: Optional[KeyPool], preferred_key: Optional[str], end_block: int) -> Optional[int]:
+    """
+    Верхний блок для разбиения desc-выгрузки на сегменты: end_block, если он
+    задан, иначе голова сети (в replay — голова, записанная в кэш онлайн-прогоном).
+    None — голову узнать не удалось, выгрузка идёт одним диапазоном.
+    """
+    if end_block != END_BLOCK:
+        return end_block
+    if cache.replay:
+        return cache.load_head()
+    try:
+        head = fetch_latest_block(pool.acquire(preferred_key))
+    except Exception as e:
+        print(f"⚠️ Не удалось получить голову сети для сегментов кэша: {e}")
+        return None
+    cache.save_head(head)
+    return head
+
+
+def _fetch_range(
+    offset: int,
+    max_empty_pages: int,
+    max_pages: Optional[int],
+    start_block: int,
+    end_block: int,
+    key_pool: Optional[KeyPool],
+    preferred_key: Optional[str],
+    progress: FetchProgress,
+    sort: str,
+    use_cache: bool,
+    head: Optional[int] = None,
+) -> Generator[RawTransfer, None, None]:
+    """
+    Выгрузка одного диапазона окнами (см. fetch_wbtc_all).
+    head — известная голова сети: по ней готовыми считаются и пустые страницы.
+    """
+
+    progress = progress if progress is not None else FetchProgress()
+    dropped = dropped_raw_fields()
+    cache = get_response_cache() if use_cache else None
+    replay = cache is not None and cache.replay
+    pool = key_pool or (None if replay else KeyPool(load_api_keys()))
+    max_failures = MAX_REQUEST_ATTEMPTS * len(pool.keys) if pool is not None else 1
+    failures = 0
     page = 1
-    current_end_block = END_BLOCK
+    ascending = sort == "asc"
+    current_start_block = start_block
+    current_end_block = end_block
     last_fetched_block: Optional[int] = None
     requests_made = 0
     max_page_per_window = max(1, MAX_RESULTS_PER_WINDOW // offset)
 
+    def shift_window() -> None:
+        nonlocal current_start_block, current_end_block, page
+        page = 1
+        # граничный блок перечитываем целиком: страница могла оборваться посреди
+        # его переводов (дубликаты отсечёт ON CONFLICT), но не стоим на месте,
+        # если всё окно уместилось в один блок
+        if ascending:
+            next_start = last_fetched_block
+            if next_start <= current_start_block:
+                next_start = current_start_block + 1
+            current_start_block = min(end_block, next_start)
+        else:
+            next_end = last_fetched_block
+            if next_end >= current_end_block:
+                next_end = current_end_block - 1
+            current_end_block = max(start_block, next_end)
+
     while True:
         if max_pages is not None and requests_made >= max_pages:
             print(f"⛔ Достигнут лимит страниц ({max_pages}). Останавливаюсь.")
             return
 
-        current_key = api_keys[key_index]
+        request = cache_request(page, current_start_block, current_end_block, offset, sort)
+        txs = cache.get(request) if cache is not None else None
+        if cache is not None:
+            CACHE_PAGES.inc(result="hit" if txs is not None else "miss")
+        if txs is not None:
+            current_key, window_too_large, message = None, False, "cache"
+        elif replay:
+            print(f"⛔ Replay: страницы нет в кэше (page {page}, blocks={current_start_block}..{current_end_block})")
+            return
+        else:
+            try:
+                current_key = pool.acquire(preferred_key)
+            except NoKeysAvailable:
+                print("❌ Все API-ключи отключены")
+                return
 
-        print(f"→ page {page}, key={current_key}, endblock={current_end_block}")
+            print(
+                f"→ page {page}, key={current_key}, "
+                f"blocks={current_start_block}..{current_end_block} ({sort})"
+            )
 
-        txs, window_too_large, message = make_request(
-            current_key,
-            page=page,
-            start_block=start_block,
-            end_block=current_end_block,
-            offset=offset,
-        )
+            started = time.perf_counter()
+            txs, window_too_large, message = make_request(
+                current_key,
+                page=page,
+                start_block=current_start_block,
+                end_block=current_end_block,
+                offset=offset,
+                sort=sort,
+            )
+            label = key_label(current_key)
+            PAGE_SECONDS.observe(time.perf_counter() - started, key=label)
+            if window_too_large:
+                outcome = "window"
+            elif txs is None:
+                outcome = classify_error(message)
+            else:
+                outcome = "ok"
+            API_REQUESTS.inc(key=label, outcome=outcome)
+            if cache is not None and txs is not None:
+                cache.put(request, txs, head)
         requests_made += 1
+        progress.requests = requests_made
 
         if window_too_large:
+            pool.report_success(current_key)
             if last_fetched_block is None:
                 print("Окно слишком большое, но нет сохраненного блока для сдвига.")
                 return
 
-            current_end_block = max(start_block, last_fetched_block - 1)
-            page = 1
-            print(f"Сдвигаю endblock до {current_end_block} из-за ограничения окна.")
-            time.sleep(REQUEST_DELAY_SEC)
+            shift_window()
+            print(f"Сдвигаю окно до {current_start_block}..{current_end_block} из-за ограничения окна.")
             continue
 
         if txs is None:
-            # ключ отвалился — переключаем на следующий
-            key_index += 1
-
-            if key_index >= len(api_keys):
-                print("❌ Все API-ключи закончились")
+            # ключ остывает в пуле, тот же запрос повторится с готовым ключом
+            failures += 1
+            pool.report_error(current_key, classify_error(message))
+            if failures >= max_failures:
+                print(f"❌ Запрос не удался {failures} раз подряд, останавливаюсь")
                 return
-
-            print(f"⚠️ Переключаюсь на ключ: {api_keys[key_index]}")
-            time.sleep(REQUEST_DELAY_SEC)
             continue
 
+        failures = 0
+        if current_key is not None:
+            pool.report_success(current_key)
+
         # если API вернул пустой список
         if len(txs) == 0:
             print(f"Больше транзакций нет. Сообщение API: {message}")
+            progress.completed = True
             return
 
-        # отдаём транзакции наружу
-        for tx in txs:
-            # отбрасываем "пыль" прямо на этапе скачивания
-            if _is_not_dust(tx):
-                yield tx
+        # отдаём транзакции наружу компактными записями (JSON-словарь страницы
+        # живёт только до конца итерации)
+        kept = [tx for tx in txs if _is_not_dust(tx)]  # отбрасываем "пыль" прямо на этапе скачивания
+        ROWS.inc(len(kept), stage="fetched")
+        for tx in kept:
+            yield RawTransfer.from_json(tx, exclude=dropped)
 
         # блок последней транзакции в текущей странице
         last_block_raw = txs[-1].get("blockNumber")
@@ -206,12 +500,15 @@ def fetch_wbtc_all(
 
         if last_block_number is not None:
             last_fetched_block = last_block_number
+            if not ascending:
+                progress.lowest_block = last_block_number
 
-        fetched_everything = len(txs) < offset or (
-            last_block_number is not None and last_block_number <= start_block
-        )
+        # полная страница, даже дошедшая до граничного блока, могла не вместить
+        # все его переводы — конец диапазона только по неполной странице
+        fetched_everything = len(txs) < offset
         if fetched_everything:
             print("Достигнут конец диапазона.")
+            progress.completed = True
             return
 
         next_page = page + 1
@@ -223,18 +520,105 @@ def fetch_wbtc_all(
                 print("Не удалось определить последний блок для сдвига окна.")
                 return
 
-            current_end_block = max(start_block, last_fetched_block - 1)
-            page = 1
+            shift_window()
             print(
                 f"Достигнут предел окна ({MAX_RESULTS_PER_WINDOW}). "
-                f"Сдвигаю endblock до {current_end_block}."
+                f"Сдвигаю окно до {current_start_block}..{current_end_block}."
             )
-            time.sleep(REQUEST_DELAY_SEC)
             continue
 
-        # следующая страница в текущем окне
+        # следующая страница в текущем окне; темп запросов держит token bucket пула
         page = next_page
-        time.sleep(REQUEST_DELAY_SEC)  # чтобы не бомбить API
+
+
+def fetch_wbtc_concurrent(
+    offset: int = PAGE_SIZE,
+    start_block: int = 0,
+    end_block: Optional[int] = None,
+    shards: Optional[int] = None,
+    max_pages_per_shard: Optional[int] = None,
+) -> Generator[RawTransfer, None, None]:
+    """
+    Параллельная выгрузка: делит [start_block, end_block] на независимые шарды
+    и качает их одновременно, каждый API-ключ — отдельная "полоса" со своим
+    token bucket в общем KeyPool, поэтому пропускная способность растёт
+    с числом ключей. Если ключ полосы остывает, полоса занимает свободный.
+    - end_block=None — берётся текущая голова сети.
+    - shards=None — len(ключей) * SHARDS_PER_KEY, чтобы полосы балансировались
+      между плотными и пустыми участками истории.
+    - Транзакции дедуплицируются в пределах шарда; шарды не пересекаются по блокам.
+    - Порядок выдачи между шардами не гарантируется.
+    """
+
+    api_keys = load_api_keys()
+    pool = KeyPool(api_keys)
+    if end_block is None:
+        end_block = fetch_latest_block(pool.acquire())
+
+    shard_count = shards or len(api_keys) * SHARDS_PER_KEY
+    work: "queue.Queue[Tuple[int, int]]" = queue.Queue()
+    for block_range in split_block_range(start_block, end_block, shard_count):
+        work.put(block_range)
+
+    out: "queue.Queue[object]" = queue.Queue(maxsize=CONCURRENT_QUEUE_SIZE)
+    stop = threading.Event()
+    done_marker = object()
+
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                observe_queue("fetch_lanes", out.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def lane(api_key: str) -> None:
+        try:
+            while not stop.is_set():
+                try:
+                    lo, hi = work.get_nowait()
+                except queue.Empty:
+                    return
+
+                print(f"⇉ [{api_key}] шард {lo}..{hi}")
+                seen = set()
+                for tx in fetch_wbtc_all(
+                    offset=offset,
+                    max_pages=max_pages_per_shard,
+                    start_block=lo,
+                    end_block=hi,
+                    key_pool=pool,
+                    preferred_key=api_key,
+                ):
+                    key = _tx_key(tx)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if not put(tx):
+                        return
+        except Exception as e:
+            put(e)
+        finally:
+            put(done_marker)
+
+    with ThreadPoolExecutor(max_workers=len(api_keys), thread_name_prefix="etherscan-lane") as executor:
+        for api_key in api_keys:
+            executor.submit(lane, api_key)
+
+        lanes_left = len(api_keys)
+        try:
+            while lanes_left:
+                item = out.get()
+                if item is done_marker:
+                    lanes_left -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item  # type: ignore[misc]
+        finally:
+            stop.set()
 
 
 if __name__ == "__main__":
@@ -244,63 +628,86 @@ if __name__ == "__main__":
     parser.add_argument("--start-block", type=int, default=0, help="С какого блока начинать (включительно)")
     parser.add_argument("--max-pages", type=int, default=None, help="Лимит запросов (страниц) к Etherscan")
     parser.add_argument("--offset", type=int, default=PAGE_SIZE, help="Размер страницы для Etherscan")
+    parser.add_argument("--end-block", type=int, default=None, help="До какого блока (включительно), по умолчанию голова сети")
+    parser.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Качать шарды диапазона параллельно, по полосе на каждый API-ключ",
+    )
+    parser.add_argument("--shards", type=int, default=None, help="Число шардов для --concurrent")
     parser.add_argument(
         "--save",
         action="store_true",
         help="Сохранять в БД (по умолчанию только вывод в консоль)",
     )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILE_MODES),
+        default=None,
+        help="Профилирование: timers, cprofile или sample (по умолчанию WBTC_PROFILE)",
+    )
     args = parser.parse_args()
 
-    if args.save:
-        print("Старт массовой загрузки WBTC транзакций и сохранения в БД...\n")
-        from src.blockchain.normalize import normalize_wbtc_tx
-        from src.db.save_transfers import save_transfers_batch
-
-        buffer = []
-
-        for raw in fetch_wbtc_all(
+    def iter_transfers() -> Generator[Dict, None, None]:
+        if args.concurrent:
+            return fetch_wbtc_concurrent(
+                offset=args.offset,
+                start_block=args.start_block,
+                end_block=args.end_block,
+                shards=args.shards,
+                max_pages_per_shard=args.max_pages,
+            )
+        return fetch_wbtc_all(
             offset=args.offset,
             max_pages=args.max_pages,
             start_block=args.start_block,
-        ):
-            norm = normalize_wbtc_tx(raw)
-
-            # защита от мусора после нормализации
-            if norm["value_wbtc"] <= 0:
-                continue
-
-            buffer.append(norm)
-            if len(buffer) % 10 == 0:
-                print(f"  • В буфере {len(buffer)} транзакций")
+            end_block=args.end_block if args.end_block is not None else END_BLOCK,
+        )
 
-            if len(buffer) >= BATCH_SIZE:
+    with profiled_run("fetch_wbtc_bulk", mode=args.profile):
+        if args.save:
+            print("Старт массовой загрузки WBTC транзакций и сохранения в БД...\n")
+            from src.blockchain.normalize import batch_to_records, normalize_wbtc_batch
+            from src.db.eth_prices import get_eth_usd_prices
+            from src.db.save_transfers import save_transfers_batch
+            from src.utils.metrics import RunMetrics, start_metrics_server, write_textfile
+
+            start_metrics_server()
+            run = RunMetrics()
+            prices = get_eth_usd_prices()
+            buffer = []
+
+            def flush(final: bool = False) -> None:
+                # защита от мусора после нормализации
+                records = [rec for rec in batch_to_records(normalize_wbtc_batch(buffer, prices)) if rec["value_wbtc"] > 0]
                 try:
-                    inserted = save_transfers_batch(buffer)
-                    print(f"Сохранил пачку: {inserted} записей (буфер {len(buffer)})")
+                    inserted = save_transfers_batch(records)
+                    print(f"Сохранил {'финальную ' if final else ''}пачку: {inserted} записей (буфер {len(buffer)})")
                 except Exception as e:
-                    print(f"❌ Ошибка сохранения пачки: {e}")
+                    print(f"❌ Ошибка сохранения {'финальной ' if final else ''}пачки: {e}")
                 finally:
                     buffer.clear()
-
-        # финальный хвост
-        if buffer:
-            try:
-                inserted = save_transfers_batch(buffer)
-                print(f"Сохранил финальную пачку: {inserted} записей (буфер {len(buffer)})")
-            except Exception as e:
-                print(f"❌ Ошибка сохранения финальной пачки: {e}")
-            finally:
-                buffer.clear()
-
-        print("Готово.")
-    else:
-        print("Старт загрузки WBTC транзакций (только вывод в консоль)...\n")
-        count = 0
-        for raw in fetch_wbtc_all(
-            offset=args.offset,
-            max_pages=args.max_pages,
-            start_block=args.start_block,
-        ):
-            count += 1
-            print(raw)
-        print(f"\nГотово. Всего получено {count} транзакций.")
+                print(f"  • {run.finish().summary()}")
+                write_textfile()
+
+            for raw in iter_transfers():
+                buffer.append(raw)
+                if len(buffer) >= BATCH_SIZE:
+                    flush()
+
+            # финальный хвост
+            if buffer:
+                flush(final=True)
+
+            print(LATENCY.summary())
+            if get_response_cache() is not None:
+                print(get_response_cache().summary())
+            print("Готово.")
+        else:
+            print("Старт загрузки WBTC транзакций (только вывод в консоль)...\n")
+            count = 0
+            for raw in iter_transfers():
+                count += 1
+                print(raw)
+            print(LATENCY.summary())
+            print(f"\nГотово. Всего получено {count} транзакций.")
@@ -0,0 +1,173 @@
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+DEFAULT_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_local = threading.local()
+_session_lock = threading.Lock()
+_session: Optional["requests.Session"] = None
+
+
+@dataclass
+class RequestTiming:
+    """
+    Разбивка времени одного HTTP-запроса.
+    connect — TCP+TLS (0, если соединение из пула),
+    ttfb — от отправки до заголовков ответа (без connect),
+    download — чтение тела с распаковкой gzip, bytes — размер распакованного тела.
+    """
+    connect_sec: float
+    ttfb_sec: float
+    download_sec: float
+    total_sec: float
+    bytes: int
+    reused: bool
+
+
+class LatencyStats:
+    """
+    Потокобезопасный накопитель RequestTiming для сводки по сетевым накладным.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.new_connections = 0
+            self.connect_sec = 0.0
+            self.ttfb_sec = 0.0
+            self.download_sec = 0.0
+            self.total_sec = 0.0
+            self.bytes = 0
+
+    def add(self, timing: RequestTiming) -> None:
+        with self._lock:
+            self.requests += 1
+            self.new_connections += 0 if timing.reused else 1
+            self.connect_sec += timing.connect_sec
+            self.ttfb_sec += timing.ttfb_sec
+            self.download_sec += timing.download_sec
+            self.total_sec += timing.total_sec
+            self.bytes += timing.bytes
+
+    def summary(self) -> str:
+        with self._lock:
+            if not self.requests:
+                return "HTTP: запросов не было"
+            n = self.requests
+            return (
+                f"HTTP: {n} запросов, новых соединений {self.new_connections}, "
+                f"всего {self.total_sec:.1f}s "
+                f"(connect {self.connect_sec:.1f}s, ttfb {self.ttfb_sec:.1f}s, "
+                f"download {self.download_sec:.1f}s); "
+                f"в среднем {1000 * self.total_sec / n:.0f}ms/запрос, "
+                f"{self.bytes / n / 1024:.0f} KiB/ответ"
+            )
+
+
+LATENCY = LatencyStats()
+
+
+@lru_cache(maxsize=1)
+def _timed_pool_classes() -> Dict[str, Any]:
+    """
+    Пулы urllib3, у соединений которых замеряется connect() (TCP+TLS).
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def timed(conn_cls):
+        class TimedConnection(conn_cls):
+            def connect(self):
+                started = time.perf_counter()
+                try:
+                    return super().connect()
+                finally:
+                    _local.connect_sec = getattr(_local, "connect_sec", 0.0) + time.perf_counter() - started
+
+        return TimedConnection
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = timed(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = timed(HTTPSConnection)
+
+    return {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+def build_session(pool_maxsize: int = POOL_MAXSIZE) -> "requests.Session":
+    """
+    Сессия requests с keep-alive пулом соединений, gzip и замером connect.
+    pool_maxsize должен быть не меньше числа параллельных полос.
+    """
+    from requests.adapters import HTTPAdapter
+
+    class TimedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = _timed_pool_classes()
+
+    session = requests.Session()
+    # ретраи делает KeyPool, адаптер не должен повторять запросы сам
+    adapter = TimedAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session() -> "requests.Session":
+    """
+    Общая на процесс сессия (ленивая инициализация).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def timed_get(
+    session: Any,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: float = 20,
+) -> Tuple[Any, RequestTiming]:
+    """
+    GET с разбивкой времени на connect / TTFB / download. Тело читается сразу,
+    поэтому resp.json() дальше не ходит в сеть.
+    """
+    _local.connect_sec = 0.0
+    started = time.perf_counter()
+    resp = session.get(url, params=params, timeout=timeout, stream=True)
+    headers_at = time.perf_counter()
+    body = resp.content
+    finished = time.perf_counter()
+
+    connect_sec = getattr(_local, "connect_sec", 0.0)
+    timing = RequestTiming(
+        connect_sec=connect_sec,
+        ttfb_sec=max(0.0, headers_at - started - connect_sec),
+        download_sec=finished - headers_at,
+        total_sec=finished - started,
+        bytes=len(body or b""),
+        reused=connect_sec == 0.0,
+    )
+    LATENCY.add(timing)
+    return resp, timing
@@ -0,0 +1,206 @@
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+DEFAULT_CALLS_PER_SEC = 5.0
+DEFAULT_BURST = 1.0
+BASE_BACKOFF_SEC = 1.0
+MAX_BACKOFF_SEC = 60.0
+# 5xx/сеть — не вина ключа: первый повтор сразу, дальше короткая пауза
+TRANSIENT_BACKOFF_SEC = 0.25
+TRANSIENT_MAX_BACKOFF_SEC = 5.0
+
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_INVALID_KEY = "invalid_key"
+ERROR_TRANSIENT = "transient"
+ERROR_OTHER = "error"
+
+
+class NoKeysAvailable(RuntimeError):
+    """Все ключи пула отключены (например, невалидные)."""
+
+
+def calls_per_sec() -> float:
+    """
+    Лимит запросов в секунду на один ключ.
+    ENV ETHERSCAN_CALLS_PER_SEC=5 по умолчанию (бесплатный тариф Etherscan).
+    """
+    raw = os.getenv("ETHERSCAN_CALLS_PER_SEC", str(DEFAULT_CALLS_PER_SEC))
+    try:
+        value = float(raw)
+    except ValueError:
+        return DEFAULT_CALLS_PER_SEC
+    return value if value > 0 else DEFAULT_CALLS_PER_SEC
+
+
+def classify_error(message: str) -> str:
+    """
+    Раскладывает ошибку Etherscan/HTTP по классам:
+    rate_limit — упёрлись в квоту, ключ надо остудить;
+    invalid_key — ключ непригоден, выключаем;
+    transient — 5xx/сеть, запрос можно повторить тем же ключом;
+    error — прочие ошибки API.
+    """
+    text = (message or "").lower()
+    if "rate limit" in text or "too many" in text or "http_429" in text:
+        return ERROR_RATE_LIMIT
+    if "invalid api key" in text or "missing/invalid" in text:
+        return ERROR_INVALID_KEY
+    if text.startswith("http_5") or "timeout" in text or "timed out" in text or "connection" in text:
+        return ERROR_TRANSIENT
+    return ERROR_OTHER
+
+
+def backoff_delay(attempt: int, base: float = BASE_BACKOFF_SEC, cap: float = MAX_BACKOFF_SEC) -> float:
+    """
+    Экспоненциальная задержка с "equal jitter": половина фиксирована, половина случайна.
+    """
+    delay = min(cap, base * (2 ** max(0, attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity в запасе.
+    """
+
+    def __init__(self, rate: float, capacity: float = DEFAULT_BURST) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """
+        Забирает токен. Возвращает 0, если получилось, иначе сколько секунд ждать.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class KeyState:
+    key: str
+    bucket: TokenBucket
+    cooldown_until: float = 0.0
+    failures: int = 0
+    disabled: bool = False
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+class KeyPool:
+    """
+    Пул API-ключей Etherscan:
+    - у каждого ключа свой token bucket под лимит calls/sec;
+    - при rate-limit ключ уходит в cooldown с экспоненциальной задержкой и
+      возвращается в работу после неё;
+    - невалидные ключи выключаются насовсем.
+    Потокобезопасен: один пул можно делить между параллельными полосами.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        rate: Optional[float] = None,
+        burst: float = DEFAULT_BURST,
+    ) -> None:
+        if not keys:
+            raise ValueError("Пул ключей пуст")
+        rate = rate or calls_per_sec()
+        self._states = [KeyState(key=k, bucket=TokenBucket(rate, burst)) for k in keys]
+        self._by_key = {s.key: s for s in self._states}
+        self._lock = threading.Lock()
+        self._next = 0
+
+    @property
+    def keys(self) -> List[str]:
+        return [s.key for s in self._states]
+
+    def _candidates(self, preferred: Optional[str]) -> List[KeyState]:
+        # начинаем с предпочтительного ключа, дальше — по кругу
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self._states)
+        ordered = self._states[start:] + self._states[:start]
+        if preferred in self._by_key:
+            pref = self._by_key[preferred]
+            ordered = [pref] + [s for s in ordered if s is not pref]
+        return ordered
+
+    def acquire(self, preferred: Optional[str] = None) -> str:
+        """
+        Блокируется, пока какой-нибудь ключ не будет готов (не в cooldown и есть токен).
+        """
+        while True:
+            now = time.monotonic()
+            wait = MAX_BACKOFF_SEC
+            alive = False
+
+            for state in self._candidates(preferred):
+                if state.disabled:
+                    continue
+                alive = True
+                if state.cooldown_until > now:
+                    wait = min(wait, state.cooldown_until - now)
+                    continue
+                token_wait = state.bucket.try_acquire()
+                if token_wait == 0:
+                    return state.key
+                wait = min(wait, token_wait)
+
+            if not alive:
+                raise NoKeysAvailable("Все API-ключи отключены")
+            time.sleep(max(wait, 0.01))
+
+    def _bump(self, state: KeyState, name: str) -> None:
+        state.stats[name] = state.stats.get(name, 0) + 1
+
+    def report_success(self, key: str) -> None:
+        state = self._by_key[key]
+        with self._lock:
+            state.failures = 0
+            self._bump(state, "ok")
+
+    def report_error(self, key: str, kind: str) -> float:
+        """
+        Учитывает ошибку ключа. Возвращает длительность cooldown (0 — без паузы).
+        transient (5xx/сеть) повторяется тем же ключом сразу, серия таких
+        ошибок — с короткой паузой до TRANSIENT_MAX_BACKOFF_SEC.
+        """
+        state = self._by_key[key]
+        with self._lock:
+            self._bump(state, kind)
+            if kind == ERROR_INVALID_KEY:
+                state.disabled = True
+                print(f"⛔ [{key}] ключ отключён: невалидный")
+                return 0.0
+
+            state.failures += 1
+            if kind == ERROR_TRANSIENT:
+                # квота ключа не исчерпана: не выводим его из работы на секунды,
+                # только не долбим упавший API подряд без паузы
+                if state.failures == 1:
+                    return 0.0
+                delay = backoff_delay(state.failures - 1, TRANSIENT_BACKOFF_SEC, TRANSIENT_MAX_BACKOFF_SEC)
+            else:
+                delay = backoff_delay(state.failures)
+            state.cooldown_until = time.monotonic() + delay
+            print(f"⚠️ [{key}] {kind}, cooldown {delay:.1f}s (ошибок подряд: {state.failures})")
+            return delay
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {s.key: dict(s.stats) for s in self._states}
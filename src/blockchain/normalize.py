@@ -1,7 +1,11 @@
 import os
 from decimal import Decimal
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List, Mapping, Optional, Sequence, Tuple
+
+from src.blockchain.eth_prices import EthUsdPrices
+from src.blockchain.records import TRANSFER_FIELDS, TransferRecord, intern_optional
+from src.utils.metrics import ROWS, timed_stage
 
 
 def _whale_threshold() -> Decimal:
@@ -20,11 +24,47 @@ def _gas_eth_to_usd() -> Decimal:
         return Decimal("26000")
 
 
-def normalize_wbtc_tx(raw_tx: Dict[str, Any]) -> Dict[str, Any]:
+INGEST_PROFILE_LEAN = "lean"
+INGEST_PROFILE_FULL = "full"
+
+# тяжёлые колонки, которые профиль lean не хранит (колонка raw → поле Etherscan):
+# input — полный calldata, аналитике не нужен; вызов описывают method_id / function_name
+LEAN_DROPPED_COLUMNS = {"input": "input"}
+
+
+def ingest_profile() -> str:
+    """
+    Какие колонки сохранять: "full" (всё, что отдал Etherscan) или "lean"
+    (без тяжёлых LEAN_DROPPED_COLUMNS, они пишутся NULL).
+    ENV WBTC_INGEST_PROFILE=full по умолчанию: lean включается явно, иначе после
+    обновления колонка input в одной таблице оказалась бы то заполненной, то NULL.
+    """
+    profile = os.getenv("WBTC_INGEST_PROFILE", INGEST_PROFILE_FULL).strip().lower()
+    return profile if profile in (INGEST_PROFILE_LEAN, INGEST_PROFILE_FULL) else INGEST_PROFILE_FULL
+
+
+def dropped_raw_fields(profile: Optional[str] = None) -> frozenset:
+    """
+    Поля ответа Etherscan, которые профилю не нужны (их можно не держать в памяти
+    уже на этапе выгрузки).
+    """
+    profile = profile or ingest_profile()
+    return frozenset(LEAN_DROPPED_COLUMNS.values()) if profile == INGEST_PROFILE_LEAN else frozenset()
+
+
+def normalize_wbtc_tx(
+    raw_tx: Mapping[str, Any],
+    prices: Optional[EthUsdPrices] = None,
+    profile: Optional[str] = None,
+) -> TransferRecord:
     """
     Преобразует сырую транзакцию WBTC в нормализованный вид для raw.wbtc_transfers.
-    Добавляем флаг "is_whale" и оценку комиссии в USD.
+    Добавляем флаг "is_whale" и оценку комиссии в USD (по цене ETH за день
+    блока из prices, без prices — по константе GAS_ETH_TO_USD).
+    В профиле lean input не сохраняется; profile=None — ingest_profile() из ENV,
+    в цикле по переводам его лучше прочитать один раз и передать.
     """
+    keep_input = (profile or ingest_profile()) == INGEST_PROFILE_FULL
 
     # timestamp -> datetime
     ts = int(raw_tx["timeStamp"])
@@ -50,25 +90,26 @@ def normalize_wbtc_tx(raw_tx: Dict[str, Any]) -> Dict[str, Any]:
     if gas_price_wei is not None and gas_used_int is not None:
         tx_fee_eth = (gas_price_wei * gas_used_int) / (Decimal(10) ** 18)
 
-    tx_fee_usd = tx_fee_eth * _gas_eth_to_usd() if tx_fee_eth is not None else None
+    eth_to_usd = prices.price_on(dt.date()) if prices is not None else _gas_eth_to_usd()
+    tx_fee_usd = tx_fee_eth * eth_to_usd if tx_fee_eth is not None else None
 
     is_whale = value_wbtc >= _whale_threshold()
 
-    return {
+    return TransferRecord.from_mapping({
         "tx_hash": raw_tx["hash"],
         "block_number": int(raw_tx["blockNumber"]),
-        "block_hash": raw_tx["blockHash"],
+        "block_hash": intern_optional(raw_tx["blockHash"]),
         "time_stamp": dt,
 
         "nonce": int(raw_tx["nonce"]),
         "transaction_index": int(raw_tx["transactionIndex"]),
 
-        "from_address": raw_tx["from"],
-        "to_address": raw_tx["to"],
+        "from_address": intern_optional(raw_tx["from"]),
+        "to_address": intern_optional(raw_tx["to"]),
 
-        "contract_address": raw_tx["contractAddress"],
-        "token_name": raw_tx.get("tokenName", "Wrapped Bitcoin"),
-        "token_symbol": raw_tx.get("tokenSymbol", "WBTC"),
+        "contract_address": intern_optional(raw_tx["contractAddress"]),
+        "token_name": intern_optional(raw_tx.get("tokenName", "Wrapped Bitcoin")),
+        "token_symbol": intern_optional(raw_tx.get("tokenSymbol", "WBTC")),
         "token_decimal": token_decimal,
 
         "value_raw": value_raw,
@@ -83,8 +124,157 @@ def normalize_wbtc_tx(raw_tx: Dict[str, Any]) -> Dict[str, Any]:
         "tx_fee_eth": tx_fee_eth,
         "tx_fee_usd": tx_fee_usd,
 
-        "input": raw_tx.get("input"),
-        "method_id": raw_tx.get("methodId"),
-        "function_name": raw_tx.get("functionName"),
+        "input": raw_tx.get("input") if keep_input else None,
+        "method_id": intern_optional(raw_tx.get("methodId")),
+        "function_name": intern_optional(raw_tx.get("functionName")),
         "confirmations": int(raw_tx["confirmations"]),
-    }
+    })
+
+
+# колонки в том же порядке, что и ключи normalize_wbtc_tx
+BATCH_COLUMNS = list(TRANSFER_FIELDS)
+
+_WEI_PER_ETH = Decimal(10) ** 18
+# кусок normalize_to_records — страница Etherscan
+NORMALIZE_CHUNK_ROWS = 5000
+
+
+def normalize_wbtc_batch(
+    raw_txs: Sequence[Mapping[str, Any]],
+    prices: Optional[EthUsdPrices] = None,
+) -> Dict[str, List[Any]]:
+    """
+    Пачечная версия normalize_wbtc_tx: страница сырых транзакций → колонки
+    (dict имя → список значений, порядок строк сохраняется).
+
+    Значения совпадают с normalize_wbtc_tx байт-в-байт (те же Decimal-операции),
+    но дорогое делается один раз на пачку: пороги из ENV читаются один раз,
+    делители 10**decimals и datetime по timeStamp кэшируются (в блоке много
+    переводов с одним временем) вместе с ценой ETH/USD за день. value_raw и gasPrice * gasUsed — точные
+    целые в минимальных единицах, округления нет до деления на 10**decimals.
+    Колонки можно отдать в pyarrow/pandas (см. batch_to_arrow) или
+    развернуть обратно в записи (batch_to_records). Время и число строк
+    пачки идут в метрики стадии normalize.
+    """
+    with timed_stage("normalize"):
+        columns = _normalize_columns(raw_txs, prices)
+    ROWS.inc(len(raw_txs), stage="normalized")
+    return columns
+
+
+def _normalize_columns(raw_txs: Sequence[Mapping[str, Any]], prices: Optional[EthUsdPrices]) -> Dict[str, List[Any]]:
+    threshold = _whale_threshold()
+    default_eth_to_usd = _gas_eth_to_usd()
+    keep_input = ingest_profile() == INGEST_PROFILE_FULL
+
+    columns: Dict[str, List[Any]] = {name: [] for name in BATCH_COLUMNS}
+    (
+        tx_hash, block_number, block_hash, time_stamp, nonce, transaction_index,
+        from_address, to_address, contract_address, token_name, token_symbol,
+        token_decimal_col, value_raw_col, value_wbtc_col, is_whale_col,
+        gas_limit_col, gas_price_col, gas_used_col, cumulative_gas_used,
+        tx_fee_eth_col, tx_fee_usd_col, input_col, method_id, function_name,
+        confirmations,
+    ) = (columns[name].append for name in BATCH_COLUMNS)
+
+    ts_cache: Dict[str, Tuple[datetime, Decimal]] = {}
+    divisors: Dict[int, Decimal] = {}
+
+    for raw_tx in raw_txs:
+        ts_raw = raw_tx["timeStamp"]
+        cached = ts_cache.get(ts_raw)
+        if cached is None:
+            dt = datetime.fromtimestamp(int(ts_raw), tz=timezone.utc)
+            price = prices.price_on(dt.date()) if prices is not None else default_eth_to_usd
+            cached = ts_cache[ts_raw] = (dt, price)
+        dt, eth_to_usd = cached
+
+        token_decimal = int(raw_tx.get("tokenDecimal", 8))
+        value_raw = Decimal(raw_tx["value"])
+        if token_decimal > 0:
+            divisor = divisors.get(token_decimal)
+            if divisor is None:
+                divisor = divisors[token_decimal] = Decimal(10) ** token_decimal
+            value_wbtc = value_raw / divisor
+        else:
+            value_wbtc = value_raw
+
+        gas = raw_tx.get("gas")
+        gas_price = raw_tx.get("gasPrice")
+        gas_used = raw_tx.get("gasUsed")
+
+        gas_price_wei = Decimal(gas_price) if gas_price is not None and gas_price != "" else None
+        gas_used_int = int(gas_used) if gas_used is not None and gas_used != "" else None
+
+        tx_fee_eth = None
+        tx_fee_usd = None
+        if gas_price_wei is not None and gas_used_int is not None:
+            tx_fee_eth = (gas_price_wei * gas_used_int) / _WEI_PER_ETH
+            tx_fee_usd = tx_fee_eth * eth_to_usd
+
+        tx_hash(raw_tx["hash"])
+        block_number(int(raw_tx["blockNumber"]))
+        block_hash(intern_optional(raw_tx["blockHash"]))
+        time_stamp(dt)
+        nonce(int(raw_tx["nonce"]))
+        transaction_index(int(raw_tx["transactionIndex"]))
+        from_address(intern_optional(raw_tx["from"]))
+        to_address(intern_optional(raw_tx["to"]))
+        contract_address(intern_optional(raw_tx["contractAddress"]))
+        token_name(intern_optional(raw_tx.get("tokenName", "Wrapped Bitcoin")))
+        token_symbol(intern_optional(raw_tx.get("tokenSymbol", "WBTC")))
+        token_decimal_col(token_decimal)
+        value_raw_col(value_raw)
+        value_wbtc_col(value_wbtc)
+        is_whale_col(value_wbtc >= threshold)
+        gas_limit_col(int(gas) if gas is not None and gas != "" else None)
+        gas_price_col(gas_price_wei)
+        gas_used_col(gas_used_int)
+        cumulative_gas_used(Decimal(raw_tx["cumulativeGasUsed"]))
+        tx_fee_eth_col(tx_fee_eth)
+        tx_fee_usd_col(tx_fee_usd)
+        input_col(raw_tx.get("input") if keep_input else None)
+        method_id(intern_optional(raw_tx.get("methodId")))
+        function_name(intern_optional(raw_tx.get("functionName")))
+        confirmations(int(raw_tx["confirmations"]))
+
+    return columns
+
+
+def batch_to_records(columns: Dict[str, List[Any]]) -> List[TransferRecord]:
+    """
+    Колонки normalize_wbtc_batch → список TransferRecord, как у normalize_wbtc_tx.
+    """
+    return [TransferRecord(*row) for row in zip(*(columns[name] for name in TRANSFER_FIELDS))]
+
+
+def normalize_to_records(
+    raw_txs: List[Mapping[str, Any]],
+    prices: Optional[EthUsdPrices] = None,
+    chunk_size: int = NORMALIZE_CHUNK_ROWS,
+) -> List[TransferRecord]:
+    """
+    normalize_wbtc_batch + batch_to_records кусками по chunk_size для не-потокового
+    пути, где в памяти вся выгрузка: колонки существуют только для куска, а сырые
+    записи освобождаются по мере нормализации — raw_txs опустошается (вызывающий
+    код больше не должен его читать). Пик памяти — записи плюс один кусок сырых,
+    а не сырые, колонки и записи сразу.
+    """
+    records: List[TransferRecord] = []
+    total = len(raw_txs)
+    for start in range(0, total, chunk_size):
+        end = min(start + chunk_size, total)
+        records.extend(batch_to_records(normalize_wbtc_batch(raw_txs[start:end], prices=prices)))
+        # список не сдвигается (O(n) на кусок), просто отпускаем ссылки
+        raw_txs[start:end] = [None] * (end - start)
+    raw_txs.clear()
+    return records
+
+
+def batch_to_arrow(columns: Dict[str, List[Any]]):
+    """
+    Колонки normalize_wbtc_batch → pyarrow.Table (decimal-колонки остаются точными).
+    """
+    import pyarrow as pa
+
+    return pa.table(columns)
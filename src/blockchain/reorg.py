@@ -0,0 +1,97 @@
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.blockchain.fetch_wbtc_bulk import reorg_safety_blocks
+
+DEFAULT_POLL_INTERVAL_SEC = 12.0
+DEFAULT_POLL_MAX_BLOCKS = 5_000
+
+
+def confirmations_required() -> int:
+    """
+    Сколько подтверждений нужно, чтобы строка считалась окончательной (is_confirmed).
+    ENV CONFIRMATIONS_REQUIRED, по умолчанию REORG_SAFETY_BLOCKS.
+    """
+    raw = os.getenv("CONFIRMATIONS_REQUIRED", "").strip()
+    if not raw:
+        return max(1, reorg_safety_blocks())
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        return max(1, reorg_safety_blocks())
+
+
+def poll_interval_sec() -> float:
+    """
+    Пауза между опросами головы цепи. ENV HEAD_POLL_INTERVAL_SEC=12 (≈ время блока).
+    """
+    raw = os.getenv("HEAD_POLL_INTERVAL_SEC", str(DEFAULT_POLL_INTERVAL_SEC))
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return DEFAULT_POLL_INTERVAL_SEC
+
+
+def poll_max_blocks() -> int:
+    """
+    Сколько блоков поллер берёт за один опрос. ENV HEAD_POLL_MAX_BLOCKS=5000:
+    отставание после простоя догоняется кусками, а не одной выгрузкой в память.
+    """
+    raw = os.getenv("HEAD_POLL_MAX_BLOCKS", str(DEFAULT_POLL_MAX_BLOCKS))
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        return DEFAULT_POLL_MAX_BLOCKS
+
+
+def poll_window(
+    head: int,
+    confirmations: int,
+    stored_max: Optional[int],
+    lowest_unconfirmed: Optional[int],
+    synced_to: Optional[int] = None,
+    max_blocks: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Диапазон блоков [lo, hi] для одного опроса: новые блоки после stored_max,
+    последние confirmations блоков (их block_hash перепроверяется) и все ещё
+    неподтверждённые строки (если поллер простаивал дольше окна).
+    synced_to — до какого блока дошёл прошлый опрос (блоки без переводов
+    не оставляют строк, по stored_max их не видно).
+    max_blocks — окно не длиннее: hi = min(head, lo + max_blocks - 1).
+    """
+    lo = max(0, head - confirmations + 1)
+    last = stored_max if synced_to is None else max(stored_max or 0, synced_to)
+    if last is not None:
+        lo = min(lo, last + 1)
+    if lowest_unconfirmed is not None:
+        lo = min(lo, lowest_unconfirmed)
+    hi = head if max_blocks is None else min(head, lo + max(1, max_blocks) - 1)
+    return lo, hi
+
+
+def block_hashes(records: Iterable[Dict]) -> Dict[int, str]:
+    """
+    {block_number: block_hash} по нормализованным записям.
+    """
+    return {int(rec["block_number"]): str(rec["block_hash"]).lower() for rec in records}
+
+
+def find_reorg_block(stored: Dict[int, str], fetched: Dict[int, str], head: int) -> Optional[int]:
+    """
+    Первый блок, сохранённый в БД с другим block_hash, чем в свежей выдаче
+    (или пропавший из неё), — с него цепь в БД разошлась с канонической.
+    Блоки выше head (узел Etherscan отстал) не сравниваются. None — расхождений нет.
+    """
+    for block in sorted(stored):
+        if block > head:
+            break
+        if fetched.get(block) != stored[block].lower():
+            return block
+    return None
@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.config import load_project_dotenv
+
+load_project_dotenv()
+
+CACHE_OFF = "off"
+CACHE_ON = "on"
+CACHE_REPLAY = "replay"
+
+DEFAULT_CACHE_DIR = PROJECT_ROOT / "data" / "etherscan_cache"
+DEFAULT_FINALITY_BLOCKS = 64
+
+
+def cache_mode() -> str:
+    """
+    ENV ETHERSCAN_CACHE: off (default), on — готовые страницы с диска, остальные
+    из сети с записью в кэш, replay — только кэш, без обращений к API.
+    """
+    mode = os.getenv("ETHERSCAN_CACHE", CACHE_OFF).strip().lower() or CACHE_OFF
+    if mode not in (CACHE_OFF, CACHE_ON, CACHE_REPLAY):
+        raise ValueError(f"Неизвестный режим ETHERSCAN_CACHE: {mode}")
+    return mode
+
+
+def finality_blocks() -> int:
+    """
+    Глубина (в блоках), после которой страница считается неизменной.
+    ENV ETHERSCAN_CACHE_FINALITY_BLOCKS=64 по умолчанию.
+    """
+    raw = os.getenv("ETHERSCAN_CACHE_FINALITY_BLOCKS", str(DEFAULT_FINALITY_BLOCKS))
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return DEFAULT_FINALITY_BLOCKS
+
+
+def cache_key(request: Dict[str, Any]) -> str:
+    """
+    Адрес записи — sha256 от канонического JSON параметров запроса
+    (chainid, contract, startblock, endblock, page, offset, sort).
+    """
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_finalized(txs: List[Dict], end_block: int, depth: int, head: Optional[int] = None) -> bool:
+    """
+    Страница не изменится, если весь диапазон запроса лежит глубже depth блоков
+    под головой. Голова оценивается по самой выдаче: blockNumber + confirmations - 1,
+    либо передаётся явно (head). Пустую выдачу без head оценить не по чему —
+    она не считается готовой.
+    """
+    heads = [] if head is None else [head]
+    for tx in txs:
+        try:
+            heads.append(int(tx["blockNumber"]) + int(tx["confirmations"]) - 1)
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not heads:
+        return False
+    return end_block <= max(heads) - depth
+
+
+class ResponseCache:
+    """
+    Локальный кэш ответов tokentx: по gzip-файлу JSON на запрос в
+    root/<2 символа ключа>/<ключ>.json.gz. Записываются все успешные страницы
+    с пометкой finalized; в режиме on с диска отдаются только готовые
+    (головные окна всегда перекачиваются), в replay — любые.
+    """
+
+    def __init__(self, root: Path, mode: str = CACHE_ON, depth: int = DEFAULT_FINALITY_BLOCKS):
+        self.root = Path(root)
+        self.mode = mode
+        self.depth = depth
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == CACHE_REPLAY
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    def get(self, request: Dict[str, Any]) -> Optional[List[Dict]]:
+        path = self._path(cache_key(request))
+        entry = None
+        if path.exists():
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        usable = entry is not None and (entry["finalized"] or self.replay)
+        with self._lock:
+            if usable:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry["result"] if usable else None
+
+    def put(self, request: Dict[str, Any], txs: List[Dict], head: Optional[int] = None) -> bool:
+        """
+        Сохраняет страницу (атомарно: tmp + rename). Возвращает признак finalized.
+        """
+        finalized = is_finalized(txs, int(request["endblock"]), self.depth, head)
+        path = self._path(cache_key(request))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"request": request, "finalized": finalized, "result": txs}, f)
+        os.replace(tmp, path)
+        with self._lock:
+            self.writes += 1
+        return finalized
+
+    def save_head(self, head: int) -> None:
+        """
+        Запоминает голову сети онлайн-прогона: по ней replay восстанавливает
+        те же сегменты desc-выгрузки, что и при записи.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f"head.json.{threading.get_ident()}.tmp"
+        tmp.write_text(json.dumps({"head": head}), encoding="utf-8")
+        os.replace(tmp, self.root / "head.json")
+
+    def load_head(self) -> Optional[int]:
+        path = self.root / "head.json"
+        if not path.exists():
+            return None
+        return int(json.loads(path.read_text(encoding="utf-8"))["head"])
+
+    def summary(self) -> str:
+        with self._lock:
+            return f"Кэш Etherscan ({self.mode}): попаданий {self.hits}, промахов {self.misses}, записано {self.writes}"
+
+
+_cache_lock = threading.Lock()
+_cache: Optional[ResponseCache] = None
+_cache_config: Optional[tuple] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Общий на процесс кэш по ENV (ETHERSCAN_CACHE, ETHERSCAN_CACHE_DIR,
+    ETHERSCAN_CACHE_FINALITY_BLOCKS). None — кэш выключен.
+    """
+    global _cache, _cache_config
+    mode = cache_mode()
+    if mode == CACHE_OFF:
+        return None
+    raw_dir = os.getenv("ETHERSCAN_CACHE_DIR", "").strip()
+    config = (mode, raw_dir or str(DEFAULT_CACHE_DIR), finality_blocks())
+    with _cache_lock:
+        if _cache is None or _cache_config != config:
+            _cache = ResponseCache(Path(config[1]), mode=mode, depth=config[2])
+            _cache_config = config
+    return _cache
@@ -0,0 +1,126 @@
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.db.connection import pooled_connection
+
+# поток чекпоинтов основного ingestion (desc от головы к генезису)
+INGESTION_STREAM = "wbtc_transfers"
+CHECKPOINT_SPAN_BLOCKS = 100_000
+
+BlockRange = Tuple[int, int]
+
+
+def merge_ranges(ranges: List[BlockRange]) -> List[BlockRange]:
+    """
+    Склеивает пересекающиеся и соседние диапазоны, результат по возрастанию.
+    """
+    merged: List[BlockRange] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def pending_ranges(
+    start_block: int,
+    end_block: int,
+    done: List[BlockRange],
+    span: int = CHECKPOINT_SPAN_BLOCKS,
+) -> List[BlockRange]:
+    """
+    Диапазоны из [start_block, end_block], которые ещё не загружены (не покрыты done),
+    порезанные на куски не длиннее span. Границы кусков выровнены по span, чтобы
+    повторные запуски с другой головой сети давали те же чекпоинты.
+    Порядок — от новых блоков к старым.
+    """
+    gaps: List[BlockRange] = []
+    cursor = start_block
+    for lo, hi in merge_ranges(done):
+        if hi < cursor:
+            continue
+        if lo > end_block:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo - 1))
+        cursor = max(cursor, hi + 1)
+    if cursor <= end_block:
+        gaps.append((cursor, end_block))
+
+    chunks: List[BlockRange] = []
+    for lo, hi in gaps:
+        chunk_lo = lo
+        while chunk_lo <= hi:
+            chunk_hi = min(hi, (chunk_lo // span + 1) * span - 1)
+            chunks.append((chunk_lo, chunk_hi))
+            chunk_lo = chunk_hi + 1
+
+    chunks.reverse()
+    return chunks
+
+
+def resumable_ranges(
+    head: int,
+    done: List[BlockRange],
+    safety_blocks: int,
+    span: int = CHECKPOINT_SPAN_BLOCKS,
+) -> List[BlockRange]:
+    """
+    Незагруженные диапазоны для загрузки по чекпоинтам: только до
+    head - safety_blocks. Готовый диапазон отмечается навсегда, а блоки у самой
+    головы Etherscan мог ещё не проиндексировать или они уйдут в реорг —
+    их докачает следующий запуск (или поллер головы).
+    """
+    safe_head = head - max(0, safety_blocks)
+    if safe_head < 0:
+        return []
+    return pending_ranges(0, safe_head, done, span=span)
+
+
+def load_done_ranges(stream: str = INGESTION_STREAM) -> List[BlockRange]:
+    """
+    Возвращает уже загруженные и закоммиченные диапазоны блоков.
+    """
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT range_start, range_end
+                FROM raw.ingestion_checkpoints
+                WHERE stream = %s;
+                """,
+                (stream,),
+            )
+            return merge_ranges([(int(lo), int(hi)) for lo, hi in cur.fetchall()])
+
+
+def save_checkpoint(
+    range_start: int,
+    range_end: int,
+    rows_saved: int = 0,
+    stream: str = INGESTION_STREAM,
+) -> None:
+    """
+    Фиксирует, что блоки [range_start, range_end] полностью загружены и закоммичены.
+    Вызывать только после коммита данных. Ключ — (stream, range_end): при загрузке
+    сверху вниз один и тот же кусок продлевается вниз по мере сохранения пачек.
+    """
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO raw.ingestion_checkpoints (stream, range_start, range_end, rows_saved)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (stream, range_end) DO UPDATE
+                SET range_start = LEAST(raw.ingestion_checkpoints.range_start, EXCLUDED.range_start),
+                    rows_saved  = EXCLUDED.rows_saved,
+                    updated_at  = now();
+                """,
+                (stream, range_start, range_end, rows_saved),
+            )
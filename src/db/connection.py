@@ -1,9 +1,14 @@
 import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
 
 import psycopg2
-from psycopg2.extensions import connection
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection
+from psycopg2.pool import ThreadedConnectionPool
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
@@ -13,19 +18,178 @@ from src.utils.config import load_project_dotenv
 
 load_project_dotenv()
 
+DEFAULT_POOL_MIN = 1
+DEFAULT_POOL_MAX = 10
+DEFAULT_STATEMENT_TIMEOUT_MS = 600_000
+# соединение, простоявшее в пуле дольше, перед выдачей проверяется SELECT 1
+HEALTHCHECK_IDLE_SEC = 30.0
+
+_pool_lock = threading.Lock()
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+_last_used: Dict[int, float] = {}
+_engine: Any = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _pg_params() -> Dict[str, Any]:
+    return {
+        "host": os.getenv("PGHOST", "localhost"),
+        "port": os.getenv("PGPORT", "5432"),
+        "dbname": os.getenv("PGDATABASE", "tobd"),
+        "user": os.getenv("PGUSER", "postgres"),
+        "password": os.getenv("PGPASSWORD", "postgres"),
+    }
+
+
+def _session_options() -> str:
+    """
+    Параметры сессии для пуловых соединений: statement_timeout и UTC, чтобы
+    date(time_stamp) одинаково резался на дни во всех путях (SQL, Dask).
+    ENV PG_STATEMENT_TIMEOUT_MS (0 — без ограничения).
+    """
+    timeout_ms = _env_int("PG_STATEMENT_TIMEOUT_MS", DEFAULT_STATEMENT_TIMEOUT_MS)
+    return f"-c statement_timeout={max(0, timeout_ms)} -c timezone=UTC"
+
+
+def make_pg_url() -> str:
+    params = _pg_params()
+    return (
+        f"postgresql+psycopg2://{params['user']}:{params['password']}"
+        f"@{params['host']}:{params['port']}/{params['dbname']}"
+    )
+
 
 def get_pg_connection() -> connection:
     """
     Простейшее подключение к Postgres.
     Конфиг берём из ENV:
       PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD
+    Для регулярной работы используйте pooled_connection(); отдельное соединение
+    нужно разовым операциям (init_db с autocommit и ретраями).
     """
-    conn = psycopg2.connect(
-        host=os.getenv("PGHOST", "localhost"),
-        port=os.getenv("PGPORT", "5432"),
-        dbname=os.getenv("PGDATABASE", "tobd"),
-        user=os.getenv("PGUSER", "postgres"),
-        password=os.getenv("PGPASSWORD", "postgres"),
-    )
+    conn = psycopg2.connect(**_pg_params())
     conn.autocommit = False
     return conn
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Общий на процесс пул соединений (PG_POOL_MIN/PG_POOL_MAX, по умолчанию 1/10).
+    После fork (воркеры Dask/Prefect) пул создаётся заново.
+    """
+    global _pool, _pool_pid, _pool_slots
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                min_size = max(0, _env_int("PG_POOL_MIN", DEFAULT_POOL_MIN))
+                max_size = max(1, min_size, _env_int("PG_POOL_MAX", DEFAULT_POOL_MAX))
+                _pool = ThreadedConnectionPool(
+                    min_size,
+                    max_size,
+                    options=_session_options(),
+                    **_pg_params(),
+                )
+                _pool_slots = threading.BoundedSemaphore(max_size)
+                _pool_pid = pid
+                _last_used.clear()
+    return _pool
+
+
+def _is_healthy(conn: connection) -> bool:
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    # свежие соединения и недавно вернувшиеся в пул не пингуем
+    if last_used is None or time.monotonic() - last_used < HEALTHCHECK_IDLE_SEC:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+@contextmanager
+def pooled_connection() -> Iterator[connection]:
+    """
+    Соединение из пула на время блока:
+
+        with pooled_connection() as conn:
+            with conn, conn.cursor() as cur:
+                ...
+
+    Если все соединения заняты — ждёт освобождения. Протухшие соединения
+    (долгий простой + неудачный SELECT 1) выкидываются и заменяются новыми.
+    Незавершённая транзакция при возврате в пул откатывается.
+    """
+    pool = get_pool()
+    slots = _pool_slots
+    assert slots is not None
+    slots.acquire()
+    conn: Optional[connection] = None
+    try:
+        conn = pool.getconn()
+        if not _is_healthy(conn):
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        conn.autocommit = False
+
+        yield conn
+    finally:
+        if conn is not None:
+            broken = conn.closed != 0
+            if not broken and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            if broken:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=broken)
+        slots.release()
+
+
+def close_pool() -> None:
+    """Закрывает все соединения пула (например, в конце CLI-скрипта)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
+
+
+def get_sqlalchemy_engine():
+    """
+    Общий на процесс SQLAlchemy engine (для pandas.to_sql/read_sql) с тем же
+    размером пула, pre-ping и statement_timeout, что и у psycopg2-пула.
+    """
+    global _engine
+    if _engine is None:
+        with _pool_lock:
+            if _engine is None:
+                # sqlalchemy нужен только аналитике, поэтому импортируем лениво
+                from sqlalchemy import create_engine
+
+                _engine = create_engine(
+                    make_pg_url(),
+                    pool_size=max(1, _env_int("PG_POOL_MAX", DEFAULT_POOL_MAX)),
+                    max_overflow=0,
+                    pool_pre_ping=True,
+                    connect_args={"options": _session_options()},
+                )
+    return _engine
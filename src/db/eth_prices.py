@@ -0,0 +1,105 @@
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Optional
+
+from psycopg2.extras import execute_values
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.config import load_project_dotenv
+from src.blockchain.eth_prices import EthUsdPrices, read_price_csv
+from src.blockchain.normalize import _gas_eth_to_usd
+from src.db.connection import pooled_connection
+
+load_project_dotenv()
+
+# цены подгружаются заново не чаще, чем раз в столько секунд (долгоживущий поллер)
+PRICES_TTL_SEC = 3600.0
+
+UPSERT_PRICES_SQL = """
+INSERT INTO ref.eth_usd_daily (date, price_usd, source)
+VALUES %s
+ON CONFLICT (date) DO UPDATE
+SET price_usd  = EXCLUDED.price_usd,
+    source     = EXCLUDED.source,
+    updated_at = now();
+"""
+
+_prices_lock = threading.Lock()
+_prices: Optional[EthUsdPrices] = None
+_prices_loaded_at = 0.0
+
+
+def load_eth_usd_prices(cur) -> Dict[date, Decimal]:
+    cur.execute("SELECT date, price_usd FROM ref.eth_usd_daily;")
+    return {day: Decimal(price) for day, price in cur.fetchall()}
+
+
+def upsert_eth_usd_prices(cur, prices: Dict[date, Decimal], source: str) -> int:
+    rows = [(day, price, source) for day, price in sorted(prices.items())]
+    if rows:
+        execute_values(cur, UPSERT_PRICES_SQL, rows)
+    return len(rows)
+
+
+def price_table_version(cur) -> str:
+    """
+    Отпечаток содержимого ref.eth_usd_daily (число дней и время последнего
+    изменения) — меняется после каждой загрузки цен.
+    """
+    cur.execute("SELECT COUNT(*), COALESCE(EXTRACT(EPOCH FROM MAX(updated_at))::bigint, 0) FROM ref.eth_usd_daily;")
+    count, updated = cur.fetchone()
+    return f"{count}@{updated}"
+
+
+def get_eth_usd_prices(ttl_sec: float = PRICES_TTL_SEC) -> EthUsdPrices:
+    """
+    Общий на процесс EthUsdPrices из ref.eth_usd_daily: один запрос при первом
+    обращении и после истечения ttl_sec. Пустая таблица — все дни по GAS_ETH_TO_USD.
+    """
+    global _prices, _prices_loaded_at
+    with _prices_lock:
+        if _prices is None or time.monotonic() - _prices_loaded_at > ttl_sec:
+            with pooled_connection() as conn:
+                with conn, conn.cursor() as cur:
+                    prices = load_eth_usd_prices(cur)
+            _prices = EthUsdPrices(prices, fallback=_gas_eth_to_usd())
+            _prices_loaded_at = time.monotonic()
+        return _prices
+
+
+def reset_price_cache() -> None:
+    global _prices
+    with _prices_lock:
+        _prices = None
+
+
+def load_price_csv(path: Path, source: Optional[str] = None) -> int:
+    """
+    Загружает CSV (date, price_usd) в ref.eth_usd_daily upsert'ом по дате.
+    Возвращает число записанных дней.
+    """
+    prices = read_price_csv(path)
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            written = upsert_eth_usd_prices(cur, prices, source or Path(path).name)
+    reset_price_cache()
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Загрузка дневных цен ETH/USD в ref.eth_usd_daily")
+    parser.add_argument("csv", type=Path, help="CSV с колонками date и price_usd (или price / close)")
+    parser.add_argument("--source", default=None, help="Метка источника (по умолчанию имя файла)")
+    args = parser.parse_args()
+
+    days = load_price_csv(args.csv, source=args.source)
+    print(f"ref.eth_usd_daily: записано дней {days}; пересчитать tx_fee_usd в raw — python -m src.db.reclassify")
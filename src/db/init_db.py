@@ -1,11 +1,20 @@
 import time
+from datetime import date, timedelta
 from pathlib import Path
 from typing import Iterable, Set
 
 import psycopg2
 
 from src.db.connection import get_pg_connection
+from src.analytics.rebuild_daily_stats import backfill_aggregates
 from src.db.save_transfers import COLUMNS as RAW_COLUMNS
+from src.db.partitions import (
+    MONTHS_AHEAD,
+    PARTITIONED_SQL_PATH,
+    ensure_partitions_for_range,
+    is_partitioned,
+    partitioned_layout_enabled,
+)
 
 MODELS_SQL_PATH = Path(__file__).resolve().parent / "models.sql"
 
@@ -50,6 +59,13 @@ def init_db(max_retries: int = 10, retry_delay: int = 2) -> None:
     """
     Инициализирует схемы и таблицы по DDL из models.sql.
     При несовпадении схемы raw.wbtc_transfers/analytics.daily_stats — пересоздаёт таблицы.
+    С WBTC_PARTITIONED=1 новая raw.wbtc_transfers создаётся помесячно
+    партиционированной (models_partitioned.sql) с партициями на MONTHS_AHEAD
+    месяцев вперёд; существующую обычную таблицу переводит
+    python -m src.db.migrate_partitioned.
+    Если analytics.daily_sender_volume или таблицы корзин созданы только что
+    (обновление схемы поверх загруженной истории), агрегаты заполняются из raw
+    (backfill_aggregates).
     """
     ddl_sql = MODELS_SQL_PATH.read_text()
 
@@ -71,8 +87,29 @@ def init_db(max_retries: int = 10, retry_delay: int = 2) -> None:
             _ensure_table_schema(cur, "raw", "wbtc_transfers", REQUIRED_RAW_COLUMNS)
             _ensure_table_schema(cur, "analytics", "daily_stats", REQUIRED_ANALYTICS_COLUMNS)
 
+            if partitioned_layout_enabled():
+                if not _fetch_columns(cur, "raw", "wbtc_transfers"):
+                    cur.execute(PARTITIONED_SQL_PATH.read_text())
+                elif not is_partitioned(cur):
+                    print(
+                        "⚠️  raw.wbtc_transfers не партиционирована. "
+                        "Перенос без остановки: python -m src.db.migrate_partitioned"
+                    )
+
+            new_aggregates = any(
+                not _fetch_columns(cur, "analytics", table)
+                for table in ("daily_sender_volume", "hourly_stats", "stats_10m")
+            )
             cur.execute(ddl_sql)
 
+            if is_partitioned(cur):
+                today = date.today()
+                ensure_partitions_for_range(cur, today, today + timedelta(days=31 * MONTHS_AHEAD))
+
+        if new_aggregates:
+            backfill_aggregates()
+            print("✅ Агрегаты analytics заполнены из raw.wbtc_transfers")
+
         print("✅ DB init done: схемы raw/analytics и таблицы приведены к актуальной схеме")
     finally:
         conn.close()
@@ -0,0 +1,175 @@
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.analytics.rebuild_daily_stats import backfill_aggregates
+from src.db.connection import get_pg_connection
+from src.db.partitions import (
+    MONTHS_AHEAD,
+    PARTITIONED_SQL_PATH,
+    ensure_partitions_for_range,
+    is_partitioned,
+    reset_partition_cache,
+)
+from src.db.save_transfers import COLUMNS
+
+MODELS_SQL_PATH = Path(__file__).resolve().parent / "models.sql"
+LEGACY_TABLE = "raw.wbtc_transfers_legacy"
+DEFAULT_CHUNK_ROWS = 50_000
+
+_COLS = ", ".join(["id", *COLUMNS])
+
+COPY_CHUNK_SQL = f"""
+WITH src AS (
+    SELECT {_COLS}
+    FROM {LEGACY_TABLE}
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+),
+ins AS (
+    INSERT INTO raw.wbtc_transfers ({_COLS})
+    SELECT {_COLS} FROM src
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+SELECT (SELECT MAX(id) FROM src), (SELECT COUNT(*) FROM src), (SELECT COUNT(*) FROM ins);
+"""
+
+
+def _table_exists(cur, qualified: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (qualified,))
+    return bool(cur.fetchone()[0])
+
+
+def _swap_in_partitioned_table(cur) -> None:
+    """
+    Одна короткая транзакция (только DDL, без переноса данных): старая таблица
+    переименовывается в legacy, на её место встаёт партиционированная, новые
+    вставки сразу идут в неё. id продолжают sequence старой таблицы.
+    """
+    cur.execute("LOCK TABLE raw.wbtc_transfers IN ACCESS EXCLUSIVE MODE;")
+    cur.execute("SELECT COALESCE(MAX(id), 0), MIN(time_stamp), MAX(time_stamp) FROM raw.wbtc_transfers;")
+    max_id, min_ts, max_ts = cur.fetchone()
+
+    cur.execute("ALTER TABLE raw.wbtc_transfers RENAME TO wbtc_transfers_legacy;")
+
+    # имена индексов, ограничений и sequence уникальны в схеме — освобождаем их
+    cur.execute(
+        """
+        SELECT indexname FROM pg_indexes
+        WHERE schemaname = 'raw' AND tablename = 'wbtc_transfers_legacy';
+        """
+    )
+    for (index_name,) in cur.fetchall():
+        cur.execute(f'ALTER INDEX raw."{index_name}" RENAME TO "{index_name}_legacy";')
+    cur.execute("ALTER SEQUENCE IF EXISTS raw.wbtc_transfers_id_seq RENAME TO wbtc_transfers_legacy_id_seq;")
+
+    cur.execute(PARTITIONED_SQL_PATH.read_text())
+    cur.execute(MODELS_SQL_PATH.read_text())
+    cur.execute(
+        "SELECT setval(pg_get_serial_sequence('raw.wbtc_transfers', 'id'), %s);",
+        (max(int(max_id), 1),),
+    )
+
+    reset_partition_cache()
+    today = date.today()
+    start = min_ts.date() if min_ts is not None else today
+    end = max(max_ts.date() if max_ts is not None else today, today) + timedelta(days=31 * MONTHS_AHEAD)
+    ensure_partitions_for_range(cur, start, end)
+
+
+def migrate_to_partitioned(chunk_rows: int = DEFAULT_CHUNK_ROWS, drop_legacy: bool = False) -> int:
+    """
+    Переводит существующую raw.wbtc_transfers в помесячно партиционированную
+    раскладку без остановки загрузки и без DROP+пересоздания:
+    1) короткая DDL-транзакция меняет таблицы местами (см. _swap_in_partitioned_table);
+    2) строки переносятся из legacy пачками по id, каждая пачка — своя транзакция,
+       поэтому блокировки короткие, а прерванную миграцию можно перезапустить;
+    3) когда в новой таблице есть все строки legacy, агрегаты загрузки
+       пересобираются из raw (backfill_aggregates): строку legacy, ещё не
+       перенесённую к моменту, когда живая загрузка вставила её повторно,
+       загрузка учла в агрегатах второй раз;
+    4) с drop_legacy legacy после этого удаляется.
+    Возвращает число перенесённых строк.
+    """
+    conn = get_pg_connection()
+    try:
+        with conn, conn.cursor() as cur:
+            partitioned = is_partitioned(cur)
+            has_legacy = _table_exists(cur, LEGACY_TABLE)
+            if partitioned and not has_legacy:
+                print("raw.wbtc_transfers уже партиционирована, переносить нечего")
+                return 0
+            if not partitioned:
+                if has_legacy:
+                    raise RuntimeError(f"{LEGACY_TABLE} уже существует, а новая таблица не партиционирована")
+                _swap_in_partitioned_table(cur)
+                print("🔀 raw.wbtc_transfers заменена партиционированной, перенос истории...")
+
+        with conn, conn.cursor() as cur:
+            cur.execute(f"SELECT COALESCE(MAX(id), 0), COUNT(*) FROM {LEGACY_TABLE};")
+            legacy_max_id, legacy_rows = cur.fetchone()
+            # всё, что id <= legacy_max_id, в новой таблице могло прийти только из legacy
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM raw.wbtc_transfers WHERE id <= %s;", (legacy_max_id,))
+            cursor_id = cur.fetchone()[0]
+
+        moved_total = 0
+        started = time.perf_counter()
+        while cursor_id < legacy_max_id:
+            with conn, conn.cursor() as cur:
+                cur.execute(COPY_CHUNK_SQL, (cursor_id, chunk_rows))
+                last_id, scanned, inserted = cur.fetchone()
+            if not scanned:
+                break
+            cursor_id = last_id
+            moved_total += inserted
+            rate = moved_total / max(time.perf_counter() - started, 1e-9)
+            print(f"  • перенесено {moved_total}/{legacy_rows} (id ≤ {cursor_id}, {rate:.0f} строк/с)")
+
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT COUNT(*) FROM {LEGACY_TABLE} l
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM raw.wbtc_transfers n
+                    WHERE n.tx_hash = l.tx_hash
+                      AND n.contract_address = l.contract_address
+                      AND n.time_stamp = l.time_stamp
+                );
+                """
+            )
+            missing = cur.fetchone()[0]
+            if missing:
+                print(f"⚠️  В новой таблице нет {missing} строк legacy, {LEGACY_TABLE} оставлена")
+                return moved_total
+
+        backfill_aggregates()
+        print("🔁 Агрегаты analytics пересобраны из новой raw.wbtc_transfers")
+
+        with conn, conn.cursor() as cur:
+            if drop_legacy:
+                cur.execute(f"DROP TABLE {LEGACY_TABLE};")
+                print(f"🗑  {LEGACY_TABLE} удалена")
+            else:
+                print(f"✅ Перенос завершён, {LEGACY_TABLE} можно удалить (--drop-legacy)")
+
+        return moved_total
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Перевод raw.wbtc_transfers на помесячные партиции без остановки")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Строк в одной транзакции переноса")
+    parser.add_argument("--drop-legacy", action="store_true", help="Удалить старую таблицу после успешного переноса")
+    args = parser.parse_args()
+
+    migrate_to_partitioned(chunk_rows=args.chunk_rows, drop_legacy=args.drop_legacy)
@@ -1,5 +1,7 @@
 CREATE SCHEMA IF NOT EXISTS raw;
 CREATE SCHEMA IF NOT EXISTS analytics;
+CREATE SCHEMA IF NOT EXISTS ref;
+CREATE SCHEMA IF NOT EXISTS ops;
 
 CREATE TABLE IF NOT EXISTS raw.wbtc_transfers (
     id                  BIGSERIAL PRIMARY KEY,
@@ -47,6 +49,23 @@ CREATE TABLE IF NOT EXISTS raw.wbtc_transfers (
 CREATE INDEX IF NOT EXISTS idx_wbtc_value_desc ON raw.wbtc_transfers (value_wbtc DESC);
 CREATE INDEX IF NOT EXISTS idx_wbtc_is_whale ON raw.wbtc_transfers (is_whale) WHERE is_whale = TRUE;
 CREATE INDEX IF NOT EXISTS idx_wbtc_timestamp ON raw.wbtc_transfers (time_stamp);
+CREATE INDEX IF NOT EXISTS idx_wbtc_block_number ON raw.wbtc_transfers (block_number);
+
+-- подтверждённость блока: поллер головы снимает флаг у свежих строк и
+-- возвращает его после N подтверждений и повторной проверки block_hash
+ALTER TABLE raw.wbtc_transfers ADD COLUMN IF NOT EXISTS is_confirmed BOOLEAN NOT NULL DEFAULT TRUE;
+CREATE INDEX IF NOT EXISTS idx_wbtc_unconfirmed ON raw.wbtc_transfers (block_number) WHERE NOT is_confirmed;
+
+-- чекпоинты ingestion: блоки [range_start, range_end] загружены и закоммичены
+CREATE TABLE IF NOT EXISTS raw.ingestion_checkpoints (
+    stream              TEXT        NOT NULL,
+    range_start         BIGINT      NOT NULL,
+    range_end           BIGINT      NOT NULL,
+    rows_saved          BIGINT      NOT NULL DEFAULT 0,
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    PRIMARY KEY (stream, range_end)
+);
 
 CREATE TABLE IF NOT EXISTS analytics.daily_stats (
     date                DATE PRIMARY KEY,
@@ -56,3 +75,97 @@ CREATE TABLE IF NOT EXISTS analytics.daily_stats (
     max_tx_volume       NUMERIC(38, 8),
     top_sender          TEXT
 );
+
+-- частичные агрегаты по отправителям: загрузка аддитивно upsert'ит (date, from_address),
+-- top_sender и top-N отправителей читаются отсюда без пересканирования raw
+CREATE TABLE IF NOT EXISTS analytics.daily_sender_volume (
+    date                DATE        NOT NULL,
+    from_address        VARCHAR(64) NOT NULL,
+    volume              NUMERIC(38, 8) NOT NULL,
+    tx_count            BIGINT      NOT NULL,
+
+    PRIMARY KEY (date, from_address)
+);
+
+CREATE INDEX IF NOT EXISTS idx_daily_sender_volume_top ON analytics.daily_sender_volume (date, volume DESC);
+
+-- внутридневные корзины для near-real-time панелей Grafana; ведутся загрузкой
+-- аддитивно (max — GREATEST), после удаления строк пересчитываются из raw
+CREATE TABLE IF NOT EXISTS analytics.hourly_stats (
+    bucket              TIMESTAMPTZ PRIMARY KEY,
+    tx_count            BIGINT      NOT NULL,
+    total_volume_wbtc   NUMERIC(38, 8) NOT NULL,
+    whale_tx_count      BIGINT      NOT NULL,
+    max_tx_volume       NUMERIC(38, 8)
+);
+
+CREATE TABLE IF NOT EXISTS analytics.stats_10m (
+    bucket              TIMESTAMPTZ PRIMARY KEY,
+    tx_count            BIGINT      NOT NULL,
+    total_volume_wbtc   NUMERIC(38, 8) NOT NULL,
+    whale_tx_count      BIGINT      NOT NULL,
+    max_tx_volume       NUMERIC(38, 8)
+);
+
+-- старый Dask-путь (to_sql if_exists="replace") пересоздавал витрину без первичного ключа,
+-- а upsert'ам нужен ON CONFLICT (date)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'analytics.daily_stats'::regclass AND contype = 'p'
+    ) THEN
+        DELETE FROM analytics.daily_stats a
+        USING analytics.daily_stats b
+        WHERE a.date = b.date AND a.ctid < b.ctid;
+        ALTER TABLE analytics.daily_stats ADD PRIMARY KEY (date);
+    END IF;
+END $$;
+
+-- водяные знаки инкрементальных пересчётов: строки raw с id <= last_id уже учтены
+CREATE TABLE IF NOT EXISTS analytics.watermarks (
+    name                TEXT PRIMARY KEY,
+    last_id             BIGINT      NOT NULL DEFAULT 0,
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- дневная цена ETH/USD для оценки комиссий (python -m src.db.eth_prices prices.csv)
+CREATE TABLE IF NOT EXISTS ref.eth_usd_daily (
+    date                DATE PRIMARY KEY,
+    price_usd           NUMERIC(18, 6) NOT NULL,
+    source              TEXT,
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- суммарные комиссии дня в USD (по tx_fee_usd строк)
+ALTER TABLE analytics.daily_stats ADD COLUMN IF NOT EXISTS total_fee_usd NUMERIC(38, 2);
+
+-- по строке на запуск flow: пропускная способность стадий, квота API, задержки страниц
+CREATE TABLE IF NOT EXISTS ops.pipeline_runs (
+    id                      BIGSERIAL PRIMARY KEY,
+    flow                    TEXT        NOT NULL,
+    status                  TEXT        NOT NULL,
+    started_at              TIMESTAMPTZ NOT NULL,
+    finished_at             TIMESTAMPTZ NOT NULL,
+
+    rows_fetched            BIGINT      NOT NULL DEFAULT 0,
+    rows_normalized         BIGINT      NOT NULL DEFAULT 0,
+    rows_inserted           BIGINT      NOT NULL DEFAULT 0,
+    rows_conflicted         BIGINT      NOT NULL DEFAULT 0,
+    rows_analytics          BIGINT      NOT NULL DEFAULT 0,
+
+    api_requests            BIGINT      NOT NULL DEFAULT 0,
+    api_errors              BIGINT      NOT NULL DEFAULT 0,
+
+    fetch_rows_per_sec      NUMERIC(14, 2),
+    normalize_rows_per_sec  NUMERIC(14, 2),
+    insert_rows_per_sec     NUMERIC(14, 2),
+    page_p50_ms             NUMERIC(12, 1),
+    page_p95_ms             NUMERIC(12, 1),
+
+    -- запросы по исходу и ключу, страницы кэша, время стадий, пики очередей
+    details                 JSONB       NOT NULL DEFAULT '{}'::jsonb
+);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_runs_flow_started
+    ON ops.pipeline_runs (flow, started_at);
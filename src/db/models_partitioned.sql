@@ -0,0 +1,57 @@
+-- Помесячно партиционированная раскладка raw.wbtc_transfers (WBTC_PARTITIONED=1).
+-- Колонки совпадают с models.sql; ключ партиционирования time_stamp обязан входить
+-- в PK и уникальный ключ. Партиции месяцев создаёт src/db/partitions.py,
+-- всё, для чего партиции ещё нет, попадает в DEFAULT.
+CREATE SCHEMA IF NOT EXISTS raw;
+
+CREATE TABLE IF NOT EXISTS raw.wbtc_transfers (
+    id                  BIGSERIAL,
+
+    -- базовая идентификация
+    tx_hash             VARCHAR(66) NOT NULL,
+    block_number        BIGINT      NOT NULL,
+    block_hash          VARCHAR(66) NOT NULL,
+    time_stamp          TIMESTAMPTZ NOT NULL,
+
+    nonce               BIGINT,
+    transaction_index   INTEGER,
+
+    from_address        VARCHAR(64) NOT NULL,
+    to_address          VARCHAR(64) NOT NULL,
+
+    -- токен
+    contract_address    VARCHAR(64) NOT NULL,
+    token_name          TEXT        NOT NULL,
+    token_symbol        TEXT        NOT NULL,
+    token_decimal       INTEGER     NOT NULL,
+
+    value_raw           NUMERIC(78, 0) NOT NULL,
+    value_wbtc          NUMERIC(38, 8) NOT NULL,
+    is_whale            BOOLEAN      NOT NULL DEFAULT FALSE,
+
+    -- газ / комиссия
+    gas_limit           BIGINT,
+    gas_price_wei       NUMERIC(78, 0),
+    gas_used            BIGINT,
+    cumulative_gas_used NUMERIC(78, 0),
+    tx_fee_eth          NUMERIC(38, 18),
+    tx_fee_usd          NUMERIC(38, 2),
+
+    -- вызов
+    input               TEXT,
+    method_id           VARCHAR(18),
+    function_name       TEXT,
+
+    confirmations       BIGINT,
+
+    PRIMARY KEY (id, time_stamp),
+    CONSTRAINT ux_wbtc_transfer UNIQUE (tx_hash, contract_address, time_stamp)
+) PARTITION BY RANGE (time_stamp);
+
+CREATE TABLE IF NOT EXISTS raw.wbtc_transfers_default PARTITION OF raw.wbtc_transfers DEFAULT;
+
+-- данные пишутся почти по порядку блоков/времени: BRIN на порядки меньше B-tree
+-- и почти не дорожает на вставке. Имя idx_wbtc_timestamp совпадает с B-tree
+-- из models.sql, поэтому его CREATE INDEX IF NOT EXISTS здесь не сработает.
+CREATE INDEX IF NOT EXISTS idx_wbtc_timestamp ON raw.wbtc_transfers USING brin (time_stamp);
+CREATE INDEX IF NOT EXISTS idx_wbtc_block_brin ON raw.wbtc_transfers USING brin (block_number);
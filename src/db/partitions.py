@@ -0,0 +1,161 @@
+import os
+import threading
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Iterable, Optional, Set
+
+PARTITIONED_SQL_PATH = Path(__file__).resolve().parent / "models_partitioned.sql"
+
+PARENT_TABLE = "raw.wbtc_transfers"
+DEFAULT_PARTITION = "raw.wbtc_transfers_default"
+MONTHS_AHEAD = 2
+
+# один и тот же ключ advisory-lock во всех процессах, создающих партиции
+_PARTITION_LOCK_KEY = 0x77627463  # "wbtc"
+
+_cache_lock = threading.Lock()
+_known_months: Set[date] = set()
+_layout_partitioned: Optional[bool] = None
+
+
+def partitioned_layout_enabled() -> bool:
+    """
+    ENV WBTC_PARTITIONED=1 — создавать raw.wbtc_transfers помесячно
+    партиционированной по time_stamp (по умолчанию обычная таблица).
+    """
+    return os.getenv("WBTC_PARTITIONED", "0").strip().lower() in ("1", "true", "yes")
+
+
+def month_start(value) -> date:
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc) if value.tzinfo else value
+    return date(value.year, value.month, 1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"raw.wbtc_transfers_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(cur) -> bool:
+    cur.execute(
+        """
+        SELECT c.relkind = 'p'
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'raw' AND c.relname = 'wbtc_transfers';
+        """
+    )
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def _existing_months(cur) -> Set[date]:
+    cur.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        WHERE n.nspname = 'raw' AND parent.relname = 'wbtc_transfers';
+        """
+    )
+    months = set()
+    for (name,) in cur.fetchall():
+        # wbtc_transfers_yYYYYmMM
+        if len(name) == len("wbtc_transfers_y2000m01") and name.startswith("wbtc_transfers_y"):
+            months.add(date(int(name[16:20]), int(name[21:23]), 1))
+    return months
+
+
+def _create_partition(cur, month: date) -> None:
+    name = partition_name(month)
+    lo = f"{month.isoformat()} 00:00:00+00"
+    hi = f"{next_month(month).isoformat()} 00:00:00+00"
+
+    cur.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE time_stamp >= %s AND time_stamp < %s);",
+        (lo, hi),
+    )
+    has_rows_in_default = cur.fetchone()[0]
+
+    if not has_rows_in_default:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ('{lo}') TO ('{hi}');")
+        return
+
+    # строки месяца уже попали в DEFAULT: переносим их в отдельную таблицу и
+    # подключаем её как партицию (иначе CREATE ... PARTITION OF упадёт)
+    cur.execute(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE time_stamp >= %s AND time_stamp < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved;
+        """,
+        (lo, hi),
+    )
+    cur.execute(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}');")
+
+
+def ensure_monthly_partitions(cur, months: Iterable[date]) -> int:
+    """
+    Создаёт недостающие помесячные партиции. Возвращает число созданных.
+    Работает в транзакции вызывающего кода под advisory-lock, чтобы параллельные
+    загрузчики не создавали одну партицию дважды.
+    В кэш процесса попадают только партиции, уже закоммиченные на момент
+    проверки: созданная здесь откатится вместе с пачкой, если транзакция
+    вызывающего кода не дойдёт до коммита, — её месяц проверится ещё раз
+    при следующей пачке.
+    """
+    wanted = {month_start(m) for m in months}
+    with _cache_lock:
+        missing = wanted - _known_months
+    if not missing:
+        return 0
+
+    cur.execute("SELECT pg_advisory_xact_lock(%s);", (_PARTITION_LOCK_KEY,))
+    existing = _existing_months(cur)
+    created = 0
+    for month in sorted(missing - existing):
+        _create_partition(cur, month)
+        created += 1
+
+    with _cache_lock:
+        _known_months.update(existing)
+    return created
+
+
+def ensure_partitions_for_range(cur, start: date, end: date) -> int:
+    months = []
+    month = month_start(start)
+    while month <= end:
+        months.append(month)
+        month = next_month(month)
+    return ensure_monthly_partitions(cur, months)
+
+
+def ensure_partitions_for_records(cur, records) -> int:
+    """
+    Перед вставкой пачки: если raw.wbtc_transfers партиционирована — создаёт
+    партиции под месяцы из records (результат проверки раскладки кэшируется).
+    """
+    global _layout_partitioned
+    if _layout_partitioned is None:
+        _layout_partitioned = is_partitioned(cur)
+    if not _layout_partitioned:
+        return 0
+    return ensure_monthly_partitions(cur, {month_start(rec["time_stamp"]) for rec in records})
+
+
+def reset_partition_cache() -> None:
+    global _layout_partitioned
+    with _cache_lock:
+        _known_months.clear()
+    _layout_partitioned = None
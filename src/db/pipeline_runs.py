@@ -0,0 +1,74 @@
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.db.connection import pooled_connection
+from src.utils.metrics import RunMetrics, RunReport, write_textfile
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+RUN_COLUMNS = [
+    "rows_fetched",
+    "rows_normalized",
+    "rows_inserted",
+    "rows_conflicted",
+    "rows_analytics",
+    "api_requests",
+    "api_errors",
+    "fetch_rows_per_sec",
+    "normalize_rows_per_sec",
+    "insert_rows_per_sec",
+    "page_p50_ms",
+    "page_p95_ms",
+]
+
+INSERT_RUN_SQL = f"""
+INSERT INTO ops.pipeline_runs (flow, status, started_at, finished_at, {", ".join(RUN_COLUMNS)}, details)
+VALUES (%s, %s, %s, %s, {", ".join(["%s"] * len(RUN_COLUMNS))}, %s::jsonb);
+"""
+
+
+def save_pipeline_run(cur, flow: str, status: str, report: RunReport) -> None:
+    cur.execute(
+        INSERT_RUN_SQL,
+        (
+            flow,
+            status,
+            report.started_at,
+            report.finished_at,
+            *(getattr(report, col) for col in RUN_COLUMNS),
+            json.dumps(report.details, sort_keys=True),
+        ),
+    )
+
+
+@contextmanager
+def tracked_run(flow: str, logger=None) -> Iterator[RunMetrics]:
+    """
+    Оборачивает запуск flow: по завершении (и при ошибке) считает дельту
+    метрик, обновляет METRICS_TEXTFILE и пишет строку в ops.pipeline_runs.
+    Сбой записи метрик не роняет сам flow.
+    """
+    run = RunMetrics()
+    status = STATUS_FAILED
+    try:
+        yield run
+        status = STATUS_OK
+    finally:
+        report = run.finish()
+        log = logger.info if logger is not None else print
+        log(report.summary())
+        try:
+            write_textfile()
+            with pooled_connection() as conn:
+                with conn, conn.cursor() as cur:
+                    save_pipeline_run(cur, flow, status, report)
+        except Exception as e:
+            log(f"⚠️ Не удалось записать метрики запуска {flow}: {e}")
@@ -0,0 +1,159 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.config import load_project_dotenv
+from src.analytics.parquet_lake import invalidate_block_range, load_manifest
+from src.analytics.rebuild_daily_stats import refresh_daily_stats_for_dates
+from src.blockchain.normalize import _gas_eth_to_usd, _whale_threshold
+from src.db.checkpoints import BlockRange, load_done_ranges, pending_ranges, save_checkpoint
+from src.db.connection import pooled_connection
+from src.db.eth_prices import price_table_version
+from src.db.rollups import refresh_rollups_for_range
+
+load_project_dotenv()
+
+DEFAULT_CHUNK_BLOCKS = 20_000
+DEFAULT_WORKERS = 4
+
+# пересчёт витрин после чанка сериализуется между потоками (корзины и дни
+# соседних чанков пересекаются), сам UPDATE raw идёт параллельно
+_REFRESH_LOCK_KEY = 0x77627472  # "wbtr"
+
+# цена ETH за день строки: последняя известная на эту дату из ref.eth_usd_daily
+# (индекс первичного ключа), раньше первой цены — GAS_ETH_TO_USD
+_NEW_FEE_USD = """round(tx_fee_eth * COALESCE(
+        (SELECT p.price_usd FROM ref.eth_usd_daily p
+         WHERE p.date <= date(time_stamp) ORDER BY p.date DESC LIMIT 1),
+        %(eth_usd)s), 2)"""
+
+_CHANGED = f"""(is_whale IS DISTINCT FROM (value_wbtc >= %(threshold)s)
+           OR tx_fee_usd IS DISTINCT FROM {_NEW_FEE_USD})"""
+
+# changed читает снимок до UPDATE (все CTE одного запроса видят один снимок):
+# дни и время изменившихся строк — только они задевают витрины
+RECLASSIFY_CHUNK_SQL = f"""
+WITH changed AS (
+    SELECT date(time_stamp) AS date, MIN(time_stamp) AS ts_lo, MAX(time_stamp) AS ts_hi
+    FROM raw.wbtc_transfers
+    WHERE block_number BETWEEN %(lo)s AND %(hi)s
+      AND value_wbtc > 0
+      AND {_CHANGED}
+    GROUP BY 1
+),
+upd AS (
+    UPDATE raw.wbtc_transfers
+    SET is_whale   = value_wbtc >= %(threshold)s,
+        tx_fee_usd = {_NEW_FEE_USD}
+    WHERE block_number BETWEEN %(lo)s AND %(hi)s
+      AND {_CHANGED}
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM upd), c.date, c.ts_lo, c.ts_hi
+FROM (SELECT 1) one
+LEFT JOIN changed c ON TRUE;
+"""
+
+
+def reclassify_stream(threshold: Decimal, eth_usd: Decimal, prices_version: str) -> str:
+    # поток чекпоинтов зависит от параметров и таблицы цен: новые значения — новый проход
+    return f"reclassify:whale={threshold}:eth_usd={eth_usd}:prices={prices_version}"
+
+
+def reclassify_chunk(block_range: BlockRange, threshold: Decimal, eth_usd: Decimal) -> Tuple[int, int]:
+    """
+    Одна транзакция на диапазон блоков: пересчёт is_whale и tx_fee_usd у строк,
+    где они отличаются от новых значений, и пересчёт задетых дней daily_stats
+    (whale_tx_count, total_fee_usd) и внутридневных корзин.
+    Возвращает (обновлено строк, пересчитано дней витрины).
+    """
+    lo, hi = block_range
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            cur.execute(RECLASSIFY_CHUNK_SQL, {"lo": lo, "hi": hi, "threshold": threshold, "eth_usd": eth_usd})
+            rows = cur.fetchall()
+            updated = int(rows[0][0])
+            changed = [row[1:] for row in rows if row[1] is not None]
+            if changed:
+                cur.execute("SELECT pg_advisory_xact_lock(%s);", (_REFRESH_LOCK_KEY,))
+                refresh_daily_stats_for_dates(cur, [day for day, _, _ in changed])
+                refresh_rollups_for_range(cur, min(r[1] for r in changed), max(r[2] for r in changed))
+    return updated, len(changed)
+
+
+def reclassify_transfers(
+    threshold: Optional[Decimal] = None,
+    eth_usd: Optional[Decimal] = None,
+    chunk_blocks: int = DEFAULT_CHUNK_BLOCKS,
+    workers: int = DEFAULT_WORKERS,
+) -> int:
+    """
+    Пересчитывает is_whale (порог WBTC_WHALE_THRESHOLD_BTC) и tx_fee_usd
+    (цена дня из ref.eth_usd_daily, до первой цены — GAS_ETH_TO_USD) прямо в raw.wbtc_transfers, без повторной выгрузки.
+    Диапазон блоков режется на чанки по chunk_blocks, чанки идут в workers
+    потоков, каждый — короткая транзакция (блокировки строк держатся только
+    на время чанка). Готовые чанки записываются в raw.ingestion_checkpoints
+    отдельным потоком, так что прерванный проход продолжается с места остановки.
+    Parquet-копия хранит is_whale и tx_fee_usd, а sync_lake дописывает только
+    новые id, поэтому её файлы с блоками изменившегося чанка перевыгружаются
+    после его коммита — иначе Dask-пересчёт из lake вернул бы старые значения.
+    Возвращает число обновлённых строк.
+    """
+    threshold = _whale_threshold() if threshold is None else threshold
+    eth_usd = _gas_eth_to_usd() if eth_usd is None else eth_usd
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            stream = reclassify_stream(threshold, eth_usd, price_table_version(cur))
+            cur.execute("SELECT MIN(block_number), MAX(block_number) FROM raw.wbtc_transfers;")
+            min_block, max_block = cur.fetchone()
+    if min_block is None:
+        print("raw.wbtc_transfers пуста, пересчитывать нечего")
+        return 0
+
+    chunks = pending_ranges(int(min_block), int(max_block), load_done_ranges(stream), span=chunk_blocks)
+    print(f"🔁 Пересчёт is_whale ≥ {threshold} WBTC, ETH→USD {eth_usd}: {len(chunks)} чанков, потоков {workers}")
+
+    has_lake = bool(load_manifest()["parts"])
+    updated_total = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="reclassify") as executor:
+        futures = {executor.submit(reclassify_chunk, chunk, threshold, eth_usd): chunk for chunk in chunks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            lo, hi = futures[future]
+            updated, days = future.result()
+            # манифест копии правится только из этого потока
+            if updated and has_lake:
+                invalidate_block_range(lo, hi)
+            save_checkpoint(lo, hi, updated, stream=stream)
+            updated_total += updated
+            print(
+                f"  • [{done}/{len(chunks)}] блоки {lo}..{hi}: обновлено {updated}, дней витрины {days} "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+    return updated_total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересчёт is_whale и tx_fee_usd в raw.wbtc_transfers без перезагрузки")
+    parser.add_argument("--threshold", type=Decimal, default=None, help="Порог кита в WBTC (WBTC_WHALE_THRESHOLD_BTC)")
+    parser.add_argument("--eth-usd", type=Decimal, default=None, help="Курс ETH→USD для дней до первой цены в ref.eth_usd_daily (GAS_ETH_TO_USD)")
+    parser.add_argument("--chunk-blocks", type=int, default=DEFAULT_CHUNK_BLOCKS, help="Блоков в одной транзакции")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Параллельных потоков")
+    args = parser.parse_args()
+
+    rows = reclassify_transfers(
+        threshold=args.threshold,
+        eth_usd=args.eth_usd,
+        chunk_blocks=args.chunk_blocks,
+        workers=args.workers,
+    )
+    print(f"Пересчитано строк: {rows}")
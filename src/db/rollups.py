@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+# внутридневные агрегаты для Grafana: таблица → выражение корзины по time_stamp
+# (date_trunc зависит от timezone сессии — у пуловых соединений это UTC)
+ROLLUPS: Dict[str, str] = {
+    "analytics.hourly_stats": "date_trunc('hour', time_stamp)",
+    "analytics.stats_10m": "date_bin('10 minutes', time_stamp, TIMESTAMPTZ '2000-01-01 00:00:00+00')",
+}
+
+_AGGREGATES = """
+    COUNT(*),
+    SUM(value_wbtc),
+    COUNT(*) FILTER (WHERE is_whale),
+    MAX(value_wbtc)"""
+
+_ROLLUP_COLUMNS = "bucket, tx_count, total_volume_wbtc, whale_tx_count, max_tx_volume"
+
+
+def rollup_upsert_sql(table: str, bucket_expr: str, source: str = "ins") -> str:
+    """
+    Аддитивный upsert строк source (CTE с time_stamp, value_wbtc, is_whale) в
+    таблицу корзин: счётчики и объём складываются, максимум — GREATEST.
+    """
+    return f"""
+INSERT INTO {table} ({_ROLLUP_COLUMNS})
+SELECT {bucket_expr},{_AGGREGATES}
+FROM {source}
+WHERE value_wbtc > 0
+GROUP BY 1
+ORDER BY 1
+ON CONFLICT (bucket) DO UPDATE
+SET tx_count          = {table}.tx_count + EXCLUDED.tx_count,
+    total_volume_wbtc = {table}.total_volume_wbtc + EXCLUDED.total_volume_wbtc,
+    whale_tx_count    = {table}.whale_tx_count + EXCLUDED.whale_tx_count,
+    max_tx_volume     = GREATEST({table}.max_tx_volume, EXCLUDED.max_tx_volume)
+"""
+
+
+def rollup_upsert_ctes(source: str = "ins") -> str:
+    """
+    Дополнительные CTE для запроса вставки в raw: ",rollup_0 AS (...), ...".
+    """
+    return "".join(
+        f",\nrollup_{i} AS ({rollup_upsert_sql(table, bucket, source)})"
+        for i, (table, bucket) in enumerate(ROLLUPS.items())
+    )
+
+
+def _hour_floor(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def refresh_rollups_for_range(cur, start_ts: datetime, end_ts: datetime) -> None:
+    """
+    Пересчитывает корзины всех ROLLUPS, задевающие [start_ts, end_ts], из raw.
+    Нужен после удаления строк (максимум нельзя вычесть) и для бэкфилла.
+    Границы выравниваются по часу — это граница корзин обеих гранулярностей.
+    В транзакции вызывающего кода.
+    """
+    lo = _hour_floor(start_ts)
+    hi = _hour_floor(end_ts) + timedelta(hours=1)
+    for table, bucket in ROLLUPS.items():
+        cur.execute(f"DELETE FROM {table} WHERE bucket >= %s AND bucket < %s;", (lo, hi))
+        cur.execute(
+            f"""
+            INSERT INTO {table} ({_ROLLUP_COLUMNS})
+            SELECT {bucket},{_AGGREGATES}
+            FROM raw.wbtc_transfers
+            WHERE value_wbtc > 0 AND time_stamp >= %s AND time_stamp < %s
+            GROUP BY 1;
+            """,
+            (lo, hi),
+        )
+
+
+def rebuild_rollups(cur) -> None:
+    """
+    Полная пересборка ROLLUPS из raw (бэкфилл после обновления схемы).
+    """
+    for table, bucket in ROLLUPS.items():
+        cur.execute(f"TRUNCATE {table};")
+        cur.execute(
+            f"""
+            INSERT INTO {table} ({_ROLLUP_COLUMNS})
+            SELECT {bucket},{_AGGREGATES}
+            FROM raw.wbtc_transfers
+            WHERE value_wbtc > 0
+            GROUP BY 1;
+            """
+        )
@@ -1,6 +1,10 @@
+import csv
+import io
+import os
 import sys
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from psycopg2.extras import execute_values
 
@@ -8,7 +12,11 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from src.db.connection import get_pg_connection
+from src.db.connection import pooled_connection
+from src.db.partitions import ensure_partitions_for_records
+from src.db.rollups import refresh_rollups_for_range, rollup_upsert_ctes
+from src.utils.metrics import ROWS, timed_stage
+from src.utils.profiling import profile_stage
 
 
 COLUMNS = [
@@ -40,32 +48,232 @@ COLUMNS = [
 ]
 
 
+# вставленные строки сразу складываются в analytics.daily_sender_volume
+# и внутридневные корзины (аддитивный upsert), поэтому top_sender и
+# near-real-time панели не требуют пересканировать raw;
+# ORDER BY — одинаковый порядок блокировок строк у параллельных загрузчиков
+SENDER_VOLUME_UPSERT_SQL = """
+INSERT INTO analytics.daily_sender_volume (date, from_address, volume, tx_count)
+SELECT date(time_stamp), from_address, SUM(value_wbtc), COUNT(*)
+FROM ins
+WHERE value_wbtc > 0
+GROUP BY 1, 2
+ORDER BY 1, 2
+ON CONFLICT (date, from_address) DO UPDATE
+SET volume   = analytics.daily_sender_volume.volume + EXCLUDED.volume,
+    tx_count = analytics.daily_sender_volume.tx_count + EXCLUDED.tx_count
+"""
+
+# итог вставки одной строкой: число вставленных и вставленные киты (JSON) —
+# только реально новые строки, дубликаты отсекает ON CONFLICT DO NOTHING
+INSERTED_SUMMARY_SQL = """
+SELECT
+    COUNT(*),
+    COALESCE(
+        json_agg(json_build_object(
+            'tx_hash', tx_hash,
+            'block_number', block_number,
+            'time_stamp', time_stamp,
+            'from_address', from_address,
+            'to_address', to_address,
+            'value_wbtc', value_wbtc::text
+        )) FILTER (WHERE is_whale),
+        '[]'::json
+    )
+FROM ins"""
+
+_INS_RETURNING = "RETURNING tx_hash, block_number, time_stamp, from_address, to_address, value_wbtc, is_whale"
+
 INSERT_SQL = f"""
-INSERT INTO raw.wbtc_transfers ({", ".join(COLUMNS)})
-VALUES %s
-ON CONFLICT DO NOTHING
-RETURNING 1;
+WITH ins AS (
+    INSERT INTO raw.wbtc_transfers ({", ".join(COLUMNS)})
+    VALUES %s
+    ON CONFLICT DO NOTHING
+    {_INS_RETURNING}
+),
+sender_volume AS ({SENDER_VOLUME_UPSERT_SQL}){rollup_upsert_ctes()}
+{INSERTED_SUMMARY_SQL};
+"""
+
+
+LOAD_METHOD_VALUES = "values"
+LOAD_METHOD_COPY = "copy"
+
+STAGE_TABLE = "wbtc_transfers_stage"
+
+# временная таблица живёт до конца сессии (пуловое соединение переиспользуется)
+# и очищается на каждом коммите;
+# без id, чтобы не тратить значения sequence на строки стейджинга
+CREATE_STAGE_SQL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE}
+ON COMMIT DELETE ROWS
+AS SELECT {", ".join(COLUMNS)} FROM raw.wbtc_transfers WITH NO DATA;
+"""
+
+COPY_STAGE_SQL = f"""
+COPY {STAGE_TABLE} ({", ".join(COLUMNS)})
+FROM STDIN WITH (FORMAT csv, NULL '\\N');
+"""
+
+INSERT_FROM_STAGE_SQL = f"""
+WITH ins AS (
+    INSERT INTO raw.wbtc_transfers ({", ".join(COLUMNS)})
+    SELECT {", ".join(COLUMNS)} FROM {STAGE_TABLE}
+    ON CONFLICT DO NOTHING
+    {_INS_RETURNING}
+),
+sender_volume AS ({SENDER_VOLUME_UPSERT_SQL}){rollup_upsert_ctes()}
+{INSERTED_SUMMARY_SQL};
 """
 
 
-def save_transfers_batch(records: List[Dict[str, Any]]) -> int:
+def load_method() -> str:
     """
-    Сохраняет пачку нормализованных транзакций в БД.
-    records — это output normalize_wbtc_tx.
-    Возвращает количество записей в пачке (для логов).
+    Способ записи пачек: "copy" (COPY в стейджинг + INSERT ... SELECT) или
+    "values" (execute_values). ENV WBTC_LOAD_METHOD=copy по умолчанию.
     """
-    if not records:
-        return 0
+    method = os.getenv("WBTC_LOAD_METHOD", LOAD_METHOD_COPY).strip().lower()
+    return method if method in (LOAD_METHOD_COPY, LOAD_METHOD_VALUES) else LOAD_METHOD_COPY
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def records_to_csv(records: List[Dict[str, Any]]) -> io.StringIO:
+    """
+    Пачка нормализованных транзакций в CSV-буфер для COPY (NULL = \\N).
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for rec in records:
+        writer.writerow([_csv_value(rec.get(col)) for col in COLUMNS])
+    buf.seek(0)
+    return buf
+
+
+InsertResult = Tuple[int, List[Dict[str, Any]]]
 
+
+def _save_values(cur, records: List[Dict[str, Any]]) -> InsertResult:
     rows = [
         [rec.get(col) for col in COLUMNS]
         for rec in records
     ]
+    # execute_values шлёт запрос постранично — по итоговой строке на страницу
+    with profile_stage("load.execute_values"):
+        pages = execute_values(cur, INSERT_SQL, rows, fetch=True) or []
+    inserted = sum(int(count) for count, _ in pages)
+    whales = [whale for _, page_whales in pages for whale in page_whales]
+    return inserted, whales
+
+
+def _save_copy(cur, records: List[Dict[str, Any]]) -> InsertResult:
+    cur.execute(CREATE_STAGE_SQL)
+    with profile_stage("load.copy"):
+        cur.copy_expert(COPY_STAGE_SQL, records_to_csv(records))
+    with profile_stage("load.insert_from_stage"):
+        cur.execute(INSERT_FROM_STAGE_SQL)
+    # RETURNING INSERT ... ON CONFLICT DO NOTHING — ровно вставленные строки
+    count, whales = cur.fetchone()
+    return int(count), whales
+
 
-    conn = get_pg_connection()
-    try:
+def save_transfers_batch(
+    records: List[Dict[str, Any]],
+    method: Optional[str] = None,
+    on_whales: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> int:
+    """
+    Сохраняет пачку нормализованных транзакций в БД.
+    records — это output normalize_wbtc_tx.
+    method — "copy" или "values" (по умолчанию load_method()).
+    on_whales — вызывается после коммита с вставленными китами (только новые
+    строки, уже существовавшие не повторяются): tx_hash, block_number,
+    time_stamp (ISO), from_address, to_address, value_wbtc (строка).
+    Возвращает количество реально вставленных записей (дубликаты не считаются).
+    Время пачки, вставленные и пропущенные по конфликту строки идут в метрики
+    (src/utils/metrics.py).
+    """
+    if not records:
+        return 0
+
+    method = method or load_method()
+
+    with timed_stage("load"), pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            ensure_partitions_for_records(cur, records)
+            if method == LOAD_METHOD_COPY:
+                inserted, whales = _save_copy(cur, records)
+            else:
+                inserted, whales = _save_values(cur, records)
+    ROWS.inc(inserted, stage="inserted")
+    ROWS.inc(len(records) - inserted, stage="conflicts")
+
+    if on_whales is not None and whales:
+        on_whales(whales)
+    return inserted
+
+
+SENDER_VOLUME_RETRACT_SQL = """
+UPDATE analytics.daily_sender_volume v
+SET volume   = v.volume - d.volume,
+    tx_count = v.tx_count - d.tx_count
+FROM (
+    SELECT date(time_stamp) AS date, from_address, SUM(value_wbtc) AS volume, COUNT(*) AS tx_count
+    FROM del
+    WHERE value_wbtc > 0
+    GROUP BY 1, 2
+) d
+WHERE v.date = d.date AND v.from_address = d.from_address
+"""
+
+
+def delete_transfers(cur, where_sql: str, params: Any = ()) -> int:
+    """
+    Удаляет строки raw.wbtc_transfers по условию where_sql, вычитает их из
+    analytics.daily_sender_volume и пересчитывает задетые внутридневные корзины
+    (обратная операция к загрузке).
+    Работает в транзакции вызывающего кода. Возвращает число удалённых строк.
+    """
+    cur.execute(
+        f"""
+        WITH del AS (
+            DELETE FROM raw.wbtc_transfers
+            WHERE {where_sql}
+            RETURNING time_stamp, from_address, value_wbtc
+        ),
+        sender_volume AS ({SENDER_VOLUME_RETRACT_SQL})
+        SELECT date(time_stamp), COUNT(*), MIN(time_stamp), MAX(time_stamp) FROM del GROUP BY 1;
+        """,
+        params,
+    )
+    per_date = cur.fetchall()
+    if per_date:
+        cur.execute(
+            "DELETE FROM analytics.daily_sender_volume WHERE date = ANY(%s) AND tx_count <= 0;",
+            ([row[0] for row in per_date],),
+        )
+        # MAX не вычитается — корзины пересчитываются из оставшихся строк
+        refresh_rollups_for_range(cur, min(row[2] for row in per_date), max(row[3] for row in per_date))
+    return sum(int(row[1]) for row in per_date)
+
+
+def get_max_block_number() -> Optional[int]:
+    """
+    Последний сохранённый блок в raw.wbtc_transfers (None, если таблица пуста).
+    """
+    with pooled_connection() as conn:
         with conn, conn.cursor() as cur:
-            inserted_rows = execute_values(cur, INSERT_SQL, rows, fetch=True)
-        return len(inserted_rows) if inserted_rows else 0
-    finally:
-        conn.close()
+            # MAX идёт обратным сканом B-tree idx_wbtc_block_number (в партиционированной
+            # раскладке — по индексу каждой партиции); индекс времени там BRIN и
+            # упорядоченного скана не даёт
+            cur.execute("SELECT MAX(block_number) FROM raw.wbtc_transfers;")
+            row = cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
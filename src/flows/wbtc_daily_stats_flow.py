@@ -1,5 +1,7 @@
+import os
 import sys
 from pathlib import Path
+from typing import Optional
 
 from prefect import flow, task, get_run_logger
 
@@ -9,38 +11,78 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from src.utils.config import load_project_dotenv
 from src.analytics.dask_daily_stats import rebuild_daily_stats_with_dask
+from src.db.pipeline_runs import tracked_run
+from src.utils.metrics import ROWS, start_metrics_server, timed_stage
+from src.utils.profiling import PROFILE_MODES, profiled_run
 
 
 @task(name="build_whale_daily_stats_with_dask")
-def build_whale_daily_stats_with_dask() -> int:
+def build_whale_daily_stats_with_dask(incremental: bool = False, source: Optional[str] = None) -> int:
     """
     Пересчитывает analytics.daily_stats через Dask на основе raw.wbtc_transfers.
 
+    Args:
+        incremental: пересчитать только дни с новыми строками (по водяному знаку id).
+        source: "db" или "lake" (Parquet-копия); по умолчанию WBTC_ANALYTICS_SOURCE.
+
     Returns:
         Количество строк, записанных в analytics.daily_stats.
     """
-    rows = rebuild_daily_stats_with_dask()
+    with timed_stage("analytics"):
+        rows = rebuild_daily_stats_with_dask(incremental=incremental, source=source)
+    ROWS.inc(rows, stage="analytics")
     return rows
 
 
 @flow(name="wbtc_daily_stats_flow")
-def wbtc_daily_stats_flow() -> int:
+def wbtc_daily_stats_flow(incremental: bool = False, source: Optional[str] = None) -> int:
     """
     Flow: пересчитывает таблицу analytics.daily_stats с использованием Dask.
 
+    Args:
+        incremental: upsert только дней, затронутых строками после прошлого пересчёта,
+            вместо пересборки по всей истории.
+        source: читать из Postgres ("db") или из Parquet-копии ("lake").
+
     Returns:
         Количество строк в обновлённой analytics.daily_stats.
     """
     load_project_dotenv()
+    start_metrics_server()
 
     logger = get_run_logger()
-    logger.info("Старт wbtc_daily_stats_flow")
+    logger.info(f"Старт wbtc_daily_stats_flow (incremental={incremental}, source={source})")
 
-    rows = build_whale_daily_stats_with_dask()
+    with profiled_run("wbtc_daily_stats_flow", logger), tracked_run("wbtc_daily_stats_flow", logger):
+        rows = build_whale_daily_stats_with_dask(incremental=incremental, source=source)
 
     logger.info(f"wbtc_daily_stats_flow завершён. Строк записано: {rows}")
     return rows
 
 
 if __name__ == "__main__":
-    wbtc_daily_stats_flow()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Пересчёт analytics.daily_stats")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Пересчитать только дни с новыми строками raw.wbtc_transfers",
+    )
+    parser.add_argument(
+        "--source",
+        choices=["db", "lake"],
+        default=None,
+        help="Читать переводы из Postgres или из Parquet-копии (по умолчанию WBTC_ANALYTICS_SOURCE)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILE_MODES),
+        default=None,
+        help="Профилирование: timers, cprofile или sample (по умолчанию WBTC_PROFILE)",
+    )
+    args = parser.parse_args()
+    if args.profile:
+        os.environ["WBTC_PROFILE"] = args.profile
+
+    wbtc_daily_stats_flow(incremental=args.incremental, source=args.source)
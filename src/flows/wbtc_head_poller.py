@@ -0,0 +1,226 @@
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from src.utils.config import load_project_dotenv
+from src.analytics.parquet_lake import invalidate_block_range, load_manifest
+from src.analytics.rebuild_daily_stats import refresh_daily_stats_for_dates, refresh_daily_stats_incremental
+from src.blockchain.fetch_wbtc_bulk import FetchProgress, fetch_latest_block, fetch_wbtc_all, load_api_keys
+from src.blockchain.key_pool import KeyPool
+from src.blockchain.normalize import batch_to_records, normalize_wbtc_batch
+from src.blockchain.reorg import (
+    block_hashes,
+    confirmations_required,
+    find_reorg_block,
+    poll_interval_sec,
+    poll_max_blocks,
+    poll_window,
+)
+from src.db.connection import pooled_connection
+from src.db.eth_prices import get_eth_usd_prices
+from src.db.save_transfers import delete_transfers, get_max_block_number
+from src.flows.wbtc_whale_ingestion_flow import DEFAULT_BATCH_SIZE, batch_saver
+from src.alerts.whale_alerts import get_whale_alerter
+from src.utils.metrics import start_metrics_server, write_textfile
+
+# подтверждения и флаг пересчитываются только у свежих или ещё неподтверждённых
+# строк окна — частичный индекс idx_wbtc_unconfirmed держит это дешёвым
+MARK_CONFIRMATIONS_SQL = """
+UPDATE raw.wbtc_transfers
+SET confirmations = %(head)s - block_number + 1,
+    is_confirmed  = %(head)s - block_number + 1 >= %(required)s
+WHERE block_number BETWEEN %(lo)s AND %(hi)s
+  AND (NOT is_confirmed OR block_number > %(head)s - %(required)s);
+"""
+
+
+@dataclass
+class PollResult:
+    head: int
+    window_lo: int
+    window_hi: int
+    fetched: int = 0
+    inserted: int = 0
+    reorg_block: Optional[int] = None
+    deleted: int = 0
+    # с какого блока продолжит следующий опрос (synced_to для poll_window)
+    synced_to: Optional[int] = None
+
+
+def lowest_unconfirmed_block(cur) -> Optional[int]:
+    cur.execute("SELECT MIN(block_number) FROM raw.wbtc_transfers WHERE NOT is_confirmed;")
+    row = cur.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def stored_block_hashes(cur, lo: int, hi: int) -> Dict[int, str]:
+    cur.execute(
+        """
+        SELECT DISTINCT block_number, block_hash
+        FROM raw.wbtc_transfers
+        WHERE block_number BETWEEN %s AND %s;
+        """,
+        (lo, hi),
+    )
+    return {int(block): block_hash for block, block_hash in cur.fetchall()}
+
+
+def whale_hashes_from_block(cur, block: int) -> Set[str]:
+    cur.execute(
+        "SELECT tx_hash FROM raw.wbtc_transfers WHERE block_number >= %s AND is_whale;",
+        (block,),
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def dates_from_block(cur, block: int) -> List[date]:
+    cur.execute(
+        "SELECT DISTINCT date(time_stamp) FROM raw.wbtc_transfers WHERE block_number >= %s;",
+        (block,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def poll_once(
+    pool: KeyPool,
+    confirmations: int,
+    save: Callable[[List[Dict]], int],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    synced_to: Optional[int] = None,
+    already_alerted: Optional[Set[str]] = None,
+) -> PollResult:
+    """
+    Один опрос головы цепи:
+    1. номер последнего блока (eth_blockNumber) и окно poll_window — не длиннее
+       HEAD_POLL_MAX_BLOCKS (после простоя отставание догоняется за несколько опросов);
+    2. выгрузка окна по возрастанию блоков; если окно выгружено не целиком
+       (нет ключей, исчерпаны попытки, лимит страниц) — RuntimeError до сверки
+       хэшей и любых изменений в базе;
+    3. сверка block_hash сохранённых блоков окна со свежей выдачей — при
+       расхождении строки с блока форка удаляются (вместе с частичными
+       агрегатами и корзинами, см. delete_transfers) и вставляются заново;
+       tx_hash удалённых китов попадают в already_alerted (то же множество,
+       что у batch_saver), и повторная вставка алерт не шлёт;
+    4. вставка новых строк (алерты по китам — как в обычной загрузке);
+    5. confirmations/is_confirmed по новой голове для строк окна, пересчёт
+       задетых дней daily_stats.
+    synced_to — PollResult.synced_to прошлого опроса.
+    """
+    head = fetch_latest_block(pool.acquire())
+    stored_max = get_max_block_number()
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            lowest = lowest_unconfirmed_block(cur)
+    lo, hi = poll_window(head, confirmations, stored_max, lowest, synced_to=synced_to, max_blocks=poll_max_blocks())
+    result = PollResult(head=head, window_lo=lo, window_hi=hi)
+
+    progress = FetchProgress()
+    raw_txs = list(fetch_wbtc_all(
+        start_block=lo, end_block=hi, key_pool=pool, sort="asc", use_cache=False, progress=progress,
+    ))
+    if not progress.completed:
+        # неполная выдача выглядела бы как реорг (блоки пропали) и стёрла бы строки;
+        # окно и synced_to не трогаем — следующий опрос повторит его целиком
+        raise RuntimeError(f"Окно {lo}..{hi} выгружено не полностью ({progress.requests} запросов)")
+    records = batch_to_records(normalize_wbtc_batch(raw_txs, prices=get_eth_usd_prices())) if raw_txs else []
+    result.fetched = len(records)
+
+    reorg_dates: List[date] = []
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            stored = stored_block_hashes(cur, lo, hi)
+            result.reorg_block = find_reorg_block(stored, block_hashes(records), hi)
+            if result.reorg_block is not None:
+                reorg_dates = dates_from_block(cur, result.reorg_block)
+                if already_alerted is not None:
+                    already_alerted.update(whale_hashes_from_block(cur, result.reorg_block))
+                result.deleted = delete_transfers(cur, "block_number >= %s", (result.reorg_block,))
+
+    for start in range(0, len(records), batch_size):
+        result.inserted += save(records[start:start + batch_size])
+
+    with pooled_connection() as conn:
+        with conn, conn.cursor() as cur:
+            # только строки окна: у строк выше hi хэш в этом опросе не сверялся
+            cur.execute(MARK_CONFIRMATIONS_SQL, {"lo": lo, "hi": hi, "head": head, "required": confirmations})
+            # дни, откуда строки ушли без замены, инкрементальный пересчёт по id не увидит
+            refresh_daily_stats_for_dates(cur, reorg_dates)
+
+    if result.inserted:
+        refresh_daily_stats_incremental()
+    if result.reorg_block is not None and load_manifest()["parts"]:
+        invalidate_block_range(result.reorg_block, head)
+    if result.reorg_block is None and synced_to is not None:
+        result.synced_to = max(synced_to, hi)
+    else:
+        # после реорга удалены и строки выше hi — следующий опрос начнёт с hi + 1
+        result.synced_to = hi
+    return result
+
+
+def run_head_poller(
+    interval_sec: Optional[float] = None,
+    confirmations: Optional[int] = None,
+    max_polls: Optional[int] = None,
+) -> None:
+    """
+    Долгоживущий режим: опрашивает голову цепи каждые interval_sec секунд
+    (HEAD_POLL_INTERVAL_SEC) и держит raw.wbtc_transfers в пределах нескольких
+    блоков от сети. Строки моложе confirmations (CONFIRMATIONS_REQUIRED) блоков
+    помечены is_confirmed = FALSE. Ошибка опроса логируется, цикл продолжается.
+    Метрики отдаются на METRICS_PORT и обновляются в METRICS_TEXTFILE после опроса.
+    max_polls — остановиться после стольких опросов (None — бесконечно).
+    """
+    load_project_dotenv()
+    start_metrics_server()
+    interval = poll_interval_sec() if interval_sec is None else interval_sec
+    required = confirmations_required() if confirmations is None else confirmations
+    pool = KeyPool(load_api_keys())
+    # tx_hash китов, удалённых реоргом: их повторная вставка алерт не шлёт
+    already_alerted: Set[str] = set()
+    save = batch_saver(already_alerted)
+    synced_to: Optional[int] = None
+
+    print(f"🚀 Поллер головы цепи: интервал {interval}s, подтверждений {required}")
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            started = time.monotonic()
+            polls += 1
+            try:
+                res = poll_once(pool, required, save, synced_to=synced_to, already_alerted=already_alerted)
+                synced_to = res.synced_to
+                line = f"[head {res.head}] окно {res.window_lo}..{res.window_hi}: получено {res.fetched}, вставлено {res.inserted}"
+                if res.reorg_block is not None:
+                    line += f", ⚠️ реорг с блока {res.reorg_block}: удалено {res.deleted}"
+                print(line)
+            except Exception as e:
+                print(f"⚠️  Опрос #{polls} не удался: {e}")
+            write_textfile()
+            if max_polls is None or polls < max_polls:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        print("Поллер остановлен")
+    finally:
+        alerter = get_whale_alerter()
+        if alerter is not None:
+            print(alerter.stats.summary())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Поллер головы цепи WBTC с учётом реоргов")
+    parser.add_argument("--interval", type=float, default=None, help="Секунд между опросами (HEAD_POLL_INTERVAL_SEC)")
+    parser.add_argument("--confirmations", type=int, default=None, help="Подтверждений до is_confirmed (CONFIRMATIONS_REQUIRED)")
+    parser.add_argument("--max-polls", type=int, default=None, help="Остановиться после N опросов")
+    args = parser.parse_args()
+
+    run_head_poller(interval_sec=args.interval, confirmations=args.confirmations, max_polls=args.max_polls)
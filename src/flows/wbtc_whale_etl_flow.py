@@ -1,4 +1,5 @@
 import logging
+import os
 import sys
 from pathlib import Path
 from typing import Optional, Dict, Any
@@ -13,6 +14,7 @@ if str(PROJECT_ROOT) not in sys.path:
 from src.utils.config import load_project_dotenv
 from src.flows.wbtc_whale_ingestion_flow import wbtc_whale_ingestion_flow, DEFAULT_MAX_PAGES
 from src.flows.wbtc_daily_stats_flow import wbtc_daily_stats_flow
+from src.utils.profiling import PROFILE_MODES, profiled_run
 
 
 def _safe_logger():
@@ -23,7 +25,13 @@ def _safe_logger():
 
 
 @flow(name="wbtc_whale_etl_flow")
-def wbtc_whale_etl_flow(max_pages: Optional[int] = DEFAULT_MAX_PAGES) -> Dict[str, Any]:
+def wbtc_whale_etl_flow(
+    max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+    resume: bool = False,
+    incremental: bool = False,
+    streaming: bool = False,
+    incremental_stats: bool = False,
+) -> Dict[str, Any]:
     """
     Сквозной ETL:
     1) Загружает сырые транзакции WBTC в raw.wbtc_transfers.
@@ -31,19 +39,33 @@ def wbtc_whale_etl_flow(max_pages: Optional[int] = DEFAULT_MAX_PAGES) -> Dict[st
 
     Args:
         max_pages: ограничение на количество страниц для загрузки с Etherscan (None — без лимита).
+        resume: ingestion по чекпоинтам (см. wbtc_whale_ingestion_flow).
+        incremental: ingestion только новых блоков (см. wbtc_whale_ingestion_flow).
+        streaming: потоковый ingestion (см. wbtc_whale_ingestion_flow).
+        incremental_stats: пересчитать в daily_stats только дни с новыми строками.
 
     Returns:
         Словарь с результатами стадий: {"raw_saved": int, "daily_rows": int}.
     """
     load_project_dotenv()
     logger = _safe_logger()
-    logger.info(f"Старт wbtc_whale_etl_flow (max_pages={max_pages})")
+    logger.info(
+        f"Старт wbtc_whale_etl_flow (max_pages={max_pages}, resume={resume}, "
+        f"incremental={incremental}, streaming={streaming}, incremental_stats={incremental_stats})"
+    )
 
-    raw_saved = wbtc_whale_ingestion_flow(max_pages=max_pages)
-    logger.info(f"Ingestion завершён: сохранено {raw_saved} транзакций")
+    # при WBTC_PROFILE подflow становятся стадиями одного профиля
+    with profiled_run("wbtc_whale_etl_flow", logger):
+        raw_saved = wbtc_whale_ingestion_flow(
+            max_pages=max_pages,
+            resume=resume,
+            incremental=incremental,
+            streaming=streaming,
+        )
+        logger.info(f"Ingestion завершён: сохранено {raw_saved} транзакций")
 
-    daily_rows = wbtc_daily_stats_flow()
-    logger.info(f"Analytics завершена: строк в analytics.daily_stats = {daily_rows}")
+        daily_rows = wbtc_daily_stats_flow(incremental=incremental_stats)
+        logger.info(f"Analytics завершена: строк в analytics.daily_stats = {daily_rows}")
 
     result = {"raw_saved": raw_saved, "daily_rows": daily_rows}
     logger.info(f"wbtc_whale_etl_flow завершён: {result}")
@@ -65,8 +87,42 @@ if __name__ == "__main__":
         action="store_true",
         help="Не ограничивать число страниц (эквивалент max_pages=None)",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Ingestion по чекпоинтам: продолжить с места остановки",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Ingestion только блоков новее уже сохранённых (для частого расписания)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Потоковый ingestion без материализации полных списков",
+    )
+    parser.add_argument(
+        "--incremental-stats",
+        action="store_true",
+        help="Пересчитать в analytics.daily_stats только дни с новыми строками",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILE_MODES),
+        default=None,
+        help="Профилирование: timers, cprofile или sample (по умолчанию WBTC_PROFILE)",
+    )
 
     args = parser.parse_args()
     max_pages_arg = None if args.no_limit else args.max_pages
-
-    wbtc_whale_etl_flow(max_pages=max_pages_arg)
+    if args.profile:
+        os.environ["WBTC_PROFILE"] = args.profile
+
+    wbtc_whale_etl_flow(
+        max_pages=max_pages_arg,
+        resume=args.resume,
+        incremental=args.incremental,
+        streaming=args.streaming,
+        incremental_stats=args.incremental_stats,
+    )
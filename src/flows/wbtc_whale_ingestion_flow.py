@@ -1,6 +1,7 @@
+import os
 import sys
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict, Set
 
 from prefect import flow, task, get_run_logger
 
@@ -9,9 +10,27 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
 from src.utils.config import load_project_dotenv
-from src.blockchain.fetch_wbtc_bulk import fetch_wbtc_all
-from src.blockchain.normalize import normalize_wbtc_tx
-from src.db.save_transfers import save_transfers_batch
+from src.alerts.whale_alerts import get_whale_alerter, skip_realerts
+from src.blockchain.fetch_wbtc_bulk import (
+    END_BLOCK,
+    SORT_ORDER,
+    FetchProgress,
+    fetch_latest_block,
+    fetch_wbtc_all,
+    load_api_keys,
+    reorg_safety_blocks,
+)
+from src.blockchain.http_client import LATENCY
+from src.blockchain.key_pool import KeyPool
+from src.blockchain.normalize import batch_to_records, normalize_to_records, normalize_wbtc_batch
+from src.blockchain.response_cache import get_response_cache
+from src.db.checkpoints import load_done_ranges, resumable_ranges, save_checkpoint
+from src.db.eth_prices import get_eth_usd_prices
+from src.db.pipeline_runs import tracked_run
+from src.db.save_transfers import get_max_block_number, save_transfers_batch
+from src.utils.metrics import start_metrics_server
+from src.utils.pipeline import DEFAULT_MAX_QUEUED_BATCHES, PipelineStats, stream_batches
+from src.utils.profiling import PROFILE_MODES, profiled_run
 
 
 DEFAULT_MAX_PAGES = 10
@@ -19,19 +38,56 @@ DEFAULT_BATCH_SIZE = 1000
 
 
 @task(name="extract_wbtc_raw")
-def extract_wbtc_raw(max_pages: Optional[int] = DEFAULT_MAX_PAGES) -> List[Dict]:
+def extract_wbtc_raw(
+    max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+    start_block: int = 0,
+    sort: str = SORT_ORDER,
+) -> List[Dict]:
     """
     Extract: выгружает сырые WBTC транзакции из Etherscan.
     """
-    return list(fetch_wbtc_all(max_pages=max_pages))
+    raw_txs = list(fetch_wbtc_all(max_pages=max_pages, start_block=start_block, sort=sort))
+    log_fetch_stats(get_run_logger())
+    return raw_txs
+
+
+def normalize_records(raw_txs: List[Dict]) -> List[Dict]:
+    return batch_to_records(normalize_wbtc_batch(raw_txs, prices=get_eth_usd_prices()))
 
 
 @task(name="transform_wbtc_records")
 def transform_wbtc_records(raw_txs: List[Dict]) -> List[Dict]:
     """
-    Transform: нормализация и расчёт whale-флага/комиссий.
+    Transform: нормализация и расчёт whale-флага/комиссий (кусками по странице).
+    raw_txs опустошается: сырые записи отпускаются по мере нормализации,
+    а не после неё (normalize_to_records).
+    """
+    return normalize_to_records(raw_txs, prices=get_eth_usd_prices())
+
+
+def batch_saver(already_alerted: Optional[Set[str]] = None) -> Callable[[List[Dict]], int]:
+    """
+    save_transfers_batch, который после коммита рассылает алерты по вставленным
+    китам (WHALE_ALERT_SINKS; без него — обычная запись).
+    already_alerted — tx_hash, по которым алерт не повторяется (см. skip_realerts).
     """
-    return [normalize_wbtc_tx(tx) for tx in raw_txs]
+    alerter = get_whale_alerter()
+    if alerter is not None and already_alerted is not None:
+        alerter = skip_realerts(alerter, already_alerted)
+    return lambda batch: save_transfers_batch(batch, on_whales=alerter)
+
+
+def log_fetch_stats(logger) -> None:
+    logger.info(LATENCY.summary())
+    cache = get_response_cache()
+    if cache is not None:
+        logger.info(cache.summary())
+
+
+def log_alert_stats(logger) -> None:
+    alerter = get_whale_alerter()
+    if alerter is not None:
+        logger.info(alerter.stats.summary())
 
 
 @task(name="load_wbtc_records")
@@ -40,45 +96,207 @@ def load_wbtc_records(records: List[Dict], batch_size: int = DEFAULT_BATCH_SIZE)
     Load: батчево сохраняет нормализованные транзакции в raw.wbtc_transfers.
     """
     logger = get_run_logger()
+    save = batch_saver()
     saved_total = 0
     buffer: List[Dict] = []
 
     for rec in records:
         buffer.append(rec)
         if len(buffer) >= batch_size:
-            inserted = save_transfers_batch(buffer)
+            inserted = save(buffer)
             saved_total += inserted
             logger.info(f"Сохранил пачку: {inserted} записей (итого {saved_total})")
             buffer.clear()
 
     if buffer:
-        inserted = save_transfers_batch(buffer)
+        inserted = save(buffer)
         saved_total += inserted
         logger.info(f"Сохранил финальную пачку: {inserted} записей (итого {saved_total})")
         buffer.clear()
 
+    log_alert_stats(logger)
+    return saved_total
+
+
+@task(name="ingest_wbtc_streaming")
+def ingest_wbtc_streaming(
+    max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+    start_block: int = 0,
+    sort: str = SORT_ORDER,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_queued_batches: int = DEFAULT_MAX_QUEUED_BATCHES,
+) -> int:
+    """
+    Extract → Transform → Load одним потоковым конвейером: fetch, нормализация и
+    запись идут в отдельных потоках через ограниченные очереди. Память ограничена
+    размером пачки, вставки в БД перекрываются с сетевыми запросами.
+    """
+    logger = get_run_logger()
+
+    def log_batch(stats: PipelineStats) -> None:
+        logger.info(
+            f"Пачка #{stats.batches}: сохранено итого {stats.saved} "
+            f"(скачано {stats.fetched}, нормализовано {stats.transformed})"
+        )
+
+    stats = stream_batches(
+        fetch_wbtc_all(max_pages=max_pages, start_block=start_block, sort=sort),
+        transform=None,
+        transform_batch=normalize_records,
+        sink=batch_saver(),
+        batch_size=batch_size,
+        max_queued_batches=max_queued_batches,
+        on_batch=log_batch,
+    )
+    log_fetch_stats(logger)
+    log_alert_stats(logger)
+    return stats.saved
+
+
+@task(name="resolve_tail_start_block")
+def resolve_tail_start_block() -> Optional[int]:
+    """
+    Блок, с которого инкрементальный режим докачивает хвост:
+    MAX(block_number) из raw.wbtc_transfers минус REORG_SAFETY_BLOCKS.
+    None — таблица пуста, хвоста нет.
+    """
+    max_block = get_max_block_number()
+    if max_block is None:
+        return None
+    return max(0, max_block - reorg_safety_blocks())
+
+
+def _checkpoint_done_above(lowest_block: Optional[int], range_start: int, range_end: int, rows: int) -> None:
+    # при выгрузке сверху вниз всё, что выше lowest_block, уже сохранено
+    if lowest_block is not None and lowest_block < range_end:
+        save_checkpoint(max(range_start, lowest_block + 1), range_end, rows)
+
+
+@task(name="ingest_wbtc_resumable")
+def ingest_wbtc_resumable(
+    max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Extract → Transform → Load по чекпоинтам raw.ingestion_checkpoints:
+    качает только ещё не закоммиченные диапазоны блоков (от головы вниз) и после
+    каждой сохранённой пачки продвигает чекпоинт. После падения следующий запуск
+    продолжает с места остановки, не тратя квоту API на уже загруженные блоки.
+    """
+    logger = get_run_logger()
+
+    pool = KeyPool(load_api_keys())
+    head = fetch_latest_block(pool.acquire())
+    safety = reorg_safety_blocks()
+    ranges = resumable_ranges(head, load_done_ranges(), safety)
+    logger.info(
+        f"Чекпоинты: осталось {len(ranges)} диапазонов до блока {head - safety} "
+        f"(голова {head} минус REORG_SAFETY_BLOCKS={safety})"
+    )
+
+    save = batch_saver()
+    saved_total = 0
+    pages_left = max_pages
+
+    for range_start, range_end in ranges:
+        if pages_left is not None and pages_left <= 0:
+            break
+
+        progress = FetchProgress()
+        saved_range = 0
+        buffer: List[Dict] = []
+
+        for raw in fetch_wbtc_all(
+            max_pages=pages_left,
+            start_block=range_start,
+            end_block=range_end,
+            key_pool=pool,
+            progress=progress,
+        ):
+            buffer.append(raw)
+            if len(buffer) >= batch_size:
+                saved_range += save(normalize_records(buffer))
+                buffer.clear()
+                _checkpoint_done_above(progress.lowest_block, range_start, range_end, saved_range)
+
+        if buffer:
+            saved_range += save(normalize_records(buffer))
+            buffer.clear()
+
+        if progress.completed:
+            save_checkpoint(range_start, range_end, saved_range)
+        else:
+            _checkpoint_done_above(progress.lowest_block, range_start, range_end, saved_range)
+
+        saved_total += saved_range
+        logger.info(
+            f"Диапазон {range_start}..{range_end}: сохранено {saved_range} "
+            f"({'готов' if progress.completed else 'частично'}), итого {saved_total}"
+        )
+
+        if pages_left is not None:
+            pages_left -= progress.requests
+        if not progress.completed:
+            # упёрлись в лимит страниц или ключи — продолжим в следующий запуск
+            break
+
+    log_fetch_stats(logger)
+    log_alert_stats(logger)
     return saved_total
 
 
 @flow(name="wbtc_whale_ingestion_flow")
-def wbtc_whale_ingestion_flow(max_pages: Optional[int] = DEFAULT_MAX_PAGES) -> int:
+def wbtc_whale_ingestion_flow(
+    max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+    resume: bool = False,
+    incremental: bool = False,
+    streaming: bool = False,
+) -> int:
     """
     Flow: подтягивает новые транзакции WBTC и складывает в raw.wbtc_transfers.
 
     Args:
         max_pages: ограничение на количество страниц Etherscan (None — без лимита).
+        resume: качать по чекпоинтам, пропуская уже загруженные диапазоны блоков.
+        incremental: качать только блоки новее уже сохранённых (по возрастанию,
+            с запасом REORG_SAFETY_BLOCKS на реорги).
+        streaming: fetch/нормализация/запись конвейером с ограниченными очередями
+            вместо полных списков между задачами.
 
     Returns:
         Количество сохранённых транзакций.
     """
     load_project_dotenv()
+    start_metrics_server()
 
     logger = get_run_logger()
-    logger.info(f"Старт wbtc_whale_ingestion_flow (max_pages={max_pages})")
+    logger.info(
+        f"Старт wbtc_whale_ingestion_flow "
+        f"(max_pages={max_pages}, resume={resume}, incremental={incremental}, streaming={streaming})"
+    )
+    if resume and incremental:
+        raise ValueError("resume и incremental взаимоисключающие")
 
-    raw_txs = extract_wbtc_raw(max_pages=max_pages)
-    normalized = transform_wbtc_records(raw_txs)
-    saved = load_wbtc_records(normalized)
+    tail_start = resolve_tail_start_block() if incremental else None
+    if incremental and tail_start is None:
+        logger.info("raw.wbtc_transfers пуста — инкрементальный режим недоступен, качаю от головы")
+
+    start_block, sort = 0, SORT_ORDER
+    if tail_start is not None:
+        logger.info(f"Инкрементальный режим: блоки {tail_start}..{END_BLOCK} по возрастанию")
+        start_block, sort = tail_start, "asc"
+
+    with profiled_run("wbtc_whale_ingestion_flow", logger), tracked_run("wbtc_whale_ingestion_flow", logger):
+        if resume:
+            saved = ingest_wbtc_resumable(max_pages=max_pages)
+        elif streaming:
+            saved = ingest_wbtc_streaming(max_pages=max_pages, start_block=start_block, sort=sort)
+        else:
+            raw_txs = extract_wbtc_raw(max_pages=max_pages, start_block=start_block, sort=sort)
+            normalized = transform_wbtc_records(raw_txs)
+            # transform уже опустошил список — убираем и саму ссылку
+            del raw_txs
+            saved = load_wbtc_records(normalized)
 
     logger.info(f"wbtc_whale_ingestion_flow завершён. Сохранено транзакций: {saved}")
     return saved
@@ -99,8 +317,36 @@ if __name__ == "__main__":
         action="store_true",
         help="Не ограничивать число страниц (эквивалент max_pages=None)",
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить с чекпоинтов raw.ingestion_checkpoints, пропуская загруженные блоки",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Качать только блоки новее MAX(block_number) в БД (минус REORG_SAFETY_BLOCKS)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Потоковый режим: fetch/нормализация/запись параллельно через ограниченные очереди",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILE_MODES),
+        default=None,
+        help="Профилирование: timers, cprofile или sample (по умолчанию WBTC_PROFILE)",
+    )
 
     args = parser.parse_args()
     max_pages_arg = None if args.no_limit else args.max_pages
+    if args.profile:
+        os.environ["WBTC_PROFILE"] = args.profile
 
-    wbtc_whale_ingestion_flow(max_pages=max_pages_arg)
+    wbtc_whale_ingestion_flow(
+        max_pages=max_pages_arg,
+        resume=args.resume,
+        incremental=args.incremental,
+        streaming=args.streaming,
+    )
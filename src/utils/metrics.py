@@ -0,0 +1,398 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.utils.profiling import profile_stage
+
+# имя сэмпла + отсортированные пары меток — ключ снимка
+SampleKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_sample(name: str, labels: Tuple[Tuple[str, str], ...], value: float) -> str:
+    label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    number = repr(float(value)) if value != int(value) else str(int(value))
+    return f"{name}{{{label_text}}} {number}" if label_text else f"{name} {number}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _pairs(self, key: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labels, key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        with self._lock:
+            return [(self.name, self._pairs(key), float(value)) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_max(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if value > self._values.get(key, float("-inf")):
+                self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = state[0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            counts[i] += 1
+            state[1] += value
+
+    def samples(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        out = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                pairs = self._pairs(key)
+                running = 0
+                for bound, count in zip((*self.buckets, float("inf")), counts):
+                    running += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append((f"{self.name}_bucket", (*pairs, ("le", le)), float(running)))
+                out.append((f"{self.name}_sum", pairs, float(total)))
+                out.append((f"{self.name}_count", pairs, float(running)))
+        return out
+
+
+class MetricsRegistry:
+    """
+    Процессный набор метрик (счётчики, gauge, гистограммы с метками) с выдачей
+    в текстовом формате Prometheus и снимками для подсчёта дельт за запуск.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_format_sample(*sample) for sample in metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[SampleKey, float]:
+        """
+        Значения счётчиков и гистограмм (gauge не входят — у них нет дельты).
+        """
+        return {
+            (name, labels): value
+            for metric in self._metrics
+            if metric.kind != "gauge"
+            for name, labels, value in metric.samples()
+        }
+
+    def reset(self) -> None:
+        for metric in self._metrics:
+            metric.clear()
+
+
+METRICS = MetricsRegistry()
+
+# fetch
+API_REQUESTS = METRICS.counter(
+    "wbtc_etherscan_requests_total",
+    "Запросы к Etherscan по ключу и исходу (ok, window, rate_limit, invalid_key, transient, error)",
+    ("key", "outcome"),
+)
+PAGE_SECONDS = METRICS.histogram("wbtc_etherscan_page_seconds", "Время получения страницы tokentx из API", ("key",))
+CACHE_PAGES = METRICS.counter("wbtc_etherscan_cache_pages_total", "Страницы из кэша ответов / промахи", ("result",))
+# все стадии
+ROWS = METRICS.counter(
+    "wbtc_rows_total",
+    "Строки по стадиям: fetched, normalized, inserted, conflicts (уже были в БД), analytics",
+    ("stage",),
+)
+STAGE_SECONDS = METRICS.counter("wbtc_stage_seconds_total", "Время работы стадии (normalize, load, analytics)", ("stage",))
+BATCH_SECONDS = METRICS.histogram("wbtc_batch_seconds", "Время обработки одной пачки стадией", ("stage",))
+QUEUE_DEPTH = METRICS.gauge("wbtc_queue_depth", "Текущая длина очереди между стадиями (в пачках / элементах)", ("queue",))
+QUEUE_DEPTH_MAX = METRICS.gauge("wbtc_queue_depth_max", "Максимальная длина очереди с начала запуска", ("queue",))
+
+
+def key_label(key: Optional[str]) -> str:
+    # сам ключ в метки не попадает — только хвост для различения
+    return f"***{key[-4:]}" if key else "none"
+
+
+def observe_queue(name: str, depth: int) -> None:
+    QUEUE_DEPTH.set(depth, queue=name)
+    QUEUE_DEPTH_MAX.set_max(depth, queue=name)
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """
+    Замер одной пачки стадии: накапливает wbtc_stage_seconds_total и
+    гистограмму wbtc_batch_seconds (строки стадия считает сама через ROWS).
+    При включённом WBTC_PROFILE пачка — ещё и стадия профиля (src/utils/profiling.py).
+    """
+    started = time.perf_counter()
+    try:
+        with profile_stage(stage):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.inc(elapsed, stage=stage)
+        BATCH_SECONDS.observe(elapsed, stage=stage)
+
+
+def _total(delta: Dict[SampleKey, float], name: str, **match: str) -> float:
+    wanted = set(match.items())
+    return sum(value for (sample, labels), value in delta.items() if sample == name and wanted <= set(labels))
+
+
+def _by_label(delta: Dict[SampleKey, float], name: str, label: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for (sample, labels), value in delta.items():
+        if sample == name and value:
+            key = dict(labels).get(label, "")
+            out[key] = out.get(key, 0) + value
+    return out
+
+
+def histogram_quantile(delta: Dict[SampleKey, float], name: str, q: float) -> Optional[float]:
+    """
+    Оценка квантиля по кумулятивным корзинам (верхняя граница корзины, как
+    histogram_quantile в Prometheus без интерполяции). None — наблюдений не было.
+    """
+    buckets: Dict[float, float] = {}
+    for (sample, labels), value in delta.items():
+        if sample == f"{name}_bucket":
+            le = dict(labels)["le"]
+            bound = float("inf") if le == "+Inf" else float(le)
+            buckets[bound] = buckets.get(bound, 0) + value
+    total = buckets.get(float("inf"), 0)
+    if not total:
+        return None
+    for bound in sorted(buckets):
+        if buckets[bound] >= q * total:
+            return bound
+    return None
+
+
+def _rate(rows: float, seconds: float) -> Optional[float]:
+    return round(rows / seconds, 2) if seconds > 0 else None
+
+
+@dataclass
+class RunReport:
+    started_at: datetime
+    finished_at: datetime
+    rows_fetched: int = 0
+    rows_normalized: int = 0
+    rows_inserted: int = 0
+    rows_conflicted: int = 0
+    rows_analytics: int = 0
+    api_requests: int = 0
+    api_errors: int = 0
+    fetch_rows_per_sec: Optional[float] = None
+    normalize_rows_per_sec: Optional[float] = None
+    insert_rows_per_sec: Optional[float] = None
+    page_p50_ms: Optional[float] = None
+    page_p95_ms: Optional[float] = None
+    details: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        return (
+            f"Метрики запуска: скачано {self.rows_fetched} ({self.fetch_rows_per_sec or 0}/s), "
+            f"нормализовано {self.rows_normalized} ({self.normalize_rows_per_sec or 0}/s), "
+            f"вставлено {self.rows_inserted}, конфликтов {self.rows_conflicted} "
+            f"({self.insert_rows_per_sec or 0}/s), запросов API {self.api_requests}, ошибок {self.api_errors}, "
+            f"страница p50/p95 {self.page_p50_ms}/{self.page_p95_ms} ms"
+        )
+
+
+class RunMetrics:
+    """
+    Дельта метрик процесса за один запуск flow: снимок в начале, отчёт в конце.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        QUEUE_DEPTH_MAX.clear()
+        self._baseline = METRICS.snapshot()
+
+    def finish(self) -> RunReport:
+        current = METRICS.snapshot()
+        delta = {key: value - self._baseline.get(key, 0) for key, value in current.items()}
+        elapsed = time.perf_counter() - self._started
+
+        requests = _total(delta, API_REQUESTS.name)
+        errors = requests - _total(delta, API_REQUESTS.name, outcome="ok") - _total(delta, API_REQUESTS.name, outcome="window")
+        fetched = _total(delta, ROWS.name, stage="fetched")
+        normalized = _total(delta, ROWS.name, stage="normalized")
+        inserted = _total(delta, ROWS.name, stage="inserted")
+        conflicts = _total(delta, ROWS.name, stage="conflicts")
+        p50 = histogram_quantile(delta, PAGE_SECONDS.name, 0.5)
+        p95 = histogram_quantile(delta, PAGE_SECONDS.name, 0.95)
+
+        requests_by_key = _by_label(delta, API_REQUESTS.name, "key")
+        return RunReport(
+            started_at=self.started_at,
+            finished_at=datetime.now(timezone.utc),
+            rows_fetched=int(fetched),
+            rows_normalized=int(normalized),
+            rows_inserted=int(inserted),
+            rows_conflicted=int(conflicts),
+            rows_analytics=int(_total(delta, ROWS.name, stage="analytics")),
+            api_requests=int(requests),
+            api_errors=int(errors),
+            fetch_rows_per_sec=_rate(fetched, elapsed),
+            normalize_rows_per_sec=_rate(normalized, _total(delta, STAGE_SECONDS.name, stage="normalize")),
+            insert_rows_per_sec=_rate(inserted + conflicts, _total(delta, STAGE_SECONDS.name, stage="load")),
+            page_p50_ms=None if p50 is None or p50 == float("inf") else p50 * 1000,
+            page_p95_ms=None if p95 is None or p95 == float("inf") else p95 * 1000,
+            details={
+                "requests_by_outcome": _by_label(delta, API_REQUESTS.name, "outcome"),
+                "requests_per_sec_by_key": {k: round(v / elapsed, 3) for k, v in requests_by_key.items()} if elapsed > 0 else {},
+                "cache_pages": _by_label(delta, CACHE_PAGES.name, "result"),
+                "stage_seconds": {k: round(v, 3) for k, v in _by_label(delta, STAGE_SECONDS.name, "stage").items()},
+                "max_queue_depth": {dict(labels)["queue"]: value for _, labels, value in QUEUE_DEPTH_MAX.samples()},
+            },
+        )
+
+
+def write_textfile(path: Optional[str] = None) -> Optional[Path]:
+    """
+    Пишет METRICS в файл (формат textfile collector node_exporter), атомарно.
+    ENV METRICS_TEXTFILE — путь; пусто — ничего не пишется.
+    """
+    path = path or os.getenv("METRICS_TEXTFILE", "").strip()
+    if not path:
+        return None
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    tmp.write_text(METRICS.render(), encoding="utf-8")
+    os.replace(tmp, target)
+    return target
+
+
+_server_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def metrics_host() -> str:
+    """
+    Адрес, на котором слушает /metrics. ENV METRICS_HOST=127.0.0.1 по умолчанию:
+    метки содержат хвосты API-ключей, наружу эндпоинт открывается явно
+    (например, METRICS_HOST=0.0.0.0 в контейнере рядом с Prometheus).
+    """
+    return os.getenv("METRICS_HOST", "").strip() or DEFAULT_METRICS_HOST
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    HTTP-эндпоинт /metrics для Prometheus в фоновом потоке (один на процесс).
+    ENV METRICS_PORT — порт; пусто — сервер не поднимается. host=None — metrics_host().
+    """
+    global _server
+    host = host or metrics_host()
+    if port is None:
+        raw = os.getenv("METRICS_PORT", "").strip()
+        if not raw:
+            return None
+        port = int(raw)
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -0,0 +1,134 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+from src.utils.metrics import observe_queue
+
+DEFAULT_MAX_QUEUED_BATCHES = 4
+
+_DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    fetched: int = 0
+    transformed: int = 0
+    saved: int = 0
+    batches: int = 0
+
+
+class _Stopped(Exception):
+    """Пайплайн остановлен из-за ошибки в другой стадии."""
+
+
+def stream_batches(
+    source: Iterable[Any],
+    transform: Optional[Callable[[Any], Any]],
+    sink: Callable[[List[Any]], int],
+    batch_size: int,
+    max_queued_batches: int = DEFAULT_MAX_QUEUED_BATCHES,
+    on_batch: Optional[Callable[[PipelineStats], None]] = None,
+    transform_batch: Optional[Callable[[List[Any]], List[Any]]] = None,
+) -> PipelineStats:
+    """
+    Потоковый конвейер source → transform → sink, каждая стадия в своём потоке:
+    - source отдаёт элементы по одному, они режутся на пачки по batch_size;
+    - transform применяется к каждому элементу пачки (или transform_batch —
+      сразу ко всей пачке, если задан);
+    - sink сохраняет пачку и возвращает число записанных строк.
+    Между стадиями — очереди не длиннее max_queued_batches пачек, поэтому
+    в памяти одновременно не больше ~(2 * max_queued_batches + 3) * batch_size
+    элементов, а запись в БД идёт параллельно с сетевыми запросами.
+    Ошибка любой стадии останавливает остальные и пробрасывается наружу.
+    Длины очередей (pipeline_raw, pipeline_out) видны в метрике wbtc_queue_depth.
+    """
+    stats = PipelineStats()
+    raw_q: "queue.Queue[Any]" = queue.Queue(maxsize=max_queued_batches)
+    out_q: "queue.Queue[Any]" = queue.Queue(maxsize=max_queued_batches)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(q: "queue.Queue[Any]", name: str, item: Any) -> None:
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                q.put(item, timeout=0.2)
+                observe_queue(name, q.qsize())
+                return
+            except queue.Full:
+                continue
+
+    def get(q: "queue.Queue[Any]", name: str) -> Any:
+        while True:
+            if stop.is_set():
+                raise _Stopped()
+            try:
+                item = q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            observe_queue(name, q.qsize())
+            return item
+
+    def run_stage(body: Callable[[], None]) -> Callable[[], None]:
+        def runner() -> None:
+            try:
+                body()
+            except _Stopped:
+                pass
+            except BaseException as e:
+                # ошибку пробрасываем в вызывающий поток после join
+                errors.append(e)
+                stop.set()
+
+        return runner
+
+    def fetch_stage() -> None:
+        batch: List[Any] = []
+        for item in source:
+            batch.append(item)
+            stats.fetched += 1
+            if len(batch) >= batch_size:
+                put(raw_q, "pipeline_raw", batch)
+                batch = []
+        if batch:
+            put(raw_q, "pipeline_raw", batch)
+        put(raw_q, "pipeline_raw", _DONE)
+
+    def transform_stage() -> None:
+        while True:
+            batch = get(raw_q, "pipeline_raw")
+            if batch is _DONE:
+                put(out_q, "pipeline_out", _DONE)
+                return
+            if transform_batch is not None:
+                transformed = transform_batch(batch)
+            else:
+                transformed = [transform(item) for item in batch]
+            stats.transformed += len(transformed)
+            put(out_q, "pipeline_out", transformed)
+
+    def load_stage() -> None:
+        while True:
+            batch = get(out_q, "pipeline_out")
+            if batch is _DONE:
+                return
+            stats.saved += sink(batch)
+            stats.batches += 1
+            if on_batch is not None:
+                on_batch(stats)
+
+    threads = [
+        threading.Thread(target=run_stage(fetch_stage), name="pipeline-fetch", daemon=True),
+        threading.Thread(target=run_stage(transform_stage), name="pipeline-transform", daemon=True),
+        threading.Thread(target=run_stage(load_stage), name="pipeline-load", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,386 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+PROFILE_OFF = "off"
+PROFILE_TIMERS = "timers"
+PROFILE_CPROFILE = "cprofile"
+PROFILE_SAMPLE = "sample"
+PROFILE_MODES = (PROFILE_OFF, PROFILE_TIMERS, PROFILE_CPROFILE, PROFILE_SAMPLE)
+
+DEFAULT_PROFILE_DIR = PROJECT_ROOT / "data" / "profiles"
+DEFAULT_SAMPLE_INTERVAL_MS = 5.0
+TOP_FUNCTIONS = 15
+
+_NO_STAGE = nullcontext()
+
+
+def profile_mode() -> str:
+    """
+    ENV WBTC_PROFILE: off (default); timers — только время стадий;
+    cprofile — плюс cProfile по стадиям (.prof); sample — плюс сэмплирующий
+    профилировщик по стекам потоков (.collapsed для flamegraph).
+    """
+    mode = os.getenv("WBTC_PROFILE", PROFILE_OFF).strip().lower() or PROFILE_OFF
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Неизвестный режим WBTC_PROFILE: {mode}")
+    return mode
+
+
+def profile_dir() -> Path:
+    return Path(os.getenv("WBTC_PROFILE_DIR", "").strip() or DEFAULT_PROFILE_DIR)
+
+
+def sample_interval() -> float:
+    """
+    Период сэмплирования в секундах. ENV WBTC_PROFILE_INTERVAL_MS=5 по умолчанию.
+    """
+    raw = os.getenv("WBTC_PROFILE_INTERVAL_MS", str(DEFAULT_SAMPLE_INTERVAL_MS))
+    try:
+        return max(0.5, float(raw)) / 1000
+    except ValueError:
+        return DEFAULT_SAMPLE_INTERVAL_MS / 1000
+
+
+def _file_name(stage: str) -> str:
+    return re.sub(r"[^\w.-]", "_", stage)
+
+
+_labels: Dict[object, str] = {}
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+    return label
+
+
+def collapse_stack(frame) -> str:
+    """
+    Стек кадра в формате collapsed (корень;...;лист) — вход flamegraph.pl,
+    speedscope и inferno.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class RunProfiler:
+    """
+    Профиль одного запуска: время и число вызовов по стадиям, а в режимах
+    cprofile/sample — профили стадий. Стадии вкладываются и открываются из
+    любых потоков; стек стадий ведётся на поток.
+
+    cprofile: у каждого вызова стадии свой cProfile.Profile, внешний на время
+    вложенной стадии приостанавливается — в <stage>.prof попадает код стадии
+    без вложенных. cProfile видит только свой поток; если интерпретатор не
+    даёт включить второй профилировщик (3.12+, стадия в другом потоке), вызов
+    остаётся только с таймером.
+
+    sample: фоновый поток раз в WBTC_PROFILE_INTERVAL_MS снимает стеки потоков
+    с открытыми стадиями (sys._current_frames); сэмпл идёт в файл каждой
+    открытой стадии потока — <stage>.collapsed, общий all.collapsed
+    начинается со стека стадий. Это wall-clock: ожидание сети и БД тоже видно.
+    """
+
+    def __init__(self, name: str, mode: str, base_dir: Optional[Path] = None, interval: Optional[float] = None) -> None:
+        self.name = name
+        self.mode = mode
+        started = datetime.now(timezone.utc)
+        self.started_at = started
+        self.run_dir = (base_dir or profile_dir()) / f"{started:%Y%m%dT%H%M%S}-{_file_name(name)}"
+        self.interval = interval if interval is not None else sample_interval()
+        self.seconds = 0.0
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # ident потока → его стек стадий (читает сэмплер)
+        self._stacks: Dict[int, List[str]] = {}
+        # стадия → [вызовов, всего секунд, максимум]
+        self._timings: Dict[str, List[float]] = {}
+        self._unprofiled: Counter = Counter()
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._samples: Dict[str, Counter] = {}
+        self._samples_all: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+            self._local.profiles = []
+            with self._lock:
+                self._stacks[threading.get_ident()] = stack
+        return stack
+
+    def start(self) -> "RunProfiler":
+        self._t0 = time.perf_counter()
+        if self.mode == PROFILE_SAMPLE:
+            self._sampler = threading.Thread(target=self._sample_loop, name="wbtc-profiler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        self.seconds = time.perf_counter() - self._t0
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def _enable(self, profiles: List[Optional[cProfile.Profile]]) -> Optional[cProfile.Profile]:
+        outer = next((p for p in reversed(profiles) if p is not None), None)
+        if outer is not None:
+            outer.disable()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # профилировщик уже включён в другом потоке (3.12+)
+            if outer is not None:
+                outer.enable()
+            return None
+        return profile
+
+    def _disable(self, stage: str, profile: cProfile.Profile, profiles: List[Optional[cProfile.Profile]]) -> None:
+        profile.disable()
+        with self._lock:
+            if stage in self._stats:
+                self._stats[stage].add(profile)
+            else:
+                self._stats[stage] = pstats.Stats(profile)
+        outer = next((p for p in reversed(profiles) if p is not None), None)
+        if outer is not None:
+            outer.enable()
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        stack = self._stack()
+        profiles = self._local.profiles
+        profile = self._enable(profiles) if self.mode == PROFILE_CPROFILE else None
+        stack.append(stage)
+        profiles.append(profile)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            profiles.pop()
+            if profile is not None:
+                self._disable(stage, profile, profiles)
+            with self._lock:
+                timing = self._timings.setdefault(stage, [0, 0.0, 0.0])
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+                if self.mode == PROFILE_CPROFILE and profile is None:
+                    self._unprofiled[stage] += 1
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                stacks = [(ident, tuple(stack)) for ident, stack in self._stacks.items() if stack and ident != own]
+            for ident, stages in stacks:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                collapsed = collapse_stack(frame)
+                with self._lock:
+                    for stage in set(stages):
+                        self._samples.setdefault(stage, Counter())[collapsed] += 1
+                    self._samples_all[";".join(f"[{s}]" for s in stages) + ";" + collapsed] += 1
+            del frames
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            items = sorted(self._timings.items(), key=lambda kv: -kv[1][1])
+        return {
+            stage: {
+                "calls": int(calls),
+                "total_s": round(total, 4),
+                "avg_ms": round(total / calls * 1000, 3) if calls else 0.0,
+                "max_ms": round(longest * 1000, 3),
+                "share": round(total / self.seconds, 4) if self.seconds > 0 else None,
+            }
+            for stage, (calls, total, longest) in items
+        }
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> List[Tuple[str, float]]:
+        """
+        Самые дорогие функции запуска: собственное время по cProfile (секунды)
+        или число сэмплов на вершине стека.
+        """
+        if self.mode == PROFILE_CPROFILE:
+            own: Counter = Counter()
+            for stats in self._stats.values():
+                for (filename, line, func), (_, _, tottime, _, _) in stats.stats.items():  # type: ignore[attr-defined]
+                    own[f"{func} ({Path(filename).name}:{line})"] += tottime
+            return [(name, round(value, 4)) for name, value in own.most_common(limit)]
+        if self.mode == PROFILE_SAMPLE:
+            leaves: Counter = Counter()
+            for stack, count in self._samples_all.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            return leaves.most_common(limit)
+        return []
+
+    def summary_markdown(self) -> str:
+        lines = [
+            f"### Профиль {self.name} ({self.mode})",
+            "",
+            f"Запуск {self.started_at:%Y-%m-%d %H:%M:%S} UTC, {self.seconds:.2f}s, файлы: `{self.run_dir}`",
+            "",
+            "| Стадия | Вызовов | Всего, s | Среднее, ms | Макс, ms | Доля |",
+            "|---|---:|---:|---:|---:|---:|",
+        ]
+        for stage, t in self.timings().items():
+            share = f"{t['share']:.1%}" if t["share"] is not None else "—"
+            lines.append(f"| {stage} | {t['calls']} | {t['total_s']:.3f} | {t['avg_ms']:.2f} | {t['max_ms']:.2f} | {share} |")
+        top = self.top_functions()
+        if top:
+            unit = "собственное время, s" if self.mode == PROFILE_CPROFILE else "сэмплов"
+            lines += ["", f"Горячие функции ({unit}):", ""]
+            lines += [f"- `{name}` — {value}" for name, value in top]
+        if self._unprofiled:
+            skipped = ", ".join(f"{stage} ×{n}" for stage, n in sorted(self._unprofiled.items()))
+            lines += ["", f"Без cProfile (занят другим потоком): {skipped}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> Path:
+        """
+        Пишет каталог запуска: timings.json, summary.md и профили стадий
+        (<stage>.prof + <stage>.txt для cprofile, <stage>.collapsed и
+        all.collapsed для sample).
+        """
+        run_dir = self.run_dir
+        run_dir.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "run": self.name,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(self.seconds, 4),
+            "stages": self.timings(),
+        }
+        (run_dir / "timings.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        (run_dir / "summary.md").write_text(self.summary_markdown(), encoding="utf-8")
+
+        for stage, stats in self._stats.items():
+            stats.dump_stats(str(run_dir / f"{_file_name(stage)}.prof"))
+            out = io.StringIO()
+            stats.stream = out  # type: ignore[attr-defined]
+            stats.sort_stats("cumulative").print_stats(40)
+            (run_dir / f"{_file_name(stage)}.txt").write_text(out.getvalue(), encoding="utf-8")
+
+        def write_collapsed(path: Path, samples: Counter) -> None:
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+
+        for stage, samples in self._samples.items():
+            write_collapsed(run_dir / f"{_file_name(stage)}.collapsed", samples)
+        if self._samples_all:
+            write_collapsed(run_dir / "all.collapsed", self._samples_all)
+        return run_dir
+
+
+_active: Optional[RunProfiler] = None
+
+
+def active_profiler() -> Optional[RunProfiler]:
+    return _active
+
+
+def profile_stage(stage: str):
+    """
+    Стадия активного профиля; без профиля — пустой контекст (цена — одна проверка).
+    """
+    profiler = _active
+    return profiler.stage(stage) if profiler is not None else _NO_STAGE
+
+
+def profile_artifact_path(filename: str) -> Optional[Path]:
+    """
+    Путь для стороннего отчёта (например, performance_report Dask) в каталоге
+    активного профиля, None — профилирование выключено.
+    """
+    profiler = _active
+    if profiler is None:
+        return None
+    profiler.run_dir.mkdir(parents=True, exist_ok=True)
+    return profiler.run_dir / filename
+
+
+def publish_prefect_artifact(profiler: RunProfiler) -> bool:
+    """
+    Сводка профиля как markdown-артефакт текущего запуска Prefect.
+    Вне flow/task (CLI без Prefect) ничего не делает.
+    """
+    try:
+        from prefect.artifacts import create_markdown_artifact
+        from prefect.context import FlowRunContext, TaskRunContext
+    except ImportError:
+        return False
+    if FlowRunContext.get() is None and TaskRunContext.get() is None:
+        return False
+    create_markdown_artifact(
+        markdown=profiler.summary_markdown(),
+        key=re.sub(r"[^a-z0-9-]", "-", f"profile-{profiler.name}".lower()),
+        description=f"Профиль {profiler.name} ({profiler.mode})",
+    )
+    return True
+
+
+@contextmanager
+def profiled_run(name: str, logger=None, mode: Optional[str] = None) -> Iterator[Optional[RunProfiler]]:
+    """
+    Оборачивает запуск flow или CLI. Если профиль уже идёт (подflow внутри
+    сквозного ETL), запуск становится его стадией. Иначе при WBTC_PROFILE
+    не off создаёт каталог WBTC_PROFILE_DIR/<время>-<name>, по завершении
+    пишет туда профили, логирует сводку и прикладывает её к запуску Prefect.
+    Сбой записи профиля не роняет сам запуск.
+    """
+    global _active
+    if _active is not None:
+        with _active.stage(name):
+            yield _active
+        return
+
+    mode = mode or profile_mode()
+    if mode == PROFILE_OFF:
+        yield None
+        return
+
+    profiler = RunProfiler(name, mode).start()
+    _active = profiler
+    try:
+        with profiler.stage(name):
+            yield profiler
+    finally:
+        _active = None
+        profiler.stop()
+        log = logger.info if logger is not None else print
+        try:
+            run_dir = profiler.write()
+            log(profiler.summary_markdown())
+            log(f"Профиль {name} записан в {run_dir}")
+            publish_prefect_artifact(profiler)
+        except Exception as e:
+            log(f"⚠️ Не удалось записать профиль {name}: {e}")
@@ -0,0 +1,22 @@
+import importlib
+import sys
+import types
+
+
+def _stub_module(name: str, **attrs) -> None:
+    # подменяем только отсутствующие в окружении пакеты: с установленным
+    # psycopg2/dotenv/requests тесты идут на настоящих модулях
+    if name in sys.modules:
+        return
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        sys.modules[name] = types.SimpleNamespace(**attrs)  # type: ignore
+
+
+_stub_module("psycopg2", connect=lambda *args, **kwargs: None)
+_stub_module("psycopg2.extensions", connection=object, TRANSACTION_STATUS_IDLE=0)
+_stub_module("psycopg2.pool", ThreadedConnectionPool=object)
+_stub_module("psycopg2.extras", execute_values=lambda *args, **kwargs: None)
+_stub_module("dotenv", load_dotenv=lambda *args, **kwargs: None)
+_stub_module("requests", get=lambda *args, **kwargs: None)
@@ -0,0 +1,38 @@
+import unittest
+
+from src.db.checkpoints import merge_ranges, pending_ranges, resumable_ranges
+
+
+class CheckpointRangesTests(unittest.TestCase):
+    def test_merge_ranges_joins_adjacent_and_overlapping(self) -> None:
+        self.assertEqual(merge_ranges([(10, 19), (0, 9), (15, 30), (40, 50)]), [(0, 30), (40, 50)])
+
+    def test_pending_ranges_are_aligned_and_descending(self) -> None:
+        self.assertEqual(
+            pending_ranges(0, 250, [], span=100),
+            [(200, 250), (100, 199), (0, 99)],
+        )
+
+    def test_pending_ranges_skip_done_blocks(self) -> None:
+        # [150, 250] уже загружен целиком, кусок [100, 149] прервался на блоке 120
+        done = [(150, 250), (121, 149)]
+
+        self.assertEqual(
+            pending_ranges(0, 300, done, span=100),
+            [(300, 300), (251, 299), (100, 120), (0, 99)],
+        )
+
+    def test_nothing_pending_when_everything_is_done(self) -> None:
+        self.assertEqual(pending_ranges(0, 99, [(0, 120)], span=100), [])
+
+    def test_resumable_ranges_stop_below_head(self) -> None:
+        # блоки у головы не отмечаются готовыми: Etherscan мог их ещё не проиндексировать
+        ranges = resumable_ranges(1_000, [], safety_blocks=12, span=100)
+
+        self.assertEqual(ranges[0], (900, 988))
+        self.assertEqual(ranges[-1], (0, 99))
+        self.assertEqual(resumable_ranges(5, [], safety_blocks=12), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from src.analytics import daily_stats_store
+from src.analytics.daily_stats_store import fetch_top_senders, touched_dates, upsert_daily_stats
+
+
+class FakeCursor:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        return self.rows
+
+
+class DailyStatsStoreTests(unittest.TestCase):
+    def test_touched_dates_returns_days_and_max_id(self) -> None:
+        cur = FakeCursor([(date(2024, 1, 1), 17), (date(2024, 1, 2), 42)])
+
+        dates, max_id = touched_dates(cur, 10)
+
+        self.assertEqual(dates, [date(2024, 1, 1), date(2024, 1, 2)])
+        self.assertEqual(max_id, 42)
+        self.assertEqual(cur.executed[0][1], (10,))
+
+    def test_touched_dates_keeps_watermark_without_new_rows(self) -> None:
+        self.assertEqual(touched_dates(FakeCursor(), 10), ([], 10))
+
+    def test_upsert_updates_rows_and_drops_emptied_days(self) -> None:
+        cur = FakeCursor()
+        rows = [(date(2024, 1, 1), 3, 10, 1, 6, "0xabc")]
+        calls = []
+
+        with patch.object(daily_stats_store, "execute_values", lambda c, sql, values: calls.append((sql, values))):
+            written = upsert_daily_stats(cur, rows, [date(2024, 1, 1), date(2024, 1, 2)])
+
+        self.assertEqual(written, 1)
+        self.assertIn("ON CONFLICT (date) DO UPDATE", calls[0][0])
+        self.assertEqual(calls[0][1], rows)
+        self.assertEqual(cur.executed, [
+            ("DELETE FROM analytics.daily_stats WHERE date = ANY(%s);", ([date(2024, 1, 2)],)),
+        ])
+
+    def test_fetch_top_senders_groups_by_date(self) -> None:
+        cur = FakeCursor([
+            (date(2024, 1, 1), "0xa", 9),
+            (date(2024, 1, 1), "0xb", 4),
+            (date(2024, 1, 2), "0xc", 1),
+        ])
+
+        top = fetch_top_senders(cur, [date(2024, 1, 1), date(2024, 1, 2)], limit=2)
+
+        self.assertEqual(top, {
+            date(2024, 1, 1): [("0xa", 9), ("0xb", 4)],
+            date(2024, 1, 2): [("0xc", 1)],
+        })
+        self.assertIn("analytics.daily_sender_volume", cur.executed[0][0])
+        self.assertEqual(fetch_top_senders(FakeCursor(), []), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
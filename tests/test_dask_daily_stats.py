@@ -0,0 +1,129 @@
+import unittest
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+try:
+    import pandas as pd
+    from src.analytics import dask_daily_stats
+    from src.analytics.dask_daily_stats import _daily_partials, day_divisions
+    HAS_DASK = True
+except ImportError:
+    HAS_DASK = False
+
+
+def _ts(day: int, hour: int = 0, minute: int = 0) -> datetime:
+    return datetime(2024, 1, day, hour, minute, tzinfo=timezone.utc)
+
+
+@unittest.skipUnless(HAS_DASK, "нужны dask и pandas")
+class DayDivisionsTests(unittest.TestCase):
+    def test_inner_bounds_are_midnights(self) -> None:
+        bounds = day_divisions(date(2024, 1, 1), date(2024, 1, 6), npartitions=3)
+
+        self.assertEqual(bounds[:-1], [_ts(1), _ts(3), _ts(5)])
+        self.assertEqual(bounds, sorted(bounds))
+
+    def test_last_bound_stays_inside_last_day(self) -> None:
+        # read_sql_table включает последнюю границу: полночь следующего дня туда попасть не должна
+        bounds = day_divisions(date(2024, 1, 1), date(2024, 1, 2), npartitions=4)
+
+        self.assertEqual(bounds[0], _ts(1))
+        self.assertLess(bounds[-1], _ts(3))
+        self.assertGreaterEqual(bounds[-1], _ts(3) - timedelta(microseconds=1))
+
+    def test_single_day_and_more_partitions_than_days(self) -> None:
+        bounds = day_divisions(date(2024, 1, 5), date(2024, 1, 5), npartitions=8)
+
+        self.assertEqual(len(bounds), 2)
+        self.assertEqual(bounds[0], _ts(5))
+
+
+@unittest.skipUnless(HAS_DASK, "нужны dask и pandas")
+class DailyPartialsTests(unittest.TestCase):
+    @staticmethod
+    def _frame(rows):
+        return pd.DataFrame(rows, columns=["time_stamp", "tx_hash", "value_wbtc", "is_whale", "tx_fee_usd"])
+
+    def test_aggregates_per_utc_day_and_skips_empty_rows(self) -> None:
+        pdf = self._frame([
+            (_ts(1, 3), "0x1", Decimal("12"), True, Decimal("1.50")),
+            (_ts(1, 23, 59), "0x2", Decimal("0.5"), False, None),
+            (_ts(2, 0), "0x3", Decimal("7"), True, Decimal("2.00")),
+            (_ts(2, 1), "0x4", Decimal("0"), False, Decimal("9.99")),
+        ])
+
+        daily = _daily_partials(pdf).set_index("date")
+
+        self.assertEqual(list(daily.index), [date(2024, 1, 1), date(2024, 1, 2)])
+        self.assertEqual(daily.loc[date(2024, 1, 1), "tx_count"], 2)
+        self.assertEqual(daily.loc[date(2024, 1, 1), "total_volume_wbtc"], Decimal("12.5"))
+        self.assertEqual(daily.loc[date(2024, 1, 1), "whale_tx_count"], 1)
+        self.assertEqual(daily.loc[date(2024, 1, 1), "max_tx_volume"], Decimal("12"))
+        self.assertEqual(daily.loc[date(2024, 1, 1), "total_fee_usd"], Decimal("1.50"))
+        # строка с нулевым value_wbtc не считается
+        self.assertEqual(daily.loc[date(2024, 1, 2), "tx_count"], 1)
+
+    def test_rows_after_last_division_do_not_reach_aggregate(self) -> None:
+        # инкрементальный пересчёт дней [1, 2]: полночь 3-го — уже следующий день
+        bounds = day_divisions(date(2024, 1, 1), date(2024, 1, 2), npartitions=1)
+        pdf = self._frame([
+            (_ts(2, 12), "0x1", Decimal("1"), False, None),
+            (_ts(3, 0), "0x2", Decimal("50"), True, None),
+        ])
+        # условие последней партиции read_sql_table
+        read = pdf[(pdf["time_stamp"] >= bounds[0]) & (pdf["time_stamp"] <= bounds[-1])]
+
+        daily = _daily_partials(read)
+
+        self.assertEqual(list(daily["date"]), [date(2024, 1, 2)])
+
+
+@unittest.skipUnless(HAS_DASK, "нужны dask и pandas")
+class WatermarkRaceTests(unittest.TestCase):
+    def _rebuild(self, watermarks):
+        daily = pd.DataFrame({name: [None] for name in dask_daily_stats.DAILY_STATS_COLUMNS})
+        daily["date"] = [date(2024, 1, 2)]
+        upsert = MagicMock()
+        set_watermark = MagicMock()
+
+        @contextmanager
+        def connection():
+            conn = MagicMock()
+            conn.cursor.return_value.__enter__.return_value = MagicMock()
+            yield conn
+
+        with patch.object(dask_daily_stats, "pooled_connection", connection), \
+                patch.object(dask_daily_stats, "make_pg_url", return_value="postgresql://"), \
+                patch.object(dask_daily_stats, "get_watermark", side_effect=watermarks) as get_watermark, \
+                patch.object(dask_daily_stats, "touched_dates", return_value=([date(2024, 1, 2)], 20)), \
+                patch.object(dask_daily_stats, "_dask_client", return_value=None), \
+                patch.object(dask_daily_stats, "_read_transfers", return_value=object()), \
+                patch.object(dask_daily_stats, "_aggregate_daily", return_value=daily), \
+                patch.object(dask_daily_stats, "fetch_top_senders", return_value={}), \
+                patch.object(dask_daily_stats, "upsert_daily_stats", upsert), \
+                patch.object(dask_daily_stats, "set_watermark", set_watermark):
+            written = dask_daily_stats.rebuild_daily_stats_with_dask(incremental=True, source="db")
+        # перед записью водяной знак берётся под блокировку
+        self.assertEqual(get_watermark.call_args.kwargs, {"for_update": True})
+        return written, upsert, set_watermark
+
+    def test_result_is_dropped_when_watermark_moved(self) -> None:
+        # пока считал Dask, инкрементальный пересчёт продвинул знак 10 → 15
+        written, upsert, set_watermark = self._rebuild([10, 15])
+
+        self.assertEqual(written, 0)
+        upsert.assert_not_called()
+        set_watermark.assert_not_called()
+
+    def test_result_is_written_when_watermark_unchanged(self) -> None:
+        written, upsert, set_watermark = self._rebuild([10, 10])
+
+        self.assertEqual(written, 1)
+        upsert.assert_called_once()
+        self.assertEqual(set_watermark.call_args.args[1:], (dask_daily_stats.DAILY_STATS_WATERMARK, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
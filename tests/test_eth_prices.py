@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from src.blockchain.eth_prices import EthUsdPrices, read_price_csv
+
+
+class EthUsdPricesTests(unittest.TestCase):
+    def test_exact_day_previous_day_and_fallback(self) -> None:
+        prices = EthUsdPrices(
+            {date(2024, 1, 1): Decimal("2300.5"), date(2024, 1, 3): Decimal("2400")},
+            fallback=Decimal("26000"),
+        )
+
+        self.assertEqual(prices.price_on(date(2024, 1, 1)), Decimal("2300.5"))
+        # пропуск в ряду — последняя известная цена
+        self.assertEqual(prices.price_on(date(2024, 1, 2)), Decimal("2300.5"))
+        self.assertEqual(prices.price_on(date(2024, 2, 1)), Decimal("2400"))
+        self.assertEqual(prices.price_on(date(2019, 1, 1)), Decimal("26000"))
+        self.assertEqual(len(prices), 2)
+
+    def test_read_csv_accepts_close_column_and_datetimes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "eth.csv"
+            path.write_text("Date,Open,Close\n2024-01-01 00:00:00,2280,2352.17\n2024-01-02,2352,2355.9\n")
+
+            prices = read_price_csv(path)
+
+        self.assertEqual(prices, {date(2024, 1, 1): Decimal("2352.17"), date(2024, 1, 2): Decimal("2355.9")})
+
+    def test_read_csv_rejects_missing_columns(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "eth.csv"
+            path.write_text("day,value\n2024-01-01,1\n")
+
+            with self.assertRaises(ValueError):
+                read_price_csv(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+from benchmarks.fake_etherscan import FakeEtherscanConfig, FakeEtherscanServer, fetch_stats
+
+try:
+    import requests  # noqa: F401
+    HAS_REQUESTS = hasattr(requests, "Session")
+except ImportError:
+    HAS_REQUESTS = False
+
+
+class FakeEtherscanTests(unittest.TestCase):
+    def _server(self, **overrides) -> FakeEtherscanServer:
+        config = FakeEtherscanConfig(transfers=25, txs_per_block=3, rate_limit=0, window_limit=10, **overrides)
+        server = FakeEtherscanServer(config).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    @staticmethod
+    def _get(server: FakeEtherscanServer, **params) -> dict:
+        query = "&".join(f"{k}={v}" for k, v in {"apikey": "k", **params}.items())
+        with urllib.request.urlopen(f"{server.url}?{query}", timeout=5) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def test_pages_follow_block_range_and_sort(self) -> None:
+        server = self._server()
+
+        desc = self._get(server, action="tokentx", startblock=0, endblock=99_999_999, page=1, offset=5, sort="desc")
+        asc = self._get(server, action="tokentx", startblock=10_000_002, endblock=10_000_003, page=1, offset=5, sort="asc")
+
+        self.assertEqual([tx["blockNumber"] for tx in desc["result"]], ["10000008", "10000007", "10000007", "10000007", "10000006"])
+        self.assertEqual([tx["blockNumber"] for tx in asc["result"]], ["10000002"] * 3 + ["10000003"] * 2)
+        self.assertEqual(len({tx["hash"] for tx in desc["result"] + asc["result"]}), 10)
+
+    def test_same_transfer_is_stable_across_pages(self) -> None:
+        server = self._server()
+        first = self._get(server, action="tokentx", startblock=10_000_000, endblock=10_000_000, page=1, offset=3, sort="asc")
+        again = self._get(server, action="tokentx", startblock=0, endblock=99_999_999, page=1, offset=3, sort="asc")
+        self.assertEqual(first["result"], again["result"])
+
+    def test_window_and_empty_responses(self) -> None:
+        server = self._server()
+
+        window = self._get(server, action="tokentx", startblock=0, endblock=99_999_999, page=3, offset=5)
+        empty = self._get(server, action="tokentx", startblock=20_000_000, endblock=99_999_999, page=1, offset=5)
+
+        self.assertIn("Result window is too large", window["result"])
+        self.assertEqual(empty, {"status": "0", "message": "No transactions found", "result": []})
+        self.assertEqual(fetch_stats(server.url)["window_errors"], 1)
+
+    def test_rate_limit_and_invalid_key(self) -> None:
+        server = self._server(invalid_keys=["bad"])
+        server.limiter.rate = 0.01
+
+        ok = self._get(server, action="eth_blockNumber")
+        limited = self._get(server, action="eth_blockNumber")
+        invalid = self._get(server, action="eth_blockNumber", apikey="bad")
+
+        self.assertEqual(int(ok["result"], 16), server.config.head_block)
+        self.assertIn("rate limit", limited["result"])
+        self.assertIn("Invalid API Key", invalid["result"])
+
+    def test_injected_http_errors(self) -> None:
+        server = self._server(error_rate=1.0)
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            self._get(server, action="eth_blockNumber")
+        self.assertEqual(ctx.exception.code, 502)
+
+    @unittest.skipUnless(HAS_REQUESTS, "нужен requests")
+    def test_fetch_reads_whole_chain_through_window_shifts(self) -> None:
+        from src.blockchain import fetch_wbtc_bulk
+        from src.blockchain.key_pool import KeyPool
+
+        # страницы по 5 при 3 переводах в блоке рвут блоки, окно — 2 страницы;
+        # граница диапазона — последний блок с переводами
+        server = self._server()
+        cfg = server.config
+        for sort in ("desc", "asc"):
+            with patch.object(fetch_wbtc_bulk, "ETHERSCAN_URL", server.url):
+                txs = list(fetch_wbtc_bulk.fetch_wbtc_all(
+                    offset=5,
+                    start_block=cfg.start_block,
+                    end_block=cfg.last_block,
+                    key_pool=KeyPool(["k"], rate=1000.0),
+                    sort=sort,
+                    use_cache=False,
+                ))
+            self.assertEqual(len({tx["hash"] for tx in txs}), cfg.transfers, sort)
+
+if __name__ == "__main__":
+    unittest.main()
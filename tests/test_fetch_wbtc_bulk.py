@@ -1,20 +1,18 @@
 import os
-import sys
+import threading
 import types
 import unittest
 from typing import Dict, List
 from unittest.mock import patch
 
-try:
-    import requests  # type: ignore
-except ImportError:
-    requests = types.SimpleNamespace(get=lambda *args, **kwargs: None)  # type: ignore
-    sys.modules["requests"] = requests
-
-if "dotenv" not in sys.modules:
-    sys.modules["dotenv"] = types.SimpleNamespace(load_dotenv=lambda *args, **kwargs: None)
-
-from src.blockchain.fetch_wbtc_bulk import END_BLOCK, fetch_wbtc_all
+from src.blockchain.fetch_wbtc_bulk import (
+    END_BLOCK,
+    FetchProgress,
+    fetch_wbtc_all,
+    fetch_wbtc_concurrent,
+    split_block_range,
+)
+from src.blockchain.http_client import LatencyStats, timed_get
 
 
 class FetchWbtcBulkTests(unittest.TestCase):
@@ -34,12 +32,17 @@ class FetchWbtcBulkTests(unittest.TestCase):
             def __init__(self, data: Dict):
                 self._data = data
                 self.status_code = 200
+                self.content = b"{}"
 
             def json(self) -> Dict:
                 return self._data
 
         return FakeResp(payload)
 
+    @staticmethod
+    def _fake_session(fake_get) -> object:
+        return types.SimpleNamespace(get=fake_get)
+
     def test_shifts_endblock_after_window_limit_error(self) -> None:
         responses: List[Dict] = [
             {"status": "1", "result": [{"blockNumber": "105", "value": "1000000"}, {"blockNumber": "104", "value": "1000000"}]},
@@ -49,18 +52,91 @@ class FetchWbtcBulkTests(unittest.TestCase):
         ]
         calls: List[Dict] = []
 
-        def fake_get(url: str, params=None, timeout=None):
+        def fake_get(url: str, params=None, **kwargs):
             calls.append(dict(params))
             return self._fake_response(responses.pop(0))
 
-        with patch("src.blockchain.fetch_wbtc_bulk.requests.get", side_effect=fake_get):
-            with patch("src.blockchain.fetch_wbtc_bulk.time.sleep", return_value=None):
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
                 blocks = [tx["blockNumber"] for tx in fetch_wbtc_all(offset=2, start_block=0)]
 
         self.assertEqual(blocks, ["105", "104", "103", "102"])
         self.assertGreaterEqual(len(calls), 3)
         self.assertEqual(int(calls[0]["endblock"]), END_BLOCK)
-        self.assertEqual(int(calls[2]["endblock"]), 103)
+        # граничный блок 104 перечитывается: страница могла оборваться посреди него
+        self.assertEqual(int(calls[2]["endblock"]), 104)
+
+    def test_descending_shift_keeps_rest_of_boundary_block(self) -> None:
+        # окно оборвалось посреди блока 104: вторая его транзакция придёт после сдвига
+        responses: List[Dict] = [
+            {"status": "1", "result": [
+                {"hash": "0xa", "blockNumber": "105", "value": "1000000"},
+                {"hash": "0xb", "blockNumber": "104", "value": "1000000"},
+            ]},
+            {"status": "0", "message": "Result window is too large", "result": []},
+            {"status": "1", "result": [
+                {"hash": "0xb", "blockNumber": "104", "value": "1000000"},
+                {"hash": "0xc", "blockNumber": "104", "value": "1000000"},
+            ]},
+            {"status": "1", "result": [{"hash": "0xd", "blockNumber": "103", "value": "1000000"}]},
+        ]
+        calls: List[Dict] = []
+
+        def fake_get(url: str, params=None, **kwargs):
+            calls.append(dict(params))
+            return self._fake_response(responses.pop(0))
+
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
+                hashes = {tx["hash"] for tx in fetch_wbtc_all(offset=2, start_block=0)}
+
+        self.assertEqual(hashes, {"0xa", "0xb", "0xc", "0xd"})
+        self.assertEqual(int(calls[2]["endblock"]), 104)
+
+    def test_full_page_at_boundary_block_does_not_end_range(self) -> None:
+        # полная страница дошла до end_block, но в нём остались переводы
+        responses: List[Dict] = [
+            {"status": "1", "result": [
+                {"hash": "0xa", "blockNumber": "100", "value": "1000000"},
+                {"hash": "0xb", "blockNumber": "101", "value": "1000000"},
+            ]},
+            {"status": "1", "result": [{"hash": "0xc", "blockNumber": "101", "value": "1000000"}]},
+        ]
+
+        def fake_get(url: str, params=None, **kwargs):
+            return self._fake_response(responses.pop(0))
+
+        progress = FetchProgress()
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
+                hashes = [
+                    tx["hash"]
+                    for tx in fetch_wbtc_all(offset=2, start_block=100, end_block=101, sort="asc", progress=progress)
+                ]
+
+        self.assertEqual(hashes, ["0xa", "0xb", "0xc"])
+        self.assertTrue(progress.completed)
+
+    def test_ascending_mode_shifts_startblock(self) -> None:
+        responses: List[Dict] = [
+            {"status": "1", "result": [{"blockNumber": "100", "value": "1000000"}, {"blockNumber": "101", "value": "1000000"}]},
+            {"status": "0", "message": "Result window is too large", "result": []},
+            {"status": "1", "result": [{"blockNumber": "102", "value": "1000000"}]},
+        ]
+        calls: List[Dict] = []
+
+        def fake_get(url: str, params=None, **kwargs):
+            calls.append(dict(params))
+            return self._fake_response(responses.pop(0))
+
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
+                blocks = [tx["blockNumber"] for tx in fetch_wbtc_all(offset=2, start_block=100, sort="asc")]
+
+        self.assertEqual(blocks, ["100", "101", "102"])
+        self.assertEqual(calls[0]["sort"], "asc")
+        self.assertEqual(int(calls[2]["startblock"]), 101)
+        self.assertEqual(int(calls[2]["endblock"]), END_BLOCK)
 
     def test_switches_api_key_on_error(self) -> None:
         responses: List[Dict] = [
@@ -70,12 +146,12 @@ class FetchWbtcBulkTests(unittest.TestCase):
         ]
         keys_used: List[str] = []
 
-        def fake_get(url: str, params=None, timeout=None):
+        def fake_get(url: str, params=None, **kwargs):
             keys_used.append(params["apikey"])
             return self._fake_response(responses.pop(0))
 
-        with patch("src.blockchain.fetch_wbtc_bulk.requests.get", side_effect=fake_get):
-            with patch("src.blockchain.fetch_wbtc_bulk.time.sleep", return_value=None):
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
                 blocks = [tx["blockNumber"] for tx in fetch_wbtc_all(offset=1, start_block=0)]
 
         self.assertEqual(blocks, ["5"])
@@ -89,13 +165,13 @@ class FetchWbtcBulkTests(unittest.TestCase):
         ]
         call_count = 0
 
-        def fake_get(url: str, params=None, timeout=None):
+        def fake_get(url: str, params=None, **kwargs):
             nonlocal call_count
             call_count += 1
             return self._fake_response(responses.pop(0))
 
-        with patch("src.blockchain.fetch_wbtc_bulk.requests.get", side_effect=fake_get):
-            with patch("src.blockchain.fetch_wbtc_bulk.time.sleep", return_value=None):
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
                 blocks = [
                     tx["blockNumber"]
                     for tx in fetch_wbtc_all(offset=1, max_pages=1, start_block=0)
@@ -104,6 +180,26 @@ class FetchWbtcBulkTests(unittest.TestCase):
         self.assertEqual(blocks, ["10"])
         self.assertEqual(call_count, 1)
 
+    def test_progress_reports_completion_and_lowest_block(self) -> None:
+        responses: List[Dict] = [
+            {"status": "1", "result": [{"blockNumber": "10", "value": "1000000"}]},
+            {"status": "0", "message": "No transactions found", "result": []},
+        ]
+
+        def fake_get(url: str, params=None, **kwargs):
+            return self._fake_response(responses.pop(0))
+
+        partial, finished = FetchProgress(), FetchProgress()
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            list(fetch_wbtc_all(offset=1, max_pages=1, start_block=0, progress=partial))
+            responses.insert(0, {"status": "1", "result": [{"blockNumber": "10", "value": "1000000"}]})
+            list(fetch_wbtc_all(offset=1, start_block=0, progress=finished))
+
+        self.assertFalse(partial.completed)
+        self.assertEqual(partial.lowest_block, 10)
+        self.assertTrue(finished.completed)
+        self.assertEqual(finished.requests, 2)
+
     def test_filters_dust_transactions(self) -> None:
         responses: List[Dict] = [
             {
@@ -116,15 +212,61 @@ class FetchWbtcBulkTests(unittest.TestCase):
             {"status": "1", "result": []},
         ]
 
-        def fake_get(url: str, params=None, timeout=None):
+        def fake_get(url: str, params=None, **kwargs):
             return self._fake_response(responses.pop(0))
 
-        with patch("src.blockchain.fetch_wbtc_bulk.requests.get", side_effect=fake_get):
-            with patch("src.blockchain.fetch_wbtc_bulk.time.sleep", return_value=None):
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
                 blocks = [tx["blockNumber"] for tx in fetch_wbtc_all(offset=2, start_block=0)]
 
         self.assertEqual(blocks, ["10"])
 
+    def test_split_block_range_covers_range_without_overlap(self) -> None:
+        ranges = split_block_range(0, 9, 3)
+
+        self.assertEqual(ranges, [(7, 9), (4, 6), (0, 3)])
+        self.assertEqual(split_block_range(5, 6, 10), [(6, 6), (5, 5)])
+        self.assertEqual(split_block_range(10, 5, 2), [])
+
+    def test_concurrent_fetch_uses_every_key_and_deduplicates(self) -> None:
+        keys_by_range: Dict = {}
+        # запросы идут парами: одна полоса не успевает разобрать все шарды,
+        # пока другая ещё не стартовала
+        both_lanes = threading.Barrier(2, timeout=5)
+
+        def fake_get(url: str, params=None, **kwargs):
+            lo, hi = int(params["startblock"]), int(params["endblock"])
+            keys_by_range[(lo, hi)] = params["apikey"]
+            try:
+                both_lanes.wait()
+            except threading.BrokenBarrierError:
+                pass
+            tx = {"hash": f"0x{hi}", "contractAddress": "wbtc", "blockNumber": str(hi), "value": "1000000"}
+            return self._fake_response({"status": "1", "result": [tx, dict(tx)]})
+
+        with patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=self._fake_session(fake_get)):
+            with patch("src.blockchain.key_pool.time.sleep", return_value=None):
+                blocks = sorted(
+                    int(tx["blockNumber"])
+                    for tx in fetch_wbtc_concurrent(offset=5, start_block=0, end_block=7, shards=4)
+                )
+
+        self.assertEqual(blocks, [1, 3, 5, 7])
+        self.assertEqual(sorted(keys_by_range), [(0, 1), (2, 3), (4, 5), (6, 7)])
+        self.assertEqual(set(keys_by_range.values()), {"k1", "k2"})
+
+    def test_timed_get_reads_body_and_records_latency(self) -> None:
+        stats = LatencyStats()
+        session = self._fake_session(lambda url, params=None, **kwargs: self._fake_response({"status": "1"}))
+
+        with patch("src.blockchain.http_client.LATENCY", stats):
+            resp, timing = timed_get(session, "http://fake", params={})
+
+        self.assertEqual(resp.json(), {"status": "1"})
+        self.assertEqual(timing.bytes, 2)
+        self.assertTrue(timing.reused)
+        self.assertEqual(stats.requests, 1)
+
 
 if __name__ == "__main__":
     unittest.main()
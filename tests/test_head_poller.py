@@ -0,0 +1,134 @@
+import unittest
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from unittest.mock import MagicMock, patch
+
+from src.flows import wbtc_head_poller as poller
+
+HEAD = 1_000
+
+
+class FakeCursor:
+    def __init__(self, stored: Dict[int, str]):
+        self.stored = stored
+        self.executed: List[str] = []
+        self._rows: List[Tuple] = []
+
+    def execute(self, sql: str, params=None) -> None:
+        self.executed.append(sql)
+        if "MIN(block_number)" in sql:
+            self._rows = [(None,)]
+        elif "block_hash" in sql:
+            self._rows = sorted(self.stored.items())
+        else:
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self) -> List[Tuple]:
+        return self._rows
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+class FakeConnection:
+    def __init__(self, cursor: FakeCursor):
+        self._cursor = cursor
+
+    def cursor(self) -> FakeCursor:
+        return self._cursor
+
+    def __enter__(self) -> "FakeConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+def fake_fetch(complete: bool):
+    def fetch(*args, progress=None, **kwargs):
+        progress.requests = 1
+        # ключи кончились посреди окна: completed остаётся False
+        progress.completed = complete
+        return iter(())
+
+    return fetch
+
+
+class PollOnceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        # в окне уже лежит блок HEAD - 5: неполная выдача без него выглядела бы как реорг
+        self.cursor = FakeCursor({HEAD - 5: "0xa"})
+        self.deleted: List[Tuple] = []
+        self.saved: List[List[Dict]] = []
+
+        @contextmanager
+        def connection():
+            yield FakeConnection(self.cursor)
+
+        patches = [
+            patch.object(poller, "fetch_latest_block", return_value=HEAD),
+            patch.object(poller, "get_max_block_number", return_value=HEAD - 5),
+            patch.object(poller, "pooled_connection", connection),
+            patch.object(poller, "poll_max_blocks", return_value=5_000),
+            patch.object(poller, "get_eth_usd_prices", return_value={}),
+            patch.object(poller, "delete_transfers", side_effect=lambda *args: self.deleted.append(args) or 1),
+            patch.object(poller, "refresh_daily_stats_for_dates"),
+            patch.object(poller, "refresh_daily_stats_incremental"),
+            patch.object(poller, "load_manifest", return_value={"parts": []}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _poll(self, complete: bool, synced_to=None):
+        with patch.object(poller, "fetch_wbtc_all", side_effect=fake_fetch(complete)):
+            return poller.poll_once(MagicMock(), 12, self.saved.append, synced_to=synced_to)
+
+    def test_partial_window_changes_nothing(self) -> None:
+        with self.assertRaises(RuntimeError):
+            self._poll(complete=False, synced_to=HEAD - 3)
+
+        self.assertEqual(self.deleted, [])
+        self.assertEqual(self.saved, [])
+        self.assertFalse(any("UPDATE" in sql for sql in self.cursor.executed))
+
+    def test_complete_window_is_reconciled(self) -> None:
+        result = self._poll(complete=True, synced_to=HEAD - 3)
+
+        # блок HEAD - 5 пропал из полной выдачи — это реорг
+        self.assertEqual(result.reorg_block, HEAD - 5)
+        self.assertEqual(len(self.deleted), 1)
+        self.assertEqual(result.synced_to, HEAD)
+
+    def test_failed_poll_keeps_synced_to(self) -> None:
+        outcomes = iter([True, False, True])
+        seen: List = []
+        real_poll = poller.poll_once
+
+        def poll(*args, synced_to=None, **kwargs):
+            seen.append(synced_to)
+            with patch.object(poller, "fetch_wbtc_all", side_effect=fake_fetch(next(outcomes))):
+                return real_poll(*args, synced_to=synced_to, **kwargs)
+
+        with patch.object(poller, "poll_once", side_effect=poll), \
+                patch.object(poller, "load_project_dotenv"), \
+                patch.object(poller, "start_metrics_server"), \
+                patch.object(poller, "write_textfile"), \
+                patch.object(poller, "load_api_keys", return_value=["k1"]), \
+                patch.object(poller, "KeyPool"), \
+                patch.object(poller, "batch_saver", return_value=self.saved.append), \
+                patch.object(poller, "get_whale_alerter", return_value=None):
+            poller.run_head_poller(interval_sec=0, confirmations=12, max_polls=3)
+
+        # неудавшийся второй опрос не сдвинул synced_to для третьего
+        self.assertEqual(seen, [None, HEAD, HEAD])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from typing import Dict, List, Set, Tuple
+from unittest.mock import patch
+
+from src.db import init_db as init_db_module
+
+AGGREGATES = ("daily_sender_volume", "hourly_stats", "stats_10m")
+
+
+class FakeCursor:
+    def __init__(self, tables: Dict[Tuple[str, str], Set[str]]):
+        self.tables = tables
+        self.executed: List[str] = []
+        self._rows: List = []
+
+    def execute(self, sql: str, params=None) -> None:
+        self.executed.append(sql)
+        if "information_schema.columns" in sql:
+            self._rows = [(column,) for column in sorted(self.tables.get(params, set()))]
+        elif "relkind" in sql:
+            self._rows = [(False,)]
+        elif "CREATE TABLE" in sql:
+            # DDL создаёт недостающие агрегаты
+            for table in AGGREGATES:
+                self.tables.setdefault(("analytics", table), {"bucket"})
+            self._rows = []
+        else:
+            self._rows = []
+
+    def fetchall(self) -> List:
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+class FakeConnection:
+    def __init__(self, cursor: FakeCursor):
+        self._cursor = cursor
+        self.autocommit = False
+
+    def cursor(self) -> FakeCursor:
+        return self._cursor
+
+    def close(self) -> None:
+        return None
+
+    def __enter__(self) -> "FakeConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+class InitDbTests(unittest.TestCase):
+    def _run(self, tables: Dict[Tuple[str, str], Set[str]]) -> List[str]:
+        backfills: List[str] = []
+        cursor = FakeCursor(tables)
+        with patch.object(init_db_module, "get_pg_connection", return_value=FakeConnection(cursor)), \
+                patch.object(init_db_module, "backfill_aggregates", side_effect=lambda: backfills.append("run")), \
+                patch.object(init_db_module, "partitioned_layout_enabled", return_value=False):
+            init_db_module.init_db(max_retries=1)
+        return backfills
+
+    def test_new_sender_volume_table_is_backfilled(self) -> None:
+        raw = {("raw", "wbtc_transfers"): set(init_db_module.REQUIRED_RAW_COLUMNS)}
+
+        self.assertEqual(self._run(raw), ["run"])
+
+    def test_new_rollup_table_is_backfilled(self) -> None:
+        tables = {
+            ("raw", "wbtc_transfers"): set(init_db_module.REQUIRED_RAW_COLUMNS),
+            ("analytics", "daily_sender_volume"): {"date", "from_address", "volume", "tx_count"},
+        }
+
+        self.assertEqual(self._run(tables), ["run"])
+
+    def test_existing_aggregates_are_left_to_the_load(self) -> None:
+        tables = {("raw", "wbtc_transfers"): set(init_db_module.REQUIRED_RAW_COLUMNS)}
+        tables.update({("analytics", table): {"bucket"} for table in AGGREGATES})
+
+        self.assertEqual(self._run(tables), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
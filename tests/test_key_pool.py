@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import patch
+
+from src.blockchain.key_pool import (
+    ERROR_INVALID_KEY,
+    ERROR_OTHER,
+    ERROR_RATE_LIMIT,
+    ERROR_TRANSIENT,
+    KeyPool,
+    NoKeysAvailable,
+    TokenBucket,
+    backoff_delay,
+    classify_error,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class KeyPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher_mono = patch("src.blockchain.key_pool.time.monotonic", side_effect=self.clock.monotonic)
+        patcher_sleep = patch("src.blockchain.key_pool.time.sleep", side_effect=self.clock.sleep)
+        patcher_mono.start()
+        patcher_sleep.start()
+        self.addCleanup(patcher_mono.stop)
+        self.addCleanup(patcher_sleep.stop)
+
+    def test_classify_error(self) -> None:
+        self.assertEqual(classify_error("NOTOK: Max rate limit reached"), ERROR_RATE_LIMIT)
+        self.assertEqual(classify_error("NOTOK: Max calls per sec rate limit reached (5/sec)"), ERROR_RATE_LIMIT)
+        self.assertEqual(classify_error("NOTOK: Invalid API Key"), ERROR_INVALID_KEY)
+        self.assertEqual(classify_error("HTTP_502"), ERROR_TRANSIENT)
+        self.assertEqual(classify_error("NOTOK"), ERROR_OTHER)
+
+    def test_backoff_grows_and_is_capped(self) -> None:
+        self.assertLessEqual(backoff_delay(1, base=1, cap=60), 1)
+        self.assertGreaterEqual(backoff_delay(4, base=1, cap=60), 4)
+        self.assertLessEqual(backoff_delay(20, base=1, cap=60), 60)
+
+    def test_token_bucket_paces_calls(self) -> None:
+        bucket = TokenBucket(rate=5)
+
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.2)
+        self.clock.sleep(0.2)
+        self.assertEqual(bucket.try_acquire(), 0)
+
+    def test_rate_limited_key_cools_down_and_comes_back(self) -> None:
+        pool = KeyPool(["k1", "k2"], rate=100)
+
+        self.assertEqual(pool.acquire("k1"), "k1")
+        delay = pool.report_error("k1", ERROR_RATE_LIMIT)
+        self.assertGreater(delay, 0)
+
+        # пока k1 остывает — берём k2
+        self.assertEqual(pool.acquire("k1"), "k2")
+
+        self.clock.sleep(delay)
+        self.assertEqual(pool.acquire("k1"), "k1")
+
+    def test_waits_for_cooldown_when_every_key_is_cooling(self) -> None:
+        pool = KeyPool(["k1"], rate=100)
+        delay = pool.report_error("k1", ERROR_RATE_LIMIT)
+        started = self.clock.now
+
+        self.assertEqual(pool.acquire(), "k1")
+        self.assertGreaterEqual(self.clock.now - started, delay - 1e-9)
+
+    def test_transient_error_keeps_key_available(self) -> None:
+        pool = KeyPool(["k1", "k2"], rate=100)
+
+        self.assertEqual(pool.report_error("k1", ERROR_TRANSIENT), 0)
+        self.assertEqual(pool.acquire("k1"), "k1")
+
+        # серия 5xx — короткая пауза, а не минутный cooldown rate-limit
+        delays = [pool.report_error("k1", ERROR_TRANSIENT) for _ in range(10)]
+        self.assertTrue(all(0 < d <= 5.0 for d in delays))
+        pool.report_success("k1")
+        self.assertEqual(pool.report_error("k1", ERROR_TRANSIENT), 0)
+
+    def test_invalid_keys_are_disabled(self) -> None:
+        pool = KeyPool(["k1"], rate=100)
+        pool.report_error("k1", ERROR_INVALID_KEY)
+
+        with self.assertRaises(NoKeysAvailable):
+            pool.acquire()
+
+
+if __name__ == "__main__":
+    unittest.main()
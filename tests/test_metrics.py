@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+import types
+import unittest
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import patch
+
+from src.db import pipeline_runs
+from src.utils.metrics import (
+    API_REQUESTS,
+    PAGE_SECONDS,
+    ROWS,
+    MetricsRegistry,
+    RunMetrics,
+    key_label,
+    observe_queue,
+    metrics_host,
+    start_metrics_server,
+    timed_stage,
+    write_textfile,
+)
+from src.utils.pipeline import stream_batches
+
+
+class RegistryTests(unittest.TestCase):
+    def test_prometheus_text_format(self) -> None:
+        registry = MetricsRegistry()
+        requests = registry.counter("x_requests_total", "Запросы", ("key", "outcome"))
+        latency = registry.histogram("x_seconds", "Задержка", buckets=(0.1, 1.0))
+        requests.inc(key="***abcd", outcome="ok")
+        requests.inc(2, key="***abcd", outcome="ok")
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(3)
+
+        text = registry.render()
+        self.assertIn("# TYPE x_requests_total counter", text)
+        self.assertIn('x_requests_total{key="***abcd",outcome="ok"} 3', text)
+        self.assertIn('x_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('x_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('x_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("x_seconds_count 3", text)
+        self.assertIn("x_seconds_sum 3.55", text)
+
+    def test_label_values_are_escaped(self) -> None:
+        registry = MetricsRegistry()
+        registry.counter("x_total", "x", ("outcome",)).inc(outcome='say "hi"\n')
+        self.assertIn('x_total{outcome="say \\"hi\\"\\n"} 1', registry.render())
+
+    def test_key_label_hides_key(self) -> None:
+        self.assertEqual(key_label("SECRETKEY1234"), "***1234")
+        self.assertEqual(key_label(None), "none")
+
+
+class RunMetricsTests(unittest.TestCase):
+    def test_report_counts_only_this_run(self) -> None:
+        ROWS.inc(100, stage="fetched")  # до запуска — не считается
+        run = RunMetrics()
+
+        API_REQUESTS.inc(key="***aaaa", outcome="ok")
+        API_REQUESTS.inc(key="***aaaa", outcome="rate_limit")
+        API_REQUESTS.inc(key="***bbbb", outcome="window")
+        for seconds in (0.2, 0.2, 0.2, 4.0):
+            PAGE_SECONDS.observe(seconds, key="***aaaa")
+        ROWS.inc(10, stage="fetched")
+        ROWS.inc(10, stage="normalized")
+        ROWS.inc(7, stage="inserted")
+        ROWS.inc(3, stage="conflicts")
+        with timed_stage("load"):
+            pass
+        observe_queue("pipeline_raw", 3)
+        observe_queue("pipeline_raw", 1)
+
+        report = run.finish()
+        self.assertEqual(report.rows_fetched, 10)
+        self.assertEqual(report.rows_inserted, 7)
+        self.assertEqual(report.rows_conflicted, 3)
+        self.assertEqual(report.api_requests, 3)
+        self.assertEqual(report.api_errors, 1)
+        self.assertEqual(report.page_p50_ms, 250.0)
+        self.assertEqual(report.page_p95_ms, 5000.0)
+        self.assertIsNotNone(report.insert_rows_per_sec)
+        self.assertEqual(report.details["requests_by_outcome"], {"ok": 1, "rate_limit": 1, "window": 1})
+        self.assertEqual(set(report.details["requests_per_sec_by_key"]), {"***aaaa", "***bbbb"})
+        self.assertEqual(report.details["max_queue_depth"]["pipeline_raw"], 3)
+
+    def test_pipeline_reports_queue_depth(self) -> None:
+        run = RunMetrics()
+        stream_batches(range(20), transform=lambda x: x, sink=len, batch_size=2, max_queued_batches=2)
+        self.assertIn("pipeline_out", run.finish().details["max_queue_depth"])
+
+
+class ExportTests(unittest.TestCase):
+    def test_textfile_is_written(self) -> None:
+        ROWS.inc(0, stage="fetched")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_textfile(str(Path(tmp) / "prom" / "wbtc.prom"))
+            self.assertIn("# TYPE wbtc_rows_total counter", path.read_text(encoding="utf-8"))
+            self.assertEqual([p.name for p in path.parent.iterdir()], ["wbtc.prom"])
+
+    def test_textfile_disabled_without_path(self) -> None:
+        self.assertIsNone(write_textfile(""))
+
+    def test_metrics_host_defaults_to_loopback(self) -> None:
+        with patch.dict(os.environ, {"METRICS_HOST": ""}):
+            self.assertEqual(metrics_host(), "127.0.0.1")
+        with patch.dict(os.environ, {"METRICS_HOST": "0.0.0.0"}):
+            self.assertEqual(metrics_host(), "0.0.0.0")
+
+    def test_http_endpoint(self) -> None:
+        server = start_metrics_server(port=0, host="127.0.0.1")
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            self.assertIn("wbtc_etherscan_requests_total", resp.read().decode("utf-8"))
+
+
+class FakeCursor:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, cur):
+        self._cur = cur
+
+    def cursor(self):
+        return self._cur
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TrackedRunTests(unittest.TestCase):
+    def _run(self, fail: bool):
+        cur = FakeCursor()
+
+        @contextmanager
+        def pooled_connection():
+            yield FakeConnection(cur)
+
+        logged = []
+        logger = types.SimpleNamespace(info=logged.append)
+        pipeline_runs.pooled_connection, original = pooled_connection, pipeline_runs.pooled_connection
+        try:
+            with pipeline_runs.tracked_run("test_flow", logger):
+                ROWS.inc(5, stage="inserted")
+                if fail:
+                    raise RuntimeError("boom")
+        finally:
+            pipeline_runs.pooled_connection = original
+        return cur, logged
+
+    def test_writes_run_row(self) -> None:
+        cur, logged = self._run(fail=False)
+
+        (sql, params), = cur.executed
+        self.assertIn("INSERT INTO ops.pipeline_runs", sql)
+        self.assertEqual(params[:2], ("test_flow", pipeline_runs.STATUS_OK))
+        self.assertEqual(params[4 + pipeline_runs.RUN_COLUMNS.index("rows_inserted")], 5)
+        self.assertIn("requests_by_outcome", json.loads(params[-1]))
+        self.assertTrue(logged)
+
+    def test_failed_run_is_recorded_and_reraised(self) -> None:
+        with self.assertRaises(RuntimeError):
+            self._run(fail=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
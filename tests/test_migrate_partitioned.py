@@ -0,0 +1,78 @@
+import unittest
+from typing import List
+from unittest.mock import patch
+
+from src.db import migrate_partitioned
+
+
+class FakeCursor:
+    def __init__(self, missing: int):
+        self.missing = missing
+        self.executed: List[str] = []
+        self._row = None
+
+    def execute(self, sql: str, params=None) -> None:
+        self.executed.append(sql)
+        if "NOT EXISTS" in sql:
+            self._row = (self.missing,)
+        elif "relkind" in sql or "to_regclass" in sql:
+            self._row = (True,)
+        elif "COUNT(*) FROM raw.wbtc_transfers_legacy" in sql:
+            self._row = (10, 10)
+        elif "WHERE id <= %s" in sql:
+            # всё уже перенесено: цикл переноса не нужен
+            self._row = (10,)
+        else:
+            self._row = None
+
+    def fetchone(self):
+        return self._row
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+class FakeConnection:
+    def __init__(self, cursor: FakeCursor):
+        self._cursor = cursor
+
+    def cursor(self) -> FakeCursor:
+        return self._cursor
+
+    def close(self) -> None:
+        return None
+
+    def __enter__(self) -> "FakeConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+class MigratePartitionedTests(unittest.TestCase):
+    def _run(self, missing: int, drop_legacy: bool = False):
+        cursor = FakeCursor(missing)
+        backfills: List[str] = []
+        with patch.object(migrate_partitioned, "get_pg_connection", return_value=FakeConnection(cursor)), \
+                patch.object(migrate_partitioned, "backfill_aggregates", side_effect=lambda: backfills.append("run")):
+            migrate_partitioned.migrate_to_partitioned(drop_legacy=drop_legacy)
+        return cursor, backfills
+
+    def test_aggregates_are_rebuilt_after_complete_copy(self) -> None:
+        cursor, backfills = self._run(missing=0, drop_legacy=True)
+
+        self.assertEqual(backfills, ["run"])
+        self.assertTrue(any(sql.startswith("DROP TABLE") for sql in cursor.executed))
+
+    def test_incomplete_copy_keeps_aggregates_and_legacy(self) -> None:
+        cursor, backfills = self._run(missing=3, drop_legacy=True)
+
+        self.assertEqual(backfills, [])
+        self.assertFalse(any(sql.startswith("DROP TABLE") for sql in cursor.executed))
+
+
+if __name__ == "__main__":
+    unittest.main()
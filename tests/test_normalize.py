@@ -0,0 +1,133 @@
+import os
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+from src.blockchain.eth_prices import EthUsdPrices
+from src.blockchain.normalize import (
+    BATCH_COLUMNS,
+    batch_to_records,
+    dropped_raw_fields,
+    normalize_to_records,
+    normalize_wbtc_batch,
+    normalize_wbtc_tx,
+)
+
+
+def _raw_tx(**overrides):
+    tx = {
+        "blockNumber": "19000000",
+        "timeStamp": "1705000000",
+        "hash": "0xaaa",
+        "nonce": "7",
+        "blockHash": "0xbbb",
+        "from": "0xfrom",
+        "contractAddress": "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599",
+        "to": "0xto",
+        "value": "512345678",
+        "tokenName": "Wrapped BTC",
+        "tokenSymbol": "WBTC",
+        "tokenDecimal": "8",
+        "transactionIndex": "12",
+        "gas": "90000",
+        "gasPrice": "23456789012",
+        "gasUsed": "65432",
+        "cumulativeGasUsed": "1234567",
+        "input": "deprecated",
+        "methodId": "0xa9059cbb",
+        "functionName": "transfer(address,uint256)",
+        "confirmations": "100",
+    }
+    tx.update(overrides)
+    return tx
+
+
+class NormalizeBatchTests(unittest.TestCase):
+    def test_batch_matches_scalar_byte_for_byte(self) -> None:
+        raw_txs = [
+            _raw_tx(),
+            _raw_tx(hash="0x2", value="100000000", timeStamp="1705000000"),  # ровно 1 BTC
+            _raw_tx(hash="0x3", value="500000000"),  # ровно порог кита
+            _raw_tx(hash="0x4", gas="", gasPrice="", gasUsed=""),
+            _raw_tx(hash="0x5", tokenDecimal="0", value="42"),
+            _raw_tx(hash="0x6", value="123", timeStamp="1"),
+        ]
+        del raw_txs[0]["tokenDecimal"]
+
+        with patch.dict(os.environ, {"WBTC_WHALE_THRESHOLD_BTC": "5", "GAS_ETH_TO_USD": "3100.55"}):
+            expected = [normalize_wbtc_tx(tx) for tx in raw_txs]
+            columns = normalize_wbtc_batch(raw_txs)
+
+        self.assertEqual(list(columns), BATCH_COLUMNS)
+        self.assertEqual(list(expected[0]), BATCH_COLUMNS)
+        for i, record in enumerate(expected):
+            for name in BATCH_COLUMNS:
+                self.assertEqual(repr(columns[name][i]), repr(record[name]), (i, name))
+
+        self.assertEqual(batch_to_records(columns), expected)
+
+    def test_chunked_records_match_batch_and_release_input(self) -> None:
+        raw_txs = [_raw_tx(hash=f"0x{i}", value=str(100_000_000 * (i + 1))) for i in range(7)]
+        expected = batch_to_records(normalize_wbtc_batch(list(raw_txs)))
+
+        records = normalize_to_records(raw_txs, chunk_size=3)
+
+        self.assertEqual(records, expected)
+        self.assertEqual(raw_txs, [])
+
+    def test_fee_uses_daily_eth_price(self) -> None:
+        # 1705000000 — 2024-01-11 UTC, 1 — 1970-01-01 (раньше первой цены)
+        prices = EthUsdPrices({date(2024, 1, 10): Decimal("2500")}, fallback=Decimal("26000"))
+        raw_txs = [_raw_tx(), _raw_tx(hash="0x2", timeStamp="1")]
+
+        columns = normalize_wbtc_batch(raw_txs, prices=prices)
+        scalar = [normalize_wbtc_tx(tx, prices) for tx in raw_txs]
+
+        fee_eth = columns["tx_fee_eth"][0]
+        self.assertEqual(columns["tx_fee_usd"], [fee_eth * Decimal("2500"), fee_eth * Decimal("26000")])
+        self.assertEqual(batch_to_records(columns), scalar)
+
+    def test_empty_batch(self) -> None:
+        columns = normalize_wbtc_batch([])
+
+        self.assertEqual(columns, {name: [] for name in BATCH_COLUMNS})
+        self.assertEqual(batch_to_records(columns), [])
+
+    def test_lean_profile_drops_input_only(self) -> None:
+        tx = _raw_tx(input="0xa9059cbb" + "0" * 128)
+
+        with patch.dict(os.environ, {"WBTC_INGEST_PROFILE": "full"}):
+            full = normalize_wbtc_tx(tx)
+            self.assertEqual(normalize_wbtc_batch([tx])["input"], [tx["input"]])
+            self.assertEqual(dropped_raw_fields(), frozenset())
+        with patch.dict(os.environ, {"WBTC_INGEST_PROFILE": "lean"}):
+            lean = normalize_wbtc_tx(tx)
+            self.assertEqual(normalize_wbtc_batch([tx])["input"], [None])
+            self.assertEqual(dropped_raw_fields(), frozenset({"input"}))
+
+        self.assertEqual(full["input"], tx["input"])
+        self.assertIsNone(lean["input"])
+        self.assertEqual(lean["method_id"], "0xa9059cbb")
+        self.assertEqual(lean["function_name"], "transfer(address,uint256)")
+        self.assertEqual({k: v for k, v in lean.items() if k != "input"}, {k: v for k, v in full.items() if k != "input"})
+
+    def test_explicit_profile_skips_env_lookup(self) -> None:
+        tx = _raw_tx(input="0xa9059cbb")
+
+        with patch("src.blockchain.normalize.ingest_profile", side_effect=AssertionError("ENV в цикле")):
+            self.assertEqual(normalize_wbtc_tx(tx, profile="full")["input"], "0xa9059cbb")
+            self.assertIsNone(normalize_wbtc_tx(tx, profile="lean")["input"])
+
+    def test_default_and_unknown_profile_keep_everything(self) -> None:
+        tx = _raw_tx(input="0xa9059cbb")
+
+        with patch.dict(os.environ, {"WBTC_INGEST_PROFILE": "tiny"}):
+            self.assertEqual(normalize_wbtc_tx(tx)["input"], "0xa9059cbb")
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(normalize_wbtc_tx(tx)["input"], "0xa9059cbb")
+            self.assertEqual(dropped_raw_fields(), frozenset())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+from src.analytics.parquet_lake import (
+    LAKE_COLUMNS,
+    empty_manifest,
+    load_manifest,
+    part_path,
+    parts_overlapping_blocks,
+    save_manifest,
+    select_parts,
+)
+
+
+def _part(day: str, blocks, ids):
+    return {"file": part_path(date.fromisoformat(day), *ids), "date": day, "blocks": blocks, "ids": ids, "rows": 1}
+
+
+class ParquetLakeManifestTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.manifest = empty_manifest()
+        self.manifest["parts"] = [
+            _part("2024-01-01", [100, 150], [1, 10]),
+            _part("2024-01-02", [151, 200], [11, 20]),
+            _part("2024-01-03", [201, 260], [21, 30]),
+        ]
+
+    def test_input_column_is_not_exported(self) -> None:
+        self.assertNotIn("input", LAKE_COLUMNS)
+        self.assertEqual(LAKE_COLUMNS[0], "id")
+
+    def test_select_parts_prunes_by_date(self) -> None:
+        files = select_parts(self.manifest, date(2024, 1, 2), date(2024, 1, 3))
+
+        self.assertEqual(files, ["date=2024-01-02/part-000000000011-000000000020.parquet"])
+        self.assertEqual(len(select_parts(self.manifest)), 3)
+
+    def test_parts_overlapping_blocks(self) -> None:
+        overlapping = parts_overlapping_blocks(self.manifest, 190, 205)
+
+        self.assertEqual([part["date"] for part in overlapping], ["2024-01-02", "2024-01-03"])
+
+    def test_manifest_roundtrip(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.assertEqual(load_manifest(root), empty_manifest())
+
+            save_manifest(self.manifest, root)
+
+            self.assertEqual(load_manifest(root), self.manifest)
+            self.assertEqual(sorted(p.name for p in root.iterdir()), ["_manifest.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from datetime import date, datetime, timezone
+
+from src.db import partitions
+from src.db.partitions import ensure_monthly_partitions, month_start, next_month, partition_name
+
+
+class FakeCursor:
+    def __init__(self, existing_children):
+        self.existing_children = existing_children
+        self.executed = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        if "pg_inherits" in sql:
+            self._rows = [(name,) for name in self.existing_children]
+        elif "EXISTS" in sql:
+            self._rows = [(False,)]
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0]
+
+
+class PartitionHelpersTests(unittest.TestCase):
+    def setUp(self) -> None:
+        partitions.reset_partition_cache()
+
+    def test_month_helpers(self) -> None:
+        self.assertEqual(month_start(datetime(2024, 3, 31, 23, 59, tzinfo=timezone.utc)), date(2024, 3, 1))
+        self.assertEqual(next_month(date(2024, 12, 1)), date(2025, 1, 1))
+        self.assertEqual(partition_name(date(2024, 7, 1)), "raw.wbtc_transfers_y2024m07")
+
+    def test_creates_only_missing_months_and_caches_committed_ones(self) -> None:
+        cur = FakeCursor(["wbtc_transfers_default", "wbtc_transfers_y2024m01"])
+
+        created = ensure_monthly_partitions(cur, [date(2024, 1, 5), date(2024, 2, 10)])
+
+        self.assertEqual(created, 1)
+        creates = [sql for sql in cur.executed if sql.startswith("CREATE TABLE")]
+        self.assertEqual(len(creates), 1)
+        self.assertIn("wbtc_transfers_y2024m02 PARTITION OF", creates[0])
+
+        # январь был закоммичен до нас — больше не проверяется
+        cur.executed.clear()
+        self.assertEqual(ensure_monthly_partitions(cur, [date(2024, 1, 20)]), 0)
+        self.assertEqual(cur.executed, [])
+
+        # февраль после коммита пачки виден в каталоге и тоже попадает в кэш
+        cur.existing_children.append("wbtc_transfers_y2024m02")
+        self.assertEqual(ensure_monthly_partitions(cur, [date(2024, 2, 20)]), 0)
+        cur.executed.clear()
+        self.assertEqual(ensure_monthly_partitions(cur, [date(2024, 2, 21)]), 0)
+        self.assertEqual(cur.executed, [])
+
+    def test_rolled_back_partition_is_created_again(self) -> None:
+        cur = FakeCursor(["wbtc_transfers_default"])
+        self.assertEqual(ensure_monthly_partitions(cur, [date(2024, 3, 1)]), 1)
+
+        # пачка откатилась вместе с CREATE — в каталоге марта нет
+        cur.executed.clear()
+        self.assertEqual(ensure_monthly_partitions(cur, [date(2024, 3, 2)]), 1)
+        self.assertTrue(any("wbtc_transfers_y2024m03 PARTITION OF" in sql for sql in cur.executed))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import unittest
+from typing import List
+
+from src.utils.pipeline import stream_batches
+
+
+class StreamBatchesTests(unittest.TestCase):
+    def test_transforms_and_saves_every_item_in_batches(self) -> None:
+        saved: List[List[int]] = []
+
+        def sink(batch: List[int]) -> int:
+            saved.append(batch)
+            return len(batch)
+
+        stats = stream_batches(range(10), transform=lambda x: x * 2, sink=sink, batch_size=4)
+
+        self.assertEqual(saved, [[0, 2, 4, 6], [8, 10, 12, 14], [16, 18]])
+        self.assertEqual((stats.fetched, stats.transformed, stats.saved, stats.batches), (10, 10, 10, 3))
+
+    def test_transform_batch_receives_whole_batches(self) -> None:
+        seen: List[int] = []
+
+        def transform_batch(batch: List[int]) -> List[int]:
+            seen.append(len(batch))
+            return [x + 1 for x in batch]
+
+        stats = stream_batches(range(5), transform=None, sink=len, batch_size=2, transform_batch=transform_batch)
+
+        self.assertEqual(seen, [2, 2, 1])
+        self.assertEqual(stats.saved, 5)
+
+    def test_source_is_bounded_by_queue_size(self) -> None:
+        produced = 0
+        max_ahead = 0
+
+        def source():
+            nonlocal produced
+            for i in range(100):
+                produced += 1
+                yield i
+
+        def sink(batch: List[int]) -> int:
+            nonlocal max_ahead
+            time.sleep(0.01)
+            max_ahead = max(max_ahead, produced - batch[-1])
+            return len(batch)
+
+        stream_batches(source(), transform=lambda x: x, sink=sink, batch_size=2, max_queued_batches=1)
+
+        # не больше (2 * очередь + 3) пачек впереди записи
+        self.assertLessEqual(max_ahead, (2 * 1 + 3) * 2 + 1)
+
+    def test_sink_error_is_raised_and_stops_source(self) -> None:
+        def source():
+            for i in range(10_000):
+                yield i
+
+        def sink(batch: List[int]) -> int:
+            raise RuntimeError("db is down")
+
+        with self.assertRaises(RuntimeError):
+            stream_batches(source(), transform=lambda x: x, sink=sink, batch_size=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import os
+import pstats
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.utils import profiling
+from src.utils.metrics import timed_stage
+from src.utils.profiling import (
+    PROFILE_CPROFILE,
+    PROFILE_OFF,
+    PROFILE_SAMPLE,
+    PROFILE_TIMERS,
+    active_profiler,
+    profile_artifact_path,
+    profile_mode,
+    profile_stage,
+    profiled_run,
+    publish_prefect_artifact,
+)
+
+
+def _busy_inner(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+    return n
+
+
+def _busy_outer(seconds: float) -> int:
+    return _busy_inner(seconds)
+
+
+class ProfileModeTest(unittest.TestCase):
+    def test_default_is_off(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(profile_mode(), PROFILE_OFF)
+
+    def test_known_and_unknown_modes(self):
+        with mock.patch.dict(os.environ, {"WBTC_PROFILE": " CProfile "}):
+            self.assertEqual(profile_mode(), PROFILE_CPROFILE)
+        with mock.patch.dict(os.environ, {"WBTC_PROFILE": "perf"}):
+            with self.assertRaises(ValueError):
+                profile_mode()
+
+
+class ProfiledRunTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        patcher = mock.patch.dict(os.environ, {"WBTC_PROFILE_DIR": self._tmp.name, "WBTC_PROFILE_INTERVAL_MS": "1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.log: list = []
+
+    def _run_dir(self) -> Path:
+        (run_dir,) = Path(self._tmp.name).iterdir()
+        return run_dir
+
+    def test_off_is_noop(self):
+        with profiled_run("flow", mode=PROFILE_OFF) as profiler:
+            self.assertIsNone(profiler)
+            with profile_stage("normalize"):
+                pass
+            self.assertIsNone(profile_artifact_path("x.html"))
+        self.assertEqual(list(Path(self._tmp.name).iterdir()), [])
+
+    def test_timers_nested_stages_and_subruns(self):
+        with profiled_run("etl", mode=PROFILE_TIMERS) as profiler:
+            self.assertIs(active_profiler(), profiler)
+            # подflow внутри уже идущего профиля — просто стадия
+            with profiled_run("ingestion") as inner:
+                self.assertIs(inner, profiler)
+                for _ in range(3):
+                    with timed_stage("normalize"):
+                        pass
+        self.assertIsNone(active_profiler())
+
+        meta = json.loads((self._run_dir() / "timings.json").read_text(encoding="utf-8"))
+        self.assertEqual(meta["run"], "etl")
+        self.assertEqual(meta["mode"], PROFILE_TIMERS)
+        self.assertEqual(meta["stages"]["etl"]["calls"], 1)
+        self.assertEqual(meta["stages"]["ingestion"]["calls"], 1)
+        self.assertEqual(meta["stages"]["normalize"]["calls"], 3)
+        summary = (self._run_dir() / "summary.md").read_text(encoding="utf-8")
+        self.assertIn("| normalize | 3 |", summary)
+
+    def test_cprofile_stage_excludes_nested_stage(self):
+        with profiled_run("cli", mode=PROFILE_CPROFILE, logger=mock.Mock()):
+            with profile_stage("outer"):
+                _busy_outer(0.01)
+                with profile_stage("inner"):
+                    _busy_inner(0.01)
+
+        run_dir = self._run_dir()
+
+        def funcs(stage: str) -> set:
+            stats = pstats.Stats(str(run_dir / f"{stage}.prof"))
+            return {func for _, _, func in stats.stats}  # type: ignore[attr-defined]
+
+        self.assertIn("_busy_outer", funcs("outer"))
+        self.assertIn("_busy_inner", funcs("inner"))
+        self.assertNotIn("_busy_outer", funcs("inner"))
+        self.assertTrue((run_dir / "inner.txt").exists())
+
+    def test_sample_writes_collapsed_stacks(self):
+        with profiled_run("cli", mode=PROFILE_SAMPLE, logger=mock.Mock()):
+            with profile_stage("load.copy"):
+                _busy_inner(0.2)
+
+        run_dir = self._run_dir()
+        lines = (run_dir / "load.copy.collapsed").read_text(encoding="utf-8").splitlines()
+        self.assertTrue(any("_busy_inner" in line for line in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(
+            any(line.startswith("[cli];[load.copy];") for line in (run_dir / "all.collapsed").read_text(encoding="utf-8").splitlines())
+        )
+
+    def test_artifact_path_and_write_errors(self):
+        logger = mock.Mock()
+        with mock.patch.object(profiling.RunProfiler, "write", side_effect=OSError("disk full")):
+            with profiled_run("cli", mode=PROFILE_TIMERS, logger=logger):
+                path = profile_artifact_path("dask-performance.html")
+                self.assertEqual(path.name, "dask-performance.html")
+                self.assertTrue(path.parent.is_dir())
+        self.assertIn("disk full", logger.info.call_args[0][0])
+
+    def test_no_prefect_artifact_outside_run(self):
+        profiler = profiling.RunProfiler("cli", PROFILE_TIMERS, base_dir=Path(self._tmp.name))
+        self.assertFalse(publish_prefect_artifact(profiler))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from src.db import reclassify
+from src.db.reclassify import reclassify_chunk, reclassify_stream, reclassify_transfers
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, cur):
+        self._cur = cur
+
+    def cursor(self):
+        return self._cur
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _fake_pool(cur):
+    @contextmanager
+    def pooled_connection():
+        yield FakeConnection(cur)
+
+    return pooled_connection
+
+
+def _ts(day: int, hour: int) -> datetime:
+    return datetime(2024, 1, day, hour, tzinfo=timezone.utc)
+
+
+class ReclassifyTests(unittest.TestCase):
+    def test_stream_depends_on_parameters(self) -> None:
+        base = reclassify_stream(Decimal("5"), Decimal("26000"), "0@0")
+
+        self.assertNotEqual(base, reclassify_stream(Decimal("10"), Decimal("26000"), "0@0"))
+        self.assertNotEqual(base, reclassify_stream(Decimal("5"), Decimal("26000"), "365@1700000000"))
+
+    def test_chunk_refreshes_only_days_with_changed_rows(self) -> None:
+        cur = FakeCursor([
+            (7, date(2024, 1, 1), _ts(1, 3), _ts(1, 9)),
+            (7, date(2024, 1, 2), _ts(2, 0), _ts(2, 5)),
+        ])
+        refreshed = {}
+
+        with patch.object(reclassify, "pooled_connection", _fake_pool(cur)), \
+                patch.object(reclassify, "refresh_daily_stats_for_dates", lambda c, dates: refreshed.update(dates=dates)), \
+                patch.object(reclassify, "refresh_rollups_for_range", lambda c, lo, hi: refreshed.update(range=(lo, hi))):
+            updated, days = reclassify_chunk((100, 199), Decimal("10"), Decimal("3000"))
+
+        self.assertEqual((updated, days), (7, 2))
+        self.assertEqual(cur.executed[0][1], {"lo": 100, "hi": 199, "threshold": Decimal("10"), "eth_usd": Decimal("3000")})
+        self.assertIn("pg_advisory_xact_lock", cur.executed[1][0])
+        self.assertEqual(refreshed["dates"], [date(2024, 1, 1), date(2024, 1, 2)])
+        self.assertEqual(refreshed["range"], (_ts(1, 3), _ts(2, 5)))
+
+    def test_unchanged_chunk_skips_analytics_refresh(self) -> None:
+        cur = FakeCursor([(0, None, None, None)])
+
+        with patch.object(reclassify, "pooled_connection", _fake_pool(cur)), \
+                patch.object(reclassify, "refresh_daily_stats_for_dates") as refresh_days:
+            self.assertEqual(reclassify_chunk((0, 99), Decimal("5"), Decimal("3000")), (0, 0))
+
+        refresh_days.assert_not_called()
+        self.assertEqual(len(cur.executed), 1)
+
+    def test_changed_chunks_refresh_parquet_lake(self) -> None:
+        cur = FakeCursor([(0, 199)])
+        results = {(0, 99): (0, 0), (100, 199): (4, 1)}
+        invalidated, checkpoints = [], []
+
+        with patch.object(reclassify, "pooled_connection", _fake_pool(cur)), \
+                patch.object(reclassify, "price_table_version", lambda c: "0@0"), \
+                patch.object(reclassify, "load_done_ranges", lambda stream: []), \
+                patch.object(reclassify, "reclassify_chunk", lambda chunk, *args: results[chunk]), \
+                patch.object(reclassify, "save_checkpoint", lambda lo, hi, rows, stream: checkpoints.append((lo, hi))), \
+                patch.object(reclassify, "load_manifest", lambda: {"parts": [{"file": "x.parquet"}]}), \
+                patch.object(reclassify, "invalidate_block_range", lambda lo, hi: invalidated.append((lo, hi))):
+            updated = reclassify_transfers(Decimal("10"), Decimal("3000"), chunk_blocks=100, workers=1)
+
+        self.assertEqual(updated, 4)
+        # копия перевыгружается только там, где строки изменились
+        self.assertEqual(invalidated, [(100, 199)])
+        self.assertEqual(sorted(checkpoints), [(0, 99), (100, 199)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import pickle
+import unittest
+
+from src.blockchain.normalize import normalize_wbtc_batch, normalize_wbtc_tx, batch_to_records
+from src.blockchain.records import ETHERSCAN_FIELDS, RawTransfer, TransferRecord
+from tests.test_normalize import _raw_tx
+
+
+class RawTransferTests(unittest.TestCase):
+    def test_keeps_known_fields_and_drops_unknown(self) -> None:
+        tx = _raw_tx(extraField="x")
+        rec = RawTransfer.from_json(tx)
+
+        self.assertEqual(set(rec), set(ETHERSCAN_FIELDS))
+        self.assertNotIn("extraField", rec)
+        self.assertIsNone(rec.get("extraField"))
+        with self.assertRaises(KeyError):
+            rec["extraField"]
+        self.assertEqual(rec["value"], "512345678")
+
+    def test_missing_field_behaves_like_absent_key(self) -> None:
+        tx = _raw_tx()
+        del tx["methodId"]
+        rec = RawTransfer.from_json(tx)
+
+        self.assertNotIn("methodId", rec)
+        self.assertEqual(rec.get("methodId", "-"), "-")
+        self.assertEqual(len(rec), len(ETHERSCAN_FIELDS) - 1)
+        with self.assertRaises(KeyError):
+            rec["methodId"]
+
+    def test_excluded_fields_are_not_kept(self) -> None:
+        rec = RawTransfer.from_json(_raw_tx(), exclude=frozenset({"input"}))
+        self.assertNotIn("input", rec)
+        self.assertIsNone(normalize_wbtc_tx(rec)["input"])
+
+    def test_repeated_strings_are_shared(self) -> None:
+        # json.loads выдаёт отдельную строку в каждом объекте
+        a = RawTransfer.from_json({"from": "".join(["0x", "abc"]), "hash": "0x1"})
+        b = RawTransfer.from_json({"from": "".join(["0x", "abc"]), "hash": "0x2"})
+        self.assertIs(a["from"], b["from"])
+
+    def test_equal_to_source_dict_and_picklable(self) -> None:
+        tx = _raw_tx()
+        rec = RawTransfer.from_json(tx)
+        self.assertEqual(rec, tx)
+        self.assertEqual(rec.to_dict(), tx)
+        self.assertEqual(pickle.loads(pickle.dumps(rec)), rec)
+
+    def test_normalizes_like_dict(self) -> None:
+        tx = _raw_tx()
+        self.assertEqual(normalize_wbtc_tx(RawTransfer.from_json(tx)), normalize_wbtc_tx(tx))
+
+
+class TransferRecordTests(unittest.TestCase):
+    def test_scalar_and_batch_return_compact_records(self) -> None:
+        txs = [_raw_tx(hash="0x1"), _raw_tx(hash="0x2", value="0")]
+        scalar = [normalize_wbtc_tx(tx) for tx in txs]
+        batch = batch_to_records(normalize_wbtc_batch([RawTransfer.from_json(tx) for tx in txs]))
+
+        for rec in scalar + batch:
+            self.assertIsInstance(rec, TransferRecord)
+            self.assertFalse(hasattr(rec, "__dict__"))
+        self.assertEqual(batch, scalar)
+        self.assertEqual(dict(batch[0]), batch[0].to_dict())
+
+    def test_addresses_are_shared_between_records(self) -> None:
+        txs = [_raw_tx(hash="0x1"), _raw_tx(hash="0x2")]
+        for tx in txs:
+            tx["from"] = "".join(["0x", "from"])
+        a, b = batch_to_records(normalize_wbtc_batch(txs))
+        self.assertIs(a["from_address"], b["from_address"])
+
+
+if __name__ == "__main__":
+    unittest.main()
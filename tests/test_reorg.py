@@ -0,0 +1,66 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from src.blockchain.reorg import block_hashes, confirmations_required, find_reorg_block, poll_window
+
+
+class PollWindowTests(unittest.TestCase):
+    def test_window_covers_last_confirmations_blocks(self) -> None:
+        self.assertEqual(poll_window(1_000, 12, stored_max=1_000, lowest_unconfirmed=990), (989, 1_000))
+
+    def test_window_reaches_back_to_gap_and_stale_unconfirmed_rows(self) -> None:
+        self.assertEqual(poll_window(1_000, 12, stored_max=900, lowest_unconfirmed=None), (901, 1_000))
+        self.assertEqual(poll_window(1_000, 12, stored_max=1_000, lowest_unconfirmed=950), (950, 1_000))
+
+    def test_empty_table_starts_near_head(self) -> None:
+        self.assertEqual(poll_window(1_000, 12, stored_max=None, lowest_unconfirmed=None), (989, 1_000))
+
+    def test_long_gap_is_caught_up_in_capped_windows(self) -> None:
+        first = poll_window(10_000, 12, stored_max=100, lowest_unconfirmed=None, max_blocks=4_000)
+        # блоки 4101..8100 без переводов: по stored_max прогресс не виден, помогает synced_to
+        second = poll_window(10_000, 12, stored_max=4_000, lowest_unconfirmed=None, synced_to=first[1], max_blocks=4_000)
+        third = poll_window(10_000, 12, stored_max=4_000, lowest_unconfirmed=None, synced_to=second[1], max_blocks=4_000)
+
+        self.assertEqual(first, (101, 4_100))
+        self.assertEqual(second, (4_101, 8_100))
+        self.assertEqual(third, (8_101, 10_000))
+
+    def test_synced_window_still_rechecks_last_blocks(self) -> None:
+        self.assertEqual(
+            poll_window(1_000, 12, stored_max=995, lowest_unconfirmed=None, synced_to=1_000, max_blocks=4_000),
+            (989, 1_000),
+        )
+
+
+class FindReorgBlockTests(unittest.TestCase):
+    def test_no_reorg_when_hashes_match(self) -> None:
+        stored = {10: "0xA", 11: "0xb"}
+        fetched = block_hashes([
+            {"block_number": 10, "block_hash": "0xa"},
+            {"block_number": 11, "block_hash": "0xb"},
+            {"block_number": 12, "block_hash": "0xc"},
+        ])
+
+        self.assertIsNone(find_reorg_block(stored, fetched, head=12))
+
+    def test_first_mismatched_or_missing_block_is_fork_point(self) -> None:
+        stored = {10: "0xa", 11: "0xb", 12: "0xc"}
+
+        self.assertEqual(find_reorg_block(stored, {10: "0xa", 11: "0xbb", 12: "0xcc"}, head=12), 11)
+        self.assertEqual(find_reorg_block(stored, {10: "0xa", 12: "0xc"}, head=12), 11)
+
+    def test_blocks_above_head_are_not_compared(self) -> None:
+        self.assertIsNone(find_reorg_block({10: "0xa", 13: "0xd"}, {10: "0xa"}, head=12))
+
+
+class ConfirmationsRequiredTests(unittest.TestCase):
+    def test_defaults_to_reorg_safety_blocks(self) -> None:
+        with patch.dict(os.environ, {"CONFIRMATIONS_REQUIRED": "", "REORG_SAFETY_BLOCKS": "20"}):
+            self.assertEqual(confirmations_required(), 20)
+        with patch.dict(os.environ, {"CONFIRMATIONS_REQUIRED": "6"}):
+            self.assertEqual(confirmations_required(), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import patch
+
+from src.blockchain.fetch_wbtc_bulk import END_BLOCK, cache_request, cache_segments, fetch_wbtc_all
+from src.blockchain.response_cache import CACHE_ON, CACHE_REPLAY, ResponseCache, is_finalized
+
+
+def _tx(block: int, confirmations: int) -> Dict:
+    return {"blockNumber": str(block), "confirmations": str(confirmations), "value": "1000000"}
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def test_page_is_finalized_only_deep_below_head(self) -> None:
+        # голова по выдаче: 100 + 200 - 1 = 299
+        txs = [_tx(100, 200)]
+
+        self.assertTrue(is_finalized(txs, end_block=235, depth=64))
+        self.assertFalse(is_finalized(txs, end_block=236, depth=64))
+        self.assertFalse(is_finalized([], end_block=0, depth=64))
+        # известная голова делает готовой и пустую выдачу
+        self.assertTrue(is_finalized([], end_block=235, depth=64, head=299))
+
+    def test_head_pages_are_served_only_in_replay(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(Path(tmp), mode=CACHE_ON, depth=64)
+            deep = cache_request(1, 0, 100, 1000, "asc")
+            head = cache_request(1, 0, 10_000, 1000, "asc")
+
+            self.assertTrue(cache.put(deep, [_tx(100, 500)]))
+            self.assertFalse(cache.put(head, [_tx(100, 500)]))
+
+            self.assertEqual(cache.get(deep), [_tx(100, 500)])
+            self.assertIsNone(cache.get(head))
+            self.assertEqual(ResponseCache(Path(tmp), mode=CACHE_REPLAY).get(head), [_tx(100, 500)])
+            self.assertEqual((cache.hits, cache.misses, cache.writes), (1, 1, 2))
+
+    def test_segments_are_aligned_below_top(self) -> None:
+        self.assertEqual(
+            cache_segments(150, END_BLOCK, 1_050, span=400),
+            [(800, END_BLOCK), (400, 799), (150, 399)],
+        )
+        self.assertEqual(cache_segments(0, 99, 99, span=100), [(0, 99)])
+        self.assertEqual(cache_segments(10, 5, 5), [])
+
+    def test_descending_rerun_after_head_moved_hits_cache(self) -> None:
+        # по переводу в каждом блоке; между запусками голова уходит с 1000 на 1050
+        chain = {"head": 1000}
+        calls: List[Dict] = []
+
+        def fake_get(url: str, params=None, **kwargs):
+            head = chain["head"]
+            if params["action"] == "eth_blockNumber":
+                payload = {"result": hex(head)}
+            else:
+                calls.append(dict(params))
+                lo, hi = int(params["startblock"]), min(int(params["endblock"]), head)
+                page, offset = int(params["page"]), int(params["offset"])
+                blocks = list(range(hi, lo - 1, -1))[(page - 1) * offset:page * offset]
+                result = [_tx(b, head - b + 1) for b in blocks]
+                payload = {"status": "1", "result": result} if result else \
+                    {"status": "0", "message": "No transactions found", "result": []}
+            return types.SimpleNamespace(status_code=200, content=b"{}", json=lambda: payload)
+
+        session = types.SimpleNamespace(get=fake_get)
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"ETHERSCAN_CACHE": "on", "ETHERSCAN_CACHE_DIR": tmp,
+                   "ETHERSCAN_CACHE_FINALITY_BLOCKS": "10", "ETHERSCAN_KEYS": "k1",
+                   "ETHERSCAN_CALLS_PER_SEC": "1000"}
+            with patch.dict(os.environ, env), \
+                    patch("src.blockchain.fetch_wbtc_bulk.CACHE_SEGMENT_BLOCKS", 100), \
+                    patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=session), \
+                    patch("src.blockchain.key_pool.time.sleep", return_value=None):
+                first = [int(tx["blockNumber"]) for tx in fetch_wbtc_all(offset=50, start_block=0)]
+                first_calls = len(calls)
+                calls.clear()
+                chain["head"] = 1050
+                second = [int(tx["blockNumber"]) for tx in fetch_wbtc_all(offset=50, start_block=0)]
+
+        self.assertEqual(first, list(range(1000, -1, -1)))
+        self.assertEqual(second, list(range(1050, -1, -1)))
+        # перекачаны только сегменты у головы, готовая история — с диска
+        self.assertGreater(first_calls, 20)
+        self.assertTrue(calls)
+        self.assertTrue(all(int(c["startblock"]) >= 900 for c in calls))
+
+    def test_replay_rebuilds_fetch_without_keys_or_network(self) -> None:
+        responses: List[Dict] = [
+            {"result": hex(1104)},
+            {"status": "1", "result": [_tx(105, 1000), _tx(104, 1001)]},
+            {"status": "1", "result": [_tx(103, 1002)]},
+        ]
+        calls: List[Dict] = []
+
+        def fake_get(url: str, params=None, **kwargs):
+            if params["action"] == "tokentx":
+                calls.append(dict(params))
+            payload = responses.pop(0)
+            return types.SimpleNamespace(status_code=200, content=b"{}", json=lambda: payload)
+
+        session = types.SimpleNamespace(get=fake_get)
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {"ETHERSCAN_CACHE": "on", "ETHERSCAN_CACHE_DIR": tmp, "ETHERSCAN_KEYS": "k1"}
+            with patch.dict(os.environ, env), \
+                    patch("src.blockchain.fetch_wbtc_bulk.get_session", return_value=session), \
+                    patch("src.blockchain.key_pool.time.sleep", return_value=None):
+                online = [tx["blockNumber"] for tx in fetch_wbtc_all(offset=2, start_block=0)]
+
+            env.update(ETHERSCAN_CACHE="replay", ETHERSCAN_KEYS="")
+            with patch.dict(os.environ, env):
+                replayed = [tx["blockNumber"] for tx in fetch_wbtc_all(offset=2, start_block=0)]
+
+        self.assertEqual(online, ["105", "104", "103"])
+        self.assertEqual(replayed, online)
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import csv
+import unittest
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from src.db import save_transfers
+from src.db.save_transfers import COLUMNS, INSERT_FROM_STAGE_SQL, INSERT_SQL, _save_values, delete_transfers, records_to_csv
+
+
+class RecordsToCsvTests(unittest.TestCase):
+    def test_serializes_nulls_bools_timestamps_and_quotes(self) -> None:
+        record = {col: None for col in COLUMNS}
+        record.update({
+            "tx_hash": "0xabc",
+            "time_stamp": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            "is_whale": True,
+            "value_wbtc": Decimal("1.5"),
+            "function_name": 'transfer(address _to, uint256 "_value")',
+            "input": "",
+        })
+
+        rows = list(csv.reader(records_to_csv([record])))
+
+        self.assertEqual(len(rows), 1)
+        row = dict(zip(COLUMNS, rows[0]))
+        self.assertEqual(row["tx_hash"], "0xabc")
+        self.assertEqual(row["time_stamp"], "2024-01-02T03:04:05+00:00")
+        self.assertEqual(row["is_whale"], "t")
+        self.assertEqual(row["value_wbtc"], "1.5")
+        self.assertEqual(row["function_name"], 'transfer(address _to, uint256 "_value")')
+        self.assertEqual(row["block_hash"], "\\N")
+        self.assertEqual(row["input"], "")
+
+
+class SenderVolumeMaintenanceTests(unittest.TestCase):
+    def test_both_load_paths_feed_sender_volume_and_rollups(self) -> None:
+        for sql in (INSERT_SQL, INSERT_FROM_STAGE_SQL):
+            self.assertIn("RETURNING tx_hash, block_number, time_stamp, from_address, to_address, value_wbtc, is_whale", sql)
+            self.assertIn("FILTER (WHERE is_whale)", sql)
+            self.assertIn("INSERT INTO analytics.daily_sender_volume", sql)
+            for table in ("analytics.hourly_stats", "analytics.stats_10m"):
+                self.assertIn(f"INSERT INTO {table}", sql)
+                self.assertIn(f"GREATEST({table}.max_tx_volume, EXCLUDED.max_tx_volume)", sql)
+
+    def test_delete_transfers_retracts_and_drops_empty_senders(self) -> None:
+        day = datetime(2024, 1, 1).date()
+
+        class FakeCursor:
+            def __init__(self):
+                self.executed = []
+
+            def execute(self, sql, params=None):
+                self.executed.append((sql, params))
+
+            def fetchall(self):
+                return [(day, 3, datetime(2024, 1, 1, 10, 5, tzinfo=timezone.utc),
+                         datetime(2024, 1, 1, 12, 40, tzinfo=timezone.utc))]
+
+        cur = FakeCursor()
+
+        deleted = delete_transfers(cur, "block_number >= %s", (100,))
+
+        self.assertEqual(deleted, 3)
+        self.assertIn("DELETE FROM raw.wbtc_transfers", cur.executed[0][0])
+        self.assertIn("UPDATE analytics.daily_sender_volume", cur.executed[0][0])
+        self.assertEqual(cur.executed[0][1], (100,))
+        self.assertEqual(cur.executed[1][1], ([day],))
+        # корзины пересчитываются по целым часам, задетым удалением
+        rollup_ranges = {params for sql, params in cur.executed[2:]}
+        self.assertEqual(rollup_ranges, {(
+            datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+            datetime(2024, 1, 1, 13, tzinfo=timezone.utc),
+        )})
+
+    def test_values_path_sums_pages_and_collects_whales(self) -> None:
+        whale = {"tx_hash": "0x1", "value_wbtc": "12.5"}
+        pages = [(100, []), (37, [whale])]
+
+        with patch.object(save_transfers, "execute_values", lambda *args, **kwargs: pages):
+            inserted, whales = _save_values(None, [{"tx_hash": "0x1"}])
+
+        self.assertEqual(inserted, 137)
+        self.assertEqual(whales, [whale])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from src.alerts import whale_alerts
+from src.alerts.whale_alerts import JsonlSink, WhaleAlerter, build_sinks, make_alert, skip_realerts
+
+WHALE = {
+    "tx_hash": "0xabc",
+    "block_number": 19_000_000,
+    "time_stamp": "2024-01-02T03:04:05+00:00",
+    "from_address": "0xfrom",
+    "to_address": "0xto",
+    "value_wbtc": "25.00000000",
+}
+
+
+class WhaleAlertTests(unittest.TestCase):
+    def test_alert_latency_is_measured_from_block_time(self) -> None:
+        alert = make_alert(WHALE, now=datetime(2024, 1, 2, 3, 4, 17, 500000, tzinfo=timezone.utc))
+
+        self.assertEqual(alert.latency_sec, 12.5)
+        self.assertEqual(alert.value_wbtc, "25.00000000")
+        self.assertEqual(json.loads(alert.to_json())["tx_hash"], "0xabc")
+
+    def test_jsonl_sink_appends_one_line_per_alert(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "alerts" / "whales.jsonl"
+            sink = JsonlSink(path)
+
+            sink.send([make_alert(WHALE)])
+            sink.send([make_alert(dict(WHALE, tx_hash="0xdef"))])
+
+            lines = path.read_text().splitlines()
+            self.assertEqual([json.loads(line)["tx_hash"] for line in lines], ["0xabc", "0xdef"])
+
+    def test_failing_sink_does_not_stop_other_sinks(self) -> None:
+        sent = []
+
+        class Broken:
+            def send(self, alerts):
+                raise RuntimeError("down")
+
+        class Recorder:
+            def send(self, alerts):
+                sent.extend(alerts)
+
+        alerter = WhaleAlerter([Broken(), Recorder()])
+        alerter([WHALE])
+
+        self.assertEqual([alert.tx_hash for alert in sent], ["0xabc"])
+        self.assertEqual(alerter.stats.failed, 1)
+        self.assertIn("Алерты по китам: 1", alerter.stats.summary())
+
+    def test_reinserted_whales_are_not_alerted_again(self) -> None:
+        sent = []
+        already_alerted = {"0xabc"}
+        on_whales = skip_realerts(sent.extend, already_alerted)
+
+        on_whales([WHALE, dict(WHALE, tx_hash="0xnew")])
+        on_whales([WHALE])
+
+        self.assertEqual([whale["tx_hash"] for whale in sent], ["0xnew", "0xabc"])
+        self.assertEqual(already_alerted, set())
+
+    def test_build_sinks_rejects_unknown_names(self) -> None:
+        self.assertEqual([type(s).__name__ for s in build_sinks("jsonl, webhook")], ["JsonlSink", "WebhookSink"])
+        with self.assertRaises(ValueError):
+            build_sinks("sms")
+
+    def test_alerter_is_disabled_without_sinks(self) -> None:
+        with patch.dict(os.environ, {"WHALE_ALERT_SINKS": ""}):
+            self.assertIsNone(whale_alerts.get_whale_alerter())
+
+
+if __name__ == "__main__":
+    unittest.main()